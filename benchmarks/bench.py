@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Benchmarks for the cachorro library's own overhead.
+
+Run from the repository root:
+
+    python benchmarks/bench.py --output bench.json
+    python benchmarks/bench.py --quick --only hit miss
+    python benchmarks/bench.py --compare old.json new.json
+
+Each benchmark records the wall-clock time of repeated runs, and the results,
+along with the library, Python and platform versions, are written as JSON
+so that they can be compared across versions.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cachorro import (VERSION, FileBackend, cacheme, get_backend, get_cache_namespace,  # noqa: E402
+                      load_cache, save_cache, set_backend)
+from cachorro.decorators import Cached  # noqa: E402
+
+KIB = 1024
+MIB = 1024 * KIB
+
+BENCHMARKS = {}
+PAYLOADS = {}
+
+
+def benchmark(name):
+    """Register a benchmark function under `name`."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat, number=1):
+    """Time `repeat` runs of `number` calls to `func`, returning per-call statistics in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        'repeat': repeat,
+        'number': number,
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'stdev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def payload(size):
+    """Return a bytes payload of `size` bytes."""
+    return os.urandom(size)
+
+
+def identity(value):
+    """Return `value`, the cheapest function to cache."""
+    return value
+
+
+def sized_result(size):
+    """Return the payload of `size` bytes, generated beforehand."""
+    return PAYLOADS[size]
+
+
+@cacheme(max_entries=0)
+def disk_identity(value):
+    """Cache `value` on disk only, for the process benchmarks."""
+    return value
+
+
+def _init_worker(folder):
+    set_backend(FileBackend(folder))
+
+
+@benchmark('hit')
+def bench_hit(args):
+    """Per-call overhead of a hit, served by the memory tier and by the disk."""
+    results = []
+    for label, max_entries in (('memory', 128), ('disk', 0)):
+        func = cacheme(identity, max_entries=max_entries)
+        func(1)
+        results.append(dict(params={'tier': label}, **measure(lambda: func(1), args.repeat, args.number)))
+    results.append(dict(params={'tier': 'uncached'}, **measure(lambda: identity(1), args.repeat, args.number)))
+    return results
+
+
+@benchmark('miss')
+def bench_miss(args):
+    """Per-call overhead of a miss, hashing the arguments and saving the result."""
+    counter = iter(range(10 ** 9))
+    func = cacheme(identity, max_entries=0)
+    return [dict(params={}, **measure(lambda: func(f"miss-{next(counter)}"), args.repeat, args.number))]
+
+
+@benchmark('cached_vs_cacheme')
+def bench_cached_vs_cacheme(args):
+    """Hit latency of the `Cached` class against the `cacheme` decorator, without memory tier."""
+    def cached_identity():
+        return 1
+
+    cached = Cached(cached_identity, max_entries=0)
+    cached()
+    decorated = cacheme(identity, max_entries=0)
+    decorated(1)
+    return [
+        dict(params={'api': 'Cached'}, **measure(cached, args.repeat, args.number)),
+        dict(params={'api': 'cacheme'}, **measure(lambda: decorated(1), args.repeat, args.number)),
+    ]
+
+
+@benchmark('map')
+def bench_map(args):
+    """Disk hits over a batch of keys, one call at a time against `map`."""
+    func = cacheme(identity, max_entries=0)
+    keys = list(range(1000))
+    list(func.map(keys))
+    results = []
+    for api, run_batch in (('call', lambda: [func(key) for key in keys]), ('map', lambda: list(func.map(keys)))):
+        stats = measure(run_batch, args.repeat)
+        stats['calls_per_second'] = len(keys) / stats['median']
+        results.append(dict(params={'api': api}, **stats))
+    return results
+
+
+@benchmark('payload')
+def bench_payload(args):
+    """Hit and miss latency by payload size, from bytes to `--max-size`."""
+    results = []
+    hit = cacheme(sized_result, max_entries=0)
+    miss = cacheme(sized_result, force_rerun=True, max_entries=0)
+    size = 16
+    while size <= args.max_size:
+        PAYLOADS[size] = payload(size)
+        repeat = max(3, min(args.repeat, (64 * MIB) // size))
+        results.append(dict(params={'size': size, 'op': 'miss'}, **measure(lambda: miss(size), repeat)))
+        results.append(dict(params={'size': size, 'op': 'hit'}, **measure(lambda: hit(size), repeat)))
+        del PAYLOADS[size]
+        size *= 16
+    return results
+
+
+@benchmark('threads')
+def bench_threads(args):
+    """Throughput of disk hits from several threads."""
+    func = cacheme(identity, max_entries=0)
+    keys = list(range(64))
+    for key in keys:
+        func(key)
+    results = []
+    for workers in (1, 2, 4, 8):
+        with ThreadPoolExecutor(workers) as pool:
+            stats = measure(lambda: list(pool.map(func, keys * 4)), args.repeat)
+        stats['calls_per_second'] = len(keys) * 4 / stats['median']
+        results.append(dict(params={'workers': workers}, **stats))
+    return results
+
+
+@benchmark('processes')
+def bench_processes(args):
+    """Throughput of disk hits from several processes sharing the same saved states."""
+    keys = list(range(64))
+    for key in keys:
+        disk_identity(key)
+    results = []
+    for workers in (1, 2, 4):
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(args.folder,)) as pool:
+            list(pool.map(identity, range(workers)))  # start the workers
+            stats = measure(lambda: list(pool.map(disk_identity, keys * 4, chunksize=16)), args.repeat)
+        stats['calls_per_second'] = len(keys) * 4 / stats['median']
+        results.append(dict(params={'workers': workers}, **stats))
+    return results
+
+
+@benchmark('load_save')
+def bench_load_save(args):
+    """Throughput of `save_cache` and `load_cache`, in bytes per second."""
+    results = []
+    for size in sorted({KIB, MIB, min(64 * MIB, args.max_size)}):
+        data = payload(size)
+        repeat = max(3, min(args.repeat, (256 * MIB) // size))
+        for op, func in (('save_cache', lambda: save_cache(data, f"throughput_{size}", 'bench')),
+                         ('load_cache', lambda: load_cache(f"throughput_{size}", 'bench'))):
+            stats = measure(func, repeat)
+            stats['bytes_per_second'] = size / stats['median']
+            results.append(dict(params={'size': size, 'op': op}, **stats))
+    return results
+
+
+def serializer_payloads():
+    """Return the payloads of the serializers benchmark, by name, with the serializers that accept them."""
+    payloads = {
+        'records': ([{'id': i, 'name': f"item-{i}", 'score': i * 0.5, 'tags': ['a', 'b']} for i in range(20000)],
+                    ['pickle_highest', 'marshal']),
+        'bytes': (payload(4 * MIB), ['pickle_highest', 'raw']),
+    }
+    try:
+        import numpy as np
+    except ImportError:
+        return payloads
+    payloads['array'] = (np.random.default_rng(0).random(MIB // 2), ['pickle_highest', 'numpy'])
+    return payloads
+
+
+@benchmark('serializers')
+def bench_serializers(args):
+    """Save and load latency and size of each serializer, against plain pickles, by payload type."""
+    results = []
+    for label, (data, serializers) in serializer_payloads().items():
+        for serializer in ['pickle', 'auto'] + serializers:
+            name = f"serialized_{label}"
+            save = lambda: save_cache(data, name, 'bench', serializer=serializer)  # noqa: E731
+            for op, func in (('save_cache', save), ('load_cache', lambda: load_cache(name, 'bench'))):
+                stats = measure(func, args.repeat)
+                stats['bytes'] = get_backend().stat(get_cache_namespace(name, 'bench'), None).size
+                results.append(dict(params={'payload': label, 'serializer': serializer, 'op': op}, **stats))
+    return results
+
+
+def run(args):
+    """Run the selected benchmarks in a temporary cache folder, returning the report."""
+    report = {
+        'cachorro': VERSION,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': [],
+    }
+    args.folder = tempfile.mkdtemp(prefix='cachorro-bench-')
+    set_backend(FileBackend(args.folder))
+    try:
+        for name in args.only or BENCHMARKS:
+            print(f"running {name}...", file=sys.stderr)
+            for result in BENCHMARKS[name](args):
+                report['results'].append(dict(benchmark=name, **result))
+    finally:
+        shutil.rmtree(args.folder)
+    return report
+
+
+def compare(old_path, new_path):
+    """Print the ratio of the median timings of two reports, per benchmark and parameters."""
+    with open(old_path) as file:
+        old = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+
+    def index(report):
+        return {(r['benchmark'], json.dumps(r['params'], sort_keys=True)): r for r in report['results']}
+
+    old_results = index(old)
+    print(f"{'benchmark':<20} {'params':<40} {'old':>12} {'new':>12} {'ratio':>7}")
+    for key, result in index(new).items():
+        if key in old_results:
+            before, after = old_results[key]['median'], result['median']
+            print(f"{key[0]:<20} {key[1]:<40} {before:>12.3e} {after:>12.3e} {after / before:>7.2f}")
+
+
+def main(argv=None):
+    """Parse the command line and run or compare the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per measurement")
+    parser.add_argument('--number', type=int, default=200, help="calls per timed run, for the per-call benchmarks")
+    parser.add_argument('--max-size', type=int, default=256 * MIB, help="largest payload size, in bytes")
+    parser.add_argument('--quick', action='store_true', help="fewer runs and payloads up to 16 MiB")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two JSON reports")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.quick:
+        args.repeat, args.number, args.max_size = 5, 50, min(args.max_size, 16 * MIB)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
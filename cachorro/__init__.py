@@ -1,11 +1,29 @@
 """Provides the default imports for the cachorro library."""
+from .admission import AdmissionPolicy, get_admission_report
+from .backends import Backend, FileBackend, SQLiteBackend, get_backend, set_backend
+from .compression import Compression, get_compression, set_compression
 from .decorators import cacheme
-from .utils import (get_cache_filepath, clear_cache,
+from .eviction import EvictionPolicy, Sweeper, prune, get_eviction_policy, set_eviction_policy
+from .hashing import hash_value, make_key
+from .lazy import LazyValue, materialize
+from .remote import HTTPBackend, TieredBackend
+from .server import CacheServer
+from .serializers import Serializer, get_serializer, register_serializer, set_serializer
+from .stats import CacheStats, Event, add_hook, get_stats, remove_hook, reset_stats
+from .utils import (get_cache_filepath, get_cache_namespace, clear_cache,
                     load_cache, save_cache)
+from .writer import BackgroundWriter, flush, get_writer
 
 
 VERSION = "0.0.1"
 __all__ = [
-    'cacheme', 'get_cache_filepath', 'clear_cache',
-    'load_cache', 'save_cache', 'VERSION'
+    'cacheme', 'AdmissionPolicy', 'get_admission_report', 'get_cache_filepath', 'get_cache_namespace', 'clear_cache',
+    'load_cache', 'save_cache', 'hash_value', 'make_key',
+    'Backend', 'FileBackend', 'SQLiteBackend', 'HTTPBackend', 'TieredBackend', 'CacheServer',
+    'get_backend', 'set_backend',
+    'EvictionPolicy', 'Sweeper', 'prune', 'get_eviction_policy', 'set_eviction_policy',
+    'Compression', 'get_compression', 'set_compression', 'LazyValue', 'materialize',
+    'Serializer', 'get_serializer', 'register_serializer', 'set_serializer',
+    'CacheStats', 'Event', 'add_hook', 'remove_hook', 'get_stats', 'reset_stats',
+    'BackgroundWriter', 'flush', 'get_writer', 'VERSION'
 ]
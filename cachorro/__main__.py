@@ -0,0 +1,7 @@
+"""Run the command line interface with `python -m cachorro`."""
+import sys
+from .cli import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
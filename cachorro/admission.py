@@ -0,0 +1,161 @@
+"""Cost-aware admission of the results into the saved states.
+
+Caching a result pays off only if loading it back is faster than calling
+the function again. The `CostModel` of each function learns how long
+its calls, loads and saves take, and admits a new result into the backend
+only if its computation took longer than the expected load time,
+by at least the `min_saving` of the `AdmissionPolicy`.
+"""
+import threading
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class AdmissionPolicy:
+    """AdmissionPolicy class.
+
+    The settings of the cost-aware admission of a cached function's results.
+    The first `warmup` results are always admitted, to measure the load time;
+    the following ones only when their computation took at least `min_saving`
+    seconds longer than loading a result is expected to take.
+
+    Example:
+        >>> @cacheme(admission=AdmissionPolicy(min_saving=0.01))
+        ... def my_function(n):
+        ...     pass
+    """
+    def __init__(self, min_saving=0.001, warmup=3, smoothing=0.2):
+        """Initialize a new instance of the class.
+
+        Args:
+            min_saving (float, optional): The seconds a load must save over a call
+                for the result to be admitted. Defaults to 1 ms.
+            warmup (int, optional): The number of results always admitted. Defaults to 3.
+            smoothing (float, optional): The weight of the latest measure in the moving averages
+                of the timings, between 0 and 1. Defaults to 0.2.
+
+        Returns:
+            None
+        """
+        self.min_saving = min_saving
+        self.warmup = warmup
+        self.smoothing = smoothing
+
+    def __repr__(self):
+        """Return a readable representation of the settings."""
+        return f"AdmissionPolicy(min_saving={self.min_saving}, warmup={self.warmup}, smoothing={self.smoothing})"
+
+
+class CostModel:
+    """CostModel class.
+
+    The moving averages of the compute, load and save times, and of the saved size,
+    of a cached function, and the admission decisions taken from them.
+    Until a saved state is loaded, the load time is estimated by the save time.
+    """
+    def __init__(self, func_name):
+        """Initialize a new instance of the class.
+
+        Args:
+            func_name (str): The name of the function.
+
+        Returns:
+            None
+        """
+        self.func_name = func_name
+        self.compute_time = None
+        self.load_time = None
+        self.save_time = None
+        self.nbytes = None
+        self.admitted = 0
+        self.rejected = 0
+        self.admitting = True
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _average(average, value, smoothing):
+        return value if average is None else average + smoothing * (value - average)
+
+    @property
+    def expected_load_time(self):
+        """The expected seconds to load a result, or None before the first load or save."""
+        return self.load_time if self.load_time is not None else self.save_time
+
+    def record_load(self, seconds, nbytes, policy):
+        """Record the time taken to load a saved state of `nbytes` bytes."""
+        with self._lock:
+            self.load_time = self._average(self.load_time, seconds, policy.smoothing)
+            self.nbytes = self._average(self.nbytes, nbytes, policy.smoothing)
+
+    def record_save(self, seconds, nbytes, policy):
+        """Record the time taken to save a result as `nbytes` bytes."""
+        with self._lock:
+            self.save_time = self._average(self.save_time, seconds, policy.smoothing)
+            self.nbytes = self._average(self.nbytes, nbytes, policy.smoothing)
+
+    def admit(self, seconds, policy):
+        """Record the time taken to compute a result, and return whether to save it.
+
+        Args:
+            seconds (float): The seconds the function took to compute the result.
+            policy (AdmissionPolicy): The admission settings.
+
+        Returns:
+            bool: True if the result should be saved.
+        """
+        with self._lock:
+            self.compute_time = self._average(self.compute_time, seconds, policy.smoothing)
+            expected = self.expected_load_time
+            if self.admitted < policy.warmup or expected is None:
+                admit = True
+            else:
+                admit = seconds - expected >= policy.min_saving
+            if admit:
+                self.admitted += 1
+            else:
+                self.rejected += 1
+            self.admitting = admit
+            return admit
+
+    def report(self):
+        """Return the averages and decisions as a dict."""
+        with self._lock:
+            return {
+                'admitting': self.admitting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'compute_time': self.compute_time,
+                'expected_load_time': self.expected_load_time,
+                'save_time': self.save_time,
+                'nbytes': self.nbytes,
+            }
+
+
+def resolve_admission(admission):
+    """Return the `AdmissionPolicy` for an `admission=` argument: None or False for none, True for the defaults."""
+    if admission is True:
+        return AdmissionPolicy()
+    return admission or None
+
+
+def get_function_costs(func_name):
+    """Return the `CostModel` of a function, creating it on first use."""
+    costs = _registry.get(func_name)
+    if costs is None:
+        with _registry_lock:
+            costs = _registry.setdefault(func_name, CostModel(func_name))
+    return costs
+
+
+def get_admission_report():
+    """Return the cost averages and admission decisions of every function with cost-aware admission.
+
+    Example:
+        >>> get_admission_report()
+        {'my_function': {'admitting': False, 'admitted': 3, 'rejected': 97, 'compute_time': 2e-05, ...}}
+    """
+    with _registry_lock:
+        registered = list(_registry.values())
+    return {costs.func_name: costs.report() for costs in registered}
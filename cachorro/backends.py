@@ -0,0 +1,537 @@
+"""Storage backends for the saved states.
+
+A backend stores opaque binary entries addressed by a namespace,
+one per cached function and program, and a key, the digest of the call
+arguments or None for the argument-less entry of the function.
+"""
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import namedtuple
+from contextlib import contextmanager
+from .locks import FileLock, get_lock_filepath
+from .manifest import Manifest
+from .serialization import MAGIC
+
+
+Entry = namedtuple('Entry', ['namespace', 'key', 'size', 'mtime', 'atime'])
+
+DEFAULT_CACHE_FOLDER = 'saved_states'
+
+_UNSAFE_CHARS = ('/', '\\', '\0')
+
+
+def is_safe_name(name):
+    """Check that a namespace or key names a single file or folder, that cannot escape its parent folder."""
+    return bool(name) and not name.startswith('.') and not os.path.isabs(name) \
+        and not any(char in name for char in _UNSAFE_CHARS)
+
+
+def _check_names(*names):
+    for name in names:
+        if name is not None and not is_safe_name(name):
+            raise ValueError(f"Invalid namespace or key: {name!r}")
+
+
+@contextmanager
+def _atomic_open(filepath):
+    """Open a temporary file for writing, that replaces `filepath` once completely written.
+
+    Readers of `filepath` see either the previous content or the new one,
+    never a partially written file. If the block raises, `filepath` is left
+    untouched and the temporary file is removed. The folder of `filepath`
+    is created if needed, only once the first attempt has failed.
+    """
+    folder = os.path.dirname(filepath) or '.'
+    prefix = f".{os.path.basename(filepath)}."
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=prefix, suffix='.tmp')
+    except FileNotFoundError:
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=prefix, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            yield file
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _sniff_format(header):
+    """Return the format of a saved state from its first bytes: 0 for a plain pickle, None if unknown."""
+    if header.startswith(MAGIC) and len(header) > len(MAGIC) + 1:
+        return header[len(MAGIC) + 1]
+    return 0 if header else None
+
+
+class Backend:
+    """Backend class.
+
+    The base class of the storage backends. Subclasses implement
+    `open`, `create`, `exists`, `stat`, `touch`, `delete`, `clear`, `entries` and `lock`;
+    `read`, `write`, `read_many` and `write_many` are built on top of them,
+    and may be overridden with faster bulk versions.
+    """
+    def open(self, namespace, key):
+        """Open an entry for reading.
+
+        Args:
+            namespace (str): The namespace of the entry.
+            key (str or None): The key of the entry.
+
+        Returns:
+            A readable binary file object, or None if the entry does not exist.
+        """
+        raise NotImplementedError
+
+    def create(self, namespace, key):
+        """Return a context manager yielding a writable binary file object for an entry.
+
+        The entry is published, replacing any previous one, only when the block exits
+        without errors. Readers never see a partially written entry.
+        """
+        raise NotImplementedError
+
+    def exists(self, namespace, key):
+        """Check whether an entry exists."""
+        raise NotImplementedError
+
+    def stat(self, namespace, key):
+        """Return the `Entry` describing an entry, or None if it does not exist."""
+        raise NotImplementedError
+
+    def touch(self, namespace, key):
+        """Record an access to an entry, updating its `atime`."""
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        """Delete an entry, returning whether it existed."""
+        raise NotImplementedError
+
+    def clear(self, namespace):
+        """Delete every entry of a namespace, returning whether any existed."""
+        raise NotImplementedError
+
+    def entries(self, namespace=None):
+        """Iterate over the entries of a namespace, or of every namespace if None.
+
+        Yields:
+            Entry: A named tuple with the fields `namespace`, `key`, `size`,
+                `mtime`, the time of the last write, and `atime`, the time of the last access.
+        """
+        raise NotImplementedError
+
+    def lock(self, namespace, key):
+        """Return an exclusive inter-process lock guarding an entry.
+
+        Returns:
+            FileLock: A lock with `acquire` and `release`, usable as a context manager.
+        """
+        raise NotImplementedError
+
+    def read(self, namespace, key):
+        """Return the content of an entry, or None if it does not exist."""
+        file = self.open(namespace, key)
+        if file is None:
+            return None
+        with file:
+            return file.read()
+
+    def write(self, namespace, key, data):
+        """Write the content of an entry."""
+        with self.create(namespace, key) as file:
+            file.write(data)
+
+    def read_many(self, namespace, keys):
+        """Return a dict mapping the existing keys among `keys` to their content."""
+        found = {}
+        for key in keys:
+            data = self.read(namespace, key)
+            if data is not None:
+                found[key] = data
+        return found
+
+    def write_many(self, namespace, items):
+        """Write the content of several entries, given as an iterable of (key, data) pairs."""
+        for key, data in items:
+            self.write(namespace, key, data)
+
+
+class FileBackend(Backend):
+    """FileBackend class.
+
+    Stores each entry as a file. The argument-less entry of a namespace
+    is stored as `<folder>/<namespace>.pkl`, while keyed entries are sharded
+    by the first two characters of their key, as
+    `<folder>/<namespace>/<key[:2]>/<key>.pkl`, so that no single directory
+    grows beyond a few thousand files.
+
+    With `manifest`, the entries are also indexed by a `Manifest`, loaded in memory
+    from the `.manifest` log of the folder: existence checks, `stat` and listings
+    are answered without touching the filesystem, and misses without opening
+    the files. Every process using the folder must then enable it.
+    """
+    suffix = '.pkl'
+
+    def __init__(self, folder=DEFAULT_CACHE_FOLDER, manifest=False):
+        """Initialize a new instance of the class.
+
+        Args:
+            folder (str, optional): The root folder of the saved states. Defaults to 'saved_states'.
+            manifest (bool, optional): If True, keep an index of the entries in memory and in a log,
+                rebuilt by scanning the folder if missing. Defaults to False.
+
+        Returns:
+            None
+        """
+        self.folder = folder
+        self.manifest = Manifest(folder, self._scan) if manifest else None
+
+    def path(self, namespace, key):
+        """Return the path of the file storing an entry, inside the folder.
+
+        Raises:
+            ValueError: If the namespace or key is not a safe file name, e.g. `..` or `a/b`.
+        """
+        _check_names(namespace, key)
+        if key is None:
+            return os.path.join(self.folder, f"{namespace}{self.suffix}")
+        return os.path.join(self.folder, namespace, key[:2], f"{key}{self.suffix}")
+
+    def open(self, namespace, key):
+        """Open an entry for reading, returning None if it does not exist."""
+        if self.manifest is not None and self.manifest.get(namespace, key) is None:
+            return None
+        try:
+            return open(self.path(namespace, key), 'rb')
+        except FileNotFoundError:
+            if self.manifest is not None:  # removed by a process without the manifest
+                self.manifest.forget(namespace, key)
+            return None
+
+    @contextmanager
+    def create(self, namespace, key):
+        """Yield a temporary file that atomically replaces the entry once written."""
+        with _atomic_open(self.path(namespace, key)) as file:
+            yield file
+            if self.manifest is not None:
+                file.flush()
+                stat = os.fstat(file.fileno())
+                header = os.pread(file.fileno(), len(MAGIC) + 2, 0) if hasattr(os, 'pread') else b''
+        if self.manifest is not None:
+            self.manifest.record_write(namespace, key, stat.st_size, stat.st_mtime, _sniff_format(header))
+
+    def exists(self, namespace, key):
+        """Check whether an entry exists."""
+        if self.manifest is not None:
+            return self.manifest.get(namespace, key) is not None
+        return os.path.exists(self.path(namespace, key))
+
+    def stat(self, namespace, key):
+        """Return the `Entry` describing an entry, or None if it does not exist."""
+        if self.manifest is not None:
+            entry = self.manifest.get(namespace, key)
+            return None if entry is None else Entry(*entry[:5])
+        try:
+            stat = os.stat(self.path(namespace, key))
+        except FileNotFoundError:
+            return None
+        return Entry(namespace, key, stat.st_size, stat.st_mtime, stat.st_atime)
+
+    def touch(self, namespace, key):
+        """Set the access time of the entry's file, keeping its modification time.
+
+        The access time is set explicitly, so it is tracked
+        even on filesystems mounted with `noatime` or `relatime`.
+        With the manifest, it is only recorded there, in batches.
+        """
+        if self.manifest is not None:
+            if self.manifest.get(namespace, key) is not None:
+                self.manifest.record_touch(namespace, key, time.time())
+            return
+        filepath = self.path(namespace, key)
+        try:
+            os.utime(filepath, (time.time(), os.stat(filepath).st_mtime))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, namespace, key):
+        """Delete an entry, returning whether it existed."""
+        try:
+            os.remove(self.path(namespace, key))
+            found = True
+        except FileNotFoundError:
+            found = False
+        if self.manifest is not None:
+            self.manifest.record_delete(namespace, key)
+        return found
+
+    def clear(self, namespace):
+        """Delete every entry of a namespace, returning whether any existed."""
+        found = self.delete(namespace, None)  # checks the namespace
+        folder = os.path.join(self.folder, namespace)
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+            found = True
+        if self.manifest is not None:
+            self.manifest.record_clear(namespace)
+        return found
+
+    def entries(self, namespace=None):
+        """Iterate over the entries of a namespace, or of every namespace.
+
+        They are listed from the manifest if enabled, otherwise streamed with `os.scandir`.
+        """
+        if self.manifest is not None:
+            return (Entry(*entry[:5]) for entry in self.manifest.entries(namespace))
+        return self._scan(namespace)
+
+    def lock(self, namespace, key):
+        """Return a lock on the `.lock` file next to the entry."""
+        return FileLock(get_lock_filepath(self.path(namespace, key)))
+
+    def _scan(self, namespace=None):
+        if namespace is not None:
+            entry = self.stat(namespace, None)
+            if entry is not None:
+                yield entry
+            yield from self._scan_keyed(namespace)
+            return
+        try:
+            top = os.scandir(self.folder)
+        except FileNotFoundError:
+            return
+        with top:
+            for item in top:
+                if item.is_dir():
+                    yield from self._scan_keyed(item.name)
+                elif item.name.endswith(self.suffix) and not item.name.startswith('.'):
+                    yield self._entry(item, item.name[:-len(self.suffix)], None)
+
+    def _scan_keyed(self, namespace):
+        try:
+            shards = os.scandir(os.path.join(self.folder, namespace))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        with shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as items:
+                    for item in items:
+                        name = item.name
+                        if name.endswith(self.suffix) and not name.startswith('.'):
+                            yield self._entry(item, namespace, name[:-len(self.suffix)])
+
+    @staticmethod
+    def _entry(item, namespace, key):
+        stat = item.stat()
+        return Entry(namespace, key, stat.st_size, stat.st_mtime, stat.st_atime)
+
+
+class _SQLiteWriter(io.BytesIO):
+    """An in-memory buffer that is stored as an entry of a SQLite backend when closed without errors."""
+
+    def __init__(self, backend, namespace, key):
+        super().__init__()
+        self._backend = backend
+        self._namespace = namespace
+        self._key = key
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self._backend.write(self._namespace, self._key, self.getvalue())
+        self.close()
+
+
+class SQLiteBackend(Backend):
+    """SQLiteBackend class.
+
+    Stores every entry as a row of a single SQLite database in WAL mode,
+    suited to many small entries. Lookups go through the primary key index
+    on (namespace, key), `read_many` and `write_many` run in one query or
+    transaction per batch, and `entries` streams from the index without
+    touching the stored values.
+
+    Connections are opened per thread and per process.
+    Since SQLite has no row locks, entry locks are striped over
+    a fixed number of lock files next to the database.
+    """
+    lock_stripes = 64
+    batch_size = 500
+
+    def __init__(self, path=os.path.join(DEFAULT_CACHE_FOLDER, 'cache.sqlite3'), timeout=30.0):
+        """Initialize a new instance of the class.
+
+        Args:
+            path (str, optional): The path of the database file.
+                Defaults to 'saved_states/cache.sqlite3'.
+            timeout (float, optional): How many seconds to wait for a write lock on the database.
+                Defaults to 30.
+
+        Returns:
+            None
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'namespace TEXT NOT NULL, key TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL, '
+            'atime REAL NOT NULL, value BLOB NOT NULL, PRIMARY KEY (namespace, key))'
+        )
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _key(key):
+        return '' if key is None else key
+
+    def open(self, namespace, key):
+        """Open an entry for reading, returning None if it does not exist."""
+        data = self.read(namespace, key)
+        return None if data is None else io.BytesIO(data)
+
+    def create(self, namespace, key):
+        """Return a buffer that is stored as the entry once closed without errors."""
+        return _SQLiteWriter(self, namespace, key)
+
+    def read(self, namespace, key):
+        """Return the content of an entry, or None if it does not exist."""
+        row = self._connect().execute(
+            'SELECT value FROM entries WHERE namespace = ? AND key = ?', (namespace, self._key(key))
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def write(self, namespace, key, data):
+        """Write the content of an entry."""
+        self.write_many(namespace, [(key, data)])
+
+    def read_many(self, namespace, keys):
+        """Return a dict mapping the existing keys among `keys` to their content, one query per batch."""
+        keys = list(keys)
+        conn = self._connect()
+        found = {}
+        for start in range(0, len(keys), self.batch_size):
+            batch = {self._key(key): key for key in keys[start:start + self.batch_size]}
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                f'SELECT key, value FROM entries WHERE namespace = ? AND key IN ({placeholders})',
+                (namespace, *batch)
+            )
+            for stored_key, value in rows:
+                found[batch[stored_key]] = value
+        return found
+
+    def write_many(self, namespace, items):
+        """Write the content of several entries in a single transaction."""
+        now = time.time()
+        rows = ((namespace, self._key(key), len(data), now, now, bytes(data)) for key, data in items)
+        conn = self._connect()
+        with _transaction(conn):
+            conn.executemany(
+                'INSERT OR REPLACE INTO entries (namespace, key, size, mtime, atime, value) VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+
+    def exists(self, namespace, key):
+        """Check whether an entry exists."""
+        return self._connect().execute(
+            'SELECT 1 FROM entries WHERE namespace = ? AND key = ?', (namespace, self._key(key))
+        ).fetchone() is not None
+
+    def stat(self, namespace, key):
+        """Return the `Entry` describing an entry, or None if it does not exist."""
+        row = self._connect().execute(
+            'SELECT size, mtime, atime FROM entries WHERE namespace = ? AND key = ?', (namespace, self._key(key))
+        ).fetchone()
+        return None if row is None else Entry(namespace, key, *row)
+
+    def touch(self, namespace, key):
+        """Update the access time of an entry."""
+        self._connect().execute(
+            'UPDATE entries SET atime = ? WHERE namespace = ? AND key = ?', (time.time(), namespace, self._key(key))
+        )
+
+    def delete(self, namespace, key):
+        """Delete an entry, returning whether it existed."""
+        cursor = self._connect().execute(
+            'DELETE FROM entries WHERE namespace = ? AND key = ?', (namespace, self._key(key))
+        )
+        return cursor.rowcount > 0
+
+    def clear(self, namespace):
+        """Delete every entry of a namespace, returning whether any existed."""
+        cursor = self._connect().execute('DELETE FROM entries WHERE namespace = ?', (namespace,))
+        return cursor.rowcount > 0
+
+    def entries(self, namespace=None):
+        """Iterate over the entries of a namespace, or of every namespace, without loading their values."""
+        if namespace is None:
+            rows = self._connect().execute('SELECT namespace, key, size, mtime, atime FROM entries')
+        else:
+            rows = self._connect().execute(
+                'SELECT namespace, key, size, mtime, atime FROM entries WHERE namespace = ?', (namespace,)
+            )
+        for stored_namespace, key, size, mtime, atime in rows:
+            yield Entry(stored_namespace, key or None, size, mtime, atime)
+
+    def lock(self, namespace, key):
+        """Return a lock on one of the lock files striped over the entries."""
+        stripe = zlib.crc32(f"{namespace}/{key}".encode()) % self.lock_stripes
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        return FileLock(get_lock_filepath(f"{self.path}.{stripe}"))
+
+
+@contextmanager
+def _transaction(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+_default_backend = FileBackend()
+
+
+def get_backend():
+    """Return the backend used when none is given explicitly."""
+    return _default_backend
+
+
+def set_backend(backend):
+    """Set the backend used when none is given explicitly.
+
+    Args:
+        backend (Backend): The new default backend.
+
+    Example:
+        >>> set_backend(SQLiteBackend('saved_states/cache.sqlite3'))
+    """
+    global _default_backend
+    _default_backend = backend
@@ -0,0 +1,246 @@
+"""The command line interface to manage the saved states, run with `python -m cachorro`.
+
+- `list`: the entries, with their sizes and ages.
+- `stats`: the number, total size and ages of the entries of each namespace.
+- `verify`: load every entry in a process pool, reporting, or with `--remove` deleting, the corrupt ones.
+- `prune`: remove the entries older than `--older-than` seconds, then the least recently used
+  ones beyond `--max-bytes` or `--max-entries`.
+- `warm`: run a script through `transform_and_execute`, saving the states of its steps
+  ahead of deployment, with the cache folder, parallel and lazy modes the script passes
+  to `initialize_caching` unless given as options.
+
+The entries are streamed from the backend, so that listing, stats and verification
+use constant memory whatever their number; only pruning by size collects them to sort them.
+"""
+import argparse
+import ast
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+from .backends import DEFAULT_CACHE_FOLDER, FileBackend
+from .decorators import transform_and_execute
+from .eviction import EvictionPolicy
+from .serialization import read_value
+
+
+VERIFY_BATCH_SIZE = 256
+
+_CACHING_ARGUMENTS = ('cache_dir', 'parallel', 'max_workers', 'lazy')  # of `initialize_caching`, in order
+
+_UNITS = ['B', 'KiB', 'MiB', 'GiB', 'TiB']
+
+
+def format_size(nbytes):
+    """Return a size in bytes in a readable unit, e.g. '1.5 MiB'."""
+    for unit in _UNITS[:-1]:
+        if nbytes < 1024:
+            break
+        nbytes /= 1024
+    else:
+        unit = _UNITS[-1]
+    return f"{nbytes:.0f} {unit}" if unit == 'B' else f"{nbytes:.1f} {unit}"
+
+
+def format_age(seconds):
+    """Return a duration in seconds in its largest unit, e.g. '3d' or '12m'."""
+    for unit, length in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= length:
+            return f"{int(seconds // length)}{unit}"
+    return f"{max(int(seconds), 0)}s"
+
+
+def _name(namespace, key):
+    return namespace if key is None else f"{namespace}/{key}"
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _verify_batch(folder, batch):
+    """Load the entries of a batch, returning the (namespace, key, error) of the corrupt ones."""
+    backend = FileBackend(folder)
+    corrupt = []
+    for namespace, key in batch:
+        file = backend.open(namespace, key)
+        if file is None:  # removed since listed
+            continue
+        try:
+            with file:
+                read_value(file, zero_copy=True)
+        except (ImportError, AttributeError):  # a class of the program that saved it, not importable here
+            continue
+        except Exception as e:
+            corrupt.append((namespace, key, f"{type(e).__name__}: {e}"))
+    return corrupt
+
+
+def verify(backend, namespace=None, workers=None, remove=False, out=None):
+    """Load every entry in a process pool, reporting the corrupt ones.
+
+    The entries are submitted in batches as they are listed, with at most
+    two batches per worker pending, so that memory stays bounded.
+
+    Args:
+        backend (FileBackend): The backend to verify.
+        namespace (str, optional): The namespace to verify. Defaults to every namespace.
+        workers (int, optional): The number of processes. Defaults to the number of CPUs.
+        remove (bool, optional): If True, the corrupt entries are deleted. Defaults to False.
+        out (TextIO, optional): Where to report the corrupt entries. Defaults to `sys.stdout`.
+
+    Returns:
+        tuple: The number of verified entries and of corrupt ones.
+    """
+    workers = workers or os.cpu_count() or 1
+    out = out or sys.stdout
+    checked = corrupt = 0
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+
+        def collect(futures):
+            nonlocal corrupt
+            for future in futures:
+                for namespace, key, error in future.result():
+                    corrupt += 1
+                    if remove:
+                        backend.delete(namespace, key)
+                    print(f"{'removed' if remove else 'corrupt'}\t{_name(namespace, key)}\t{error}", file=out)
+
+        keys = ((entry.namespace, entry.key) for entry in backend.entries(namespace))
+        for batch in _batches(keys, VERIFY_BATCH_SIZE):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(_verify_batch, backend.folder, batch))
+            checked += len(batch)
+        collect(wait(pending).done)
+    return checked, corrupt
+
+
+def _list(args, backend):
+    now = time.time()
+    for entry in backend.entries(args.namespace):
+        print(f"{format_size(entry.size):>10}  {format_age(now - entry.mtime):>5}  {_name(entry.namespace, entry.key)}")
+    return 0
+
+
+def _stats(args, backend):
+    now = time.time()
+    totals = {}  # count, size, oldest and newest mtime, by namespace
+    for entry in backend.entries(args.namespace):
+        count, size, oldest, newest = totals.get(entry.namespace, (0, 0, entry.mtime, entry.mtime))
+        totals[entry.namespace] = (count + 1, size + entry.size, min(oldest, entry.mtime), max(newest, entry.mtime))
+    for namespace, (count, size, oldest, newest) in sorted(totals.items()):
+        print(f"{namespace}: {count} entries, {format_size(size)}, "
+              f"oldest {format_age(now - oldest)}, newest {format_age(now - newest)}")
+    count = sum(total[0] for total in totals.values())
+    size = sum(total[1] for total in totals.values())
+    print(f"total: {count} entries, {format_size(size)} in {len(totals)} namespaces")
+    return 0
+
+
+def _verify(args, backend):
+    checked, corrupt = verify(backend, args.namespace, args.workers, args.remove)
+    print(f"verified {checked} entries: {corrupt} corrupt{', removed' if args.remove and corrupt else ''}")
+    return 1 if corrupt and not args.remove else 0
+
+
+def _prune(args, backend):
+    policy = EvictionPolicy(max_bytes=args.max_bytes, max_entries=args.max_entries, ttl=args.older_than,
+                            low_watermark=1.0)
+    report = policy.prune(backend, args.namespace)
+    print(f"removed {report.removed_entries} entries, {format_size(report.removed_bytes)}; "
+          f"kept {report.entries} entries, {format_size(report.bytes)}")
+    return 0
+
+
+def _caching_arguments(script_path):
+    """Return the arguments of the script's `initialize_caching` call, by name.
+
+    The transformer removes the call, so they are read from the source instead;
+    only the literal ones are returned.
+    """
+    with open(script_path, 'rb') as file:
+        tree = ast.parse(file.read(), script_path)
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and
+                getattr(node.func, 'id', getattr(node.func, 'attr', None)) == 'initialize_caching'):
+            values = dict(zip(_CACHING_ARGUMENTS, node.args))
+            values.update((keyword.arg, keyword.value) for keyword in node.keywords
+                          if keyword.arg in _CACHING_ARGUMENTS)
+            arguments = {}
+            for name, value in values.items():
+                try:
+                    arguments[name] = ast.literal_eval(value)
+                except ValueError:  # not a literal, e.g. a variable
+                    pass
+            return arguments
+    return {}
+
+
+def _warm(args, backend):
+    script_path = os.path.abspath(args.script)
+    arguments = _caching_arguments(script_path)
+    cache_dir = args.cache_dir or arguments.get('cache_dir', './cache')
+    lazy = args.lazy or arguments.get('lazy', False)
+    sys.argv = [script_path] + args.script_args
+    if args.parallel or arguments.get('parallel', False):
+        with ThreadPoolExecutor(args.workers or arguments.get('max_workers')) as executor:
+            pipeline = transform_and_execute(script_path, cache_dir, executor, lazy)
+    else:
+        pipeline = transform_and_execute(script_path, cache_dir, lazy=lazy)
+    print(f"executed {len(pipeline.executed)} steps, loaded {len(pipeline.loaded)} steps")
+    return 0
+
+
+def main(argv=None):
+    """Manage the saved states from the command line."""
+    parser = argparse.ArgumentParser(prog='python -m cachorro', description=main.__doc__)
+    parser.add_argument('--folder', default=DEFAULT_CACHE_FOLDER, help="the folder of the saved states")
+    parser.add_argument('--manifest', action='store_true', help="use the manifest of the folder")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('list', help="list the entries with their sizes and ages")
+    command.add_argument('namespace', nargs='?', help="the namespace to list, e.g. my_program_my_function")
+    command.set_defaults(run=_list)
+
+    command = commands.add_parser('stats', help="show the number, size and ages of the entries")
+    command.add_argument('namespace', nargs='?', help="the namespace to describe")
+    command.set_defaults(run=_stats)
+
+    command = commands.add_parser('verify', help="load every entry, reporting the corrupt ones")
+    command.add_argument('namespace', nargs='?', help="the namespace to verify")
+    command.add_argument('--workers', type=int, help="the number of processes, by default one per CPU")
+    command.add_argument('--remove', action='store_true', help="delete the corrupt entries")
+    command.set_defaults(run=_verify)
+
+    command = commands.add_parser('prune', help="remove old entries, then the least recently used ones")
+    command.add_argument('namespace', nargs='?', help="the namespace to prune")
+    command.add_argument('--older-than', type=float, help="remove the entries written more than these seconds ago")
+    command.add_argument('--max-bytes', type=int, help="keep at most this total size")
+    command.add_argument('--max-entries', type=int, help="keep at most this number of entries")
+    command.set_defaults(run=_prune)
+
+    command = commands.add_parser('warm', help="run a script, saving the states of its cached steps")
+    command.add_argument('script', help="the script to run")
+    command.add_argument('script_args', nargs=argparse.REMAINDER, help="the arguments of the script")
+    command.add_argument('--cache-dir', help="the folder of the script's saved states, by default the one "
+                         "the script passes to initialize_caching, or ./cache")
+    command.add_argument('--parallel', action='store_true', help="run the independent steps concurrently, "
+                         "as when the script passes parallel=True to initialize_caching")
+    command.add_argument('--workers', type=int, help="the number of threads with --parallel")
+    command.add_argument('--lazy', action='store_true', help="do not deserialize the loaded steps until used, "
+                         "as when the script passes lazy=True to initialize_caching")
+    command.set_defaults(run=_warm)
+
+    args = parser.parse_args(argv)
+    if args.command == 'prune' and (args.older_than, args.max_bytes, args.max_entries) == (None, None, None):
+        parser.error("prune needs --older-than, --max-bytes or --max-entries")
+    return args.run(args, FileBackend(args.folder, manifest=args.manifest))
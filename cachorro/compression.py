@@ -0,0 +1,143 @@
+"""Compression codecs for the saved states."""
+import bz2
+import lzma
+import zlib
+from collections import namedtuple
+
+
+Codec = namedtuple('Codec', ['name', 'id', 'compress', 'decompressor', 'default_level'])
+
+CODECS = {
+    'zlib': Codec('zlib', 1, lambda data, level: zlib.compress(data, level),
+                  zlib.decompressobj, 6),
+    'bz2': Codec('bz2', 2, lambda data, level: bz2.compress(data, level),
+                 bz2.BZ2Decompressor, 9),
+    'lzma': Codec('lzma', 3, lambda data, level: lzma.compress(data, preset=level),
+                  lzma.LZMADecompressor, 6),
+}
+CODECS_BY_ID = {codec.id: codec for codec in CODECS.values()}
+
+SAMPLE_SIZE = 64 * 1024
+
+_default_compression = None
+
+
+class Compression:
+    """Compression class.
+
+    The settings used to compress the saved states: a codec among
+    `zlib`, `bz2` and `lzma`, its level, and when to skip compressing.
+    Payloads smaller than `min_size` bytes are stored uncompressed,
+    as are payloads whose size would not shrink by at least `min_ratio`.
+    For payloads larger than a few samples, the ratio is first estimated
+    on a sample, so that incompressible data is not compressed in full.
+
+    Example:
+        >>> @cacheme(compression=Compression('lzma', level=9))
+        ... def my_function():
+        ...     pass
+    """
+    def __init__(self, codec='zlib', level=None, min_size=0, min_ratio=1.0):
+        """Initialize a new instance of the class.
+
+        Args:
+            codec (str, optional): The name of the codec. Defaults to 'zlib'.
+            level (int, optional): The compression level. Defaults to the codec's default.
+            min_size (int, optional): The size in bytes below which payloads are not compressed.
+                Defaults to 0.
+            min_ratio (float, optional): The minimum ratio between the uncompressed and compressed sizes
+                for the compressed payload to be kept. Defaults to 1.0.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the codec is unknown.
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown compression codec {codec!r}, expected one of {sorted(CODECS)}")
+        self.codec = CODECS[codec]
+        self.level = self.codec.default_level if level is None else level
+        self.min_size = min_size
+        self.min_ratio = min_ratio
+
+    def __repr__(self):
+        """Return a readable representation of the settings."""
+        return (f"Compression({self.codec.name!r}, level={self.level}, "
+                f"min_size={self.min_size}, min_ratio={self.min_ratio})")
+
+    def compress(self, data):
+        """Compress `data`, returning None if it should be stored uncompressed."""
+        size = len(data)
+        if size < self.min_size:
+            return None
+        if self.min_ratio > 1 and size > 4 * SAMPLE_SIZE:
+            sample = bytes(data[size // 2:size // 2 + SAMPLE_SIZE])
+            if SAMPLE_SIZE < self.min_ratio * len(self.codec.compress(sample, self.level)):
+                return None
+        compressed = self.codec.compress(data, self.level)
+        if size < self.min_ratio * len(compressed):
+            return None
+        return compressed
+
+
+AUTO = Compression('zlib', level=1, min_size=4096, min_ratio=1.2)
+
+
+def resolve_compression(compression):
+    """Return the `Compression` settings for a `compression=` argument.
+
+    Args:
+        compression (None, bool, str or Compression): None for the default set
+            with `set_compression`; False for no compression; 'auto' for fast zlib
+            compression, skipped below 4 KiB or when it saves less than a sixth of the size;
+            a codec name, for that codec at its default level; or the settings themselves.
+
+    Returns:
+        Compression or None: The settings, or None for no compression.
+    """
+    if compression is None:
+        return _default_compression
+    if compression is False:
+        return None
+    if compression == 'auto':
+        return AUTO
+    if isinstance(compression, str):
+        return Compression(compression)
+    return compression
+
+
+def get_compression():
+    """Return the compression used when none is given explicitly, or None."""
+    return _default_compression
+
+
+def set_compression(compression):
+    """Set the compression used when none is given explicitly.
+
+    Args:
+        compression (None, str or Compression): The default compression,
+            as accepted by `resolve_compression`; None or False to disable it.
+
+    Example:
+        >>> set_compression('auto')
+    """
+    global _default_compression
+    _default_compression = None if compression is None else resolve_compression(compression)
+
+
+def decompress(file, codec_id):
+    """Decompress the rest of `file`, compressed with the codec `codec_id`."""
+    try:
+        decompressor = CODECS_BY_ID[codec_id].decompressor()
+    except KeyError:
+        raise ValueError(f"Unknown compression codec id {codec_id}") from None
+    chunks = []
+    while True:
+        chunk = file.read(1024 * 1024)
+        if not chunk:
+            break
+        chunks.append(decompressor.decompress(chunk))
+    if hasattr(decompressor, 'flush'):  # zlib
+        chunks.append(decompressor.flush())
+    return b''.join(chunks)
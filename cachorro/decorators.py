@@ -1,66 +1,630 @@
 """Provides the main decorators and pseudo-decortors for the cachorro library."""
 import ast
+import asyncio
+import builtins
+import importlib.util
+import inspect
+import io
+import marshal
 import os
 import pickle
 import sys
+import threading
+import time
 import logging
-from functools import wraps, partial
-from .utils import get_cache_filepath, _ensure_folder_exists
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps, partial
+from .admission import get_function_costs, resolve_admission
+from .hashing import UnhashableError, fingerprint_function, hash_arguments, hash_value
+from .compression import resolve_compression
+from .serializers import resolve_serializer
+from .shared import invalidate_shared, read_shared
+from .serialization import read_stream, read_value, write_stream, write_value
+from .stats import get_function_stats
+from .memory import MemoryCache, DEFAULT_MAX_BYTES, DEFAULT_MAX_ENTRIES, register_memory
+from .backends import _atomic_open, FileBackend, get_backend
+from .lazy import LazyValue
+from .pipeline import PIPELINE_NAME, Pipeline, Step
+from .eviction import active_policies, get_expiry, record_write
+from .utils import get_cache_filepath, get_cache_namespace
+from .writer import get_writer
 
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
+_MISSING = object()
+MAP_BATCH_SIZE = 256  # the number of new results `map` writes at once
+REFRESH_WORKERS = 4  # the threads refreshing stale results, shared by the cached functions
 
-def cacheme(func=None, *, force_rerun=False):
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def _call_uncached(wrapper, args):
+    """Call the function decorated by `wrapper`, bypassing the cache, in a worker of `map`.
+
+    The wrapper, unlike the decorated function, can be pickled by reference for process pools.
+    """
+    return wrapper.__wrapped__(*args)
+
+
+def _get_refresher():
+    """Return the executor refreshing stale results in the background, creating it on first use."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = ThreadPoolExecutor(REFRESH_WORKERS, thread_name_prefix='cachorro-refresh')
+        return _refresher
+
+
+def _acquire_lock(store, namespace, key):
+    """Acquire and return the backend lock guarding an entry."""
+    lock = store.lock(namespace, key)
+    lock.acquire()
+    return lock
+
+
+def cacheme(func=None, *, force_rerun=False,
+            max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES,
+            single_flight=False, executor=None, backend=None, eviction=None,
+            zero_copy=False, compression=None, track_code=True, track_calls=False,
+            write_behind=False, serializer=None, stale_after=None, admission=None,
+            shared_memory=False):
     """Cacheme decorator.
 
     A decorator function that caches the return values of a function.
     It checks if there is a saved state in a file, and if so, it returns it.
     If there is no saved state, it executes the function,
     saves the result to a file, and returns it.
+    Each set of arguments, normalized against the function signature,
+    is cached in its own file. Calls with an argument that can be neither hashed
+    nor pickled, like an object holding a lock, are not cached: a warning is logged
+    and the function runs as if undecorated.
+
+    Results loaded or saved are also kept in an in-memory LRU tier,
+    checked before the disk, available as the `memory` attribute
+    of the decorated function.
+
+    The saved states are stored through a `Backend`, by default one file per entry.
+    They are published atomically, so concurrent readers never see a partially written state.
+
+    The cache keys include a fingerprint of the function's code, computed once,
+    so that editing the function makes it recompute instead of serving results
+    of the previous version. The states saved by previous versions are left
+    in the backend, until cleared or evicted.
+
+    Hits, misses, timings and sizes are counted in the `stats` attribute
+    of the decorated function, see `get_stats` and `add_hook`.
+
+    The `map` attribute of the decorated function calls it over iterables
+    of arguments in bulk, loading the hits and writing the new results in batches,
+    and optionally computing the misses in a thread or process pool.
+
+    Generator functions are decorated with a generator function: on a miss,
+    the items are saved in chunks as they are yielded, and the entry is published
+    only once the generator is exhausted; on a hit, they are replayed chunk by chunk.
+    Their items are neither kept in memory nor compressed.
+
+    In write-behind mode, a new result is returned as soon as it is computed,
+    while the background writer saves it, see `flush`. Until then, it is served
+    from memory, even if the memory tier is disabled or full.
+
+    With `stale_after`, results older than that are stale: they are still returned
+    right away, while a background thread recomputes and saves them, once per key
+    at a time. Results older than the `ttl` of the eviction policies are expired,
+    and recomputed before returning, as usual.
+
+    With cost-aware `admission`, the time taken by the calls, loads and saves is measured,
+    and a new result is only saved if computing it took longer than loading it is
+    expected to take, so that caching never makes cheap functions slower.
+    The decisions are reported by `get_admission_report` and the `costs` attribute.
+
+    With `shared_memory`, the processes of a machine share the saved states they load,
+    see `cachorro.shared`: the bytes-like results and the buffers of the results,
+    like NumPy arrays, are then stored once in memory, however many processes use them.
+
+    Coroutine functions are decorated with a coroutine function, caching
+    the awaited result. Loading and saving the states run in `executor`,
+    off the event loop, and concurrent awaits on the same key within a loop
+    share a single computation.
 
     Args:
         force_rerun (bool, optional): If True, the function will be executed,
             even if a cache exists, and re-cached. Defaults to False.
+        max_entries (int, optional): The maximum number of results kept in memory.
+            0 disables the memory tier. Defaults to 128.
+        max_bytes (int, optional): The maximum approximate size in bytes
+            of the results kept in memory. Defaults to 64 MiB.
+        single_flight (bool, optional): If True, on a cache miss an advisory file lock
+            is taken on the entry, so that when several processes miss on the same key
+            only one executes the function, while the others wait for its result
+            and load it. Defaults to False.
+        executor (concurrent.futures.Executor, optional): The executor running the disk
+            operations of coroutine functions. Defaults to the event loop's default executor.
+        backend (Backend, optional): The storage backend of the saved states.
+            Defaults to the one set by `set_backend`, at the time of each call.
+        eviction (EvictionPolicy, optional): The disk quota, time to live and LRU limits
+            of the function's saved states, enforced on top of the global policy
+            set by `set_eviction_policy`. Defaults to none.
+        zero_copy (bool, optional): If True, bytes-like results and the large buffers
+            of the results, like NumPy arrays, are stored out of the pickle stream,
+            and loaded as read-only views on a memory mapping of the saved state,
+            so that a hit only reads the pages actually touched. Defaults to False.
+        compression (str or Compression, optional): How to compress the saved states:
+            'zlib', 'bz2', 'lzma', 'auto', `Compression` settings, or False for none.
+            Defaults to the compression set by `set_compression`, at the time of each call.
+        track_code (bool, optional): If True, the cache keys include the fingerprint
+            of the function's bytecode and constants. Defaults to True.
+        track_calls (bool, optional): If True, the fingerprint also covers the functions
+            of the same module it calls, recursively, and is computed at the first call,
+            once the functions defined after it exist. Implies `track_code`. Defaults to False.
+        write_behind (bool, optional): If True, the new results of the synchronous function
+            are saved by a background thread, through a bounded queue that blocks the callers
+            when full. Ignored with `single_flight`, whose waiting processes need the saved state
+            once the lock is released. Defaults to False.
+        serializer (str or Serializer, optional): How to serialize the saved states: 'pickle',
+            'auto' to pick the fastest serializer for the type of each result, or a serializer name
+            among 'pickle_highest', 'marshal', 'raw', 'numpy' and the registered ones.
+            Ignored with `zero_copy`. Defaults to the serializer set by `set_serializer`,
+            at the time of each call.
+        stale_after (float, optional): The age in seconds, since they were saved, past which
+            the results of the synchronous function are refreshed in the background,
+            while still being served. Defaults to never.
+        admission (bool or AdmissionPolicy, optional): If set, the results that are faster
+            to compute than to load are not saved, only kept in memory. True uses the default
+            `AdmissionPolicy`. Defaults to none, saving every result.
+        shared_memory (bool, optional): If True, the saved states loaded by a process
+            are copied to shared memory segments, which the other processes attach to
+            instead of loading their own copy. Their buffers are then returned as read-only views
+            on the shared memory. Only for backends storing files, like `FileBackend`. Defaults to False.
     """ # noqa D417
     if func is None:
-        return partial(cacheme, force_rerun=force_rerun)
+        return partial(cacheme, force_rerun=force_rerun,
+                       max_entries=max_entries, max_bytes=max_bytes,
+                       single_flight=single_flight, executor=executor, backend=backend,
+                       eviction=eviction, zero_copy=zero_copy, compression=compression,
+                       track_code=track_code, track_calls=track_calls, write_behind=write_behind,
+                       serializer=serializer, stale_after=stale_after, admission=admission,
+                       shared_memory=shared_memory)
 
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        filepath = get_cache_filepath(func.__name__)
-        _ensure_folder_exists(os.path.dirname(filepath))
+    signature = inspect.signature(func)
+    fingerprint = fingerprint_function(func) if track_code and not track_calls else None
+    memory = MemoryCache(max_entries, max_bytes)
+    register_memory(func.__name__, memory)
+    stats = get_function_stats(func.__name__)
+    admission = resolve_admission(admission)
+    costs = get_function_costs(func.__name__) if admission is not None else None
+    unsaved = {}  # the results being written behind, by key
+    saved_at = {}  # the time the results were saved, by key, with stale_after
+    refreshing = set()  # the keys being refreshed
+    refreshing_lock = threading.Lock()
 
-        # Attempt to load a saved state
-        if not force_rerun and os.path.exists(filepath):
+    def open_fresh(store, namespace, key):
+        """Open a saved state that is not expired, returning the file and its expiry, or (None, None)."""
+        policies = active_policies(eviction)
+        expires = None
+        has_ttl = any(policy.ttl is not None for policy in policies)
+        if has_ttl or stale_after is not None:
+            entry = store.stat(namespace, key)
+            if entry is None:
+                return None, None
+            if stale_after is not None:
+                saved_at[key] = entry.mtime
+            expires = get_expiry(policies, entry.mtime) if has_ttl else None
+            if expires is not None and time.time() > expires:
+                store.delete(namespace, key)
+                if shared_memory:
+                    invalidate_shared(namespace, key)
+                return None, None
+        if any(policy.tracks_access for policy in policies):
+            store.touch(namespace, key)
+        return store.open(namespace, key), expires
+
+    def load(store, namespace, key):
+        """Load a saved state, returning `_MISSING` if there is none, it is expired or corrupted."""
+        start = time.perf_counter()
+        file, expires = open_fresh(store, namespace, key)
+        if file is None:
+            return _MISSING
+        try:
+            with file:
+                if shared_memory:
+                    result, nbytes = read_shared(namespace, key, file)
+                else:
+                    result, nbytes = read_value(file, zero_copy)
+            memory.put(key, result, nbytes, expires)
+            stats.record('hit', key, time.perf_counter() - start, nbytes)
+            if costs is not None:
+                costs.record_load(time.perf_counter() - start, nbytes, admission)
+            return result
+        except Exception as e:
+            log_msg = f"Error loading saved state for {namespace}/{key}: {e}\n"
+            log_msg += "DEFAULT ACTION: probably corrupted pickle file, "
+            log_msg += "DELETED"
+
+            log.critical(log_msg)
+            stats.record('corrupt', key, error=e)
+            store.delete(namespace, key)  # Remove corrupted pickle file
+            if shared_memory:
+                invalidate_shared(namespace, key)
+            return _MISSING
+
+    def save(store, namespace, key, result):
+        """Save the result of the function."""
+        start = time.perf_counter()
+        with store.create(namespace, key) as file:
+            nbytes = write_value(result, file, zero_copy, resolve_compression(compression),
+                                 resolve_serializer(serializer))
+        if shared_memory:
+            invalidate_shared(namespace, key)
+        memory.put(key, result, nbytes, get_expiry(active_policies(eviction), time.time()))
+        if stale_after is not None:
+            saved_at[key] = time.time()
+        record_write(store, namespace, nbytes, eviction)
+        stats.record('save', key, time.perf_counter() - start, nbytes)
+        if costs is not None:
+            costs.record_save(time.perf_counter() - start, nbytes, admission)
+
+    def discard(store, namespace, key, e):
+        """Log a failed execution, making sure no corrupt state is left behind."""
+        stats.record('error', key, error=e)
+        log_msg = f"Error executing function {func.__name__}: {e}\n"
+        log_msg += "DEFAULT ACTION: pickle file not created."
+        log.critical(log_msg)
+
+        # Ensure no corrupt state is saved
+        store.delete(namespace, key)
+
+    def cache_key(*args, **kwargs):
+        """Return the key of a call, as used by the decorated function."""
+        nonlocal fingerprint
+        if fingerprint is None and track_calls:
+            fingerprint = fingerprint_function(func, follow_calls=True)
+        return hash_arguments(signature, args, kwargs, fingerprint)
+
+    def call_key(args, kwargs):
+        """Return the key of a call, or None if an argument cannot be hashed, so that the call is not cached."""
+        try:
+            return cache_key(*args, **kwargs)
+        except UnhashableError as e:
+            log.warning(f"Calling {func.__name__} without caching: {e}")
+            return None
+
+    def admit(key, result, seconds):
+        """Return whether to save a result computed in `seconds`, keeping it in memory otherwise."""
+        if costs is None or costs.admit(seconds, admission):
+            return True
+        memory.put(key, result)
+        return False
+
+    def lookup_memory(key):
+        if force_rerun:
+            memory.invalidate(key)
+            return _MISSING
+        result = memory.get(key, _MISSING)
+        if result is _MISSING:
+            result = unsaved.get(key, _MISSING)
+        if result is not _MISSING:
+            stats.record('memory_hit', key)
+        return result
+
+    if inspect.isgeneratorfunction(func):
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            key = call_key(args, kwargs)
+            if key is None:
+                return (yield from func(*args, **kwargs))
+            store = backend or get_backend()
+            namespace = get_cache_namespace(func.__name__)
+
+            file = None if force_rerun else open_fresh(store, namespace, key)[0]
+            if file is not None:
+                with file:
+                    start = time.perf_counter()
+                    try:
+                        items = read_stream(file)
+                    except Exception as e:
+                        log.critical(f"Error loading saved stream for {namespace}/{key}: {e}\n"
+                                     "DEFAULT ACTION: probably corrupted pickle file, DELETED")
+                        stats.record('corrupt', key, error=e)
+                        store.delete(namespace, key)
+                        items = None
+                    if items is not None:
+                        try:
+                            yield from items
+                        except pickle.UnpicklingError as e:  # truncated, too late to recompute
+                            stats.record('corrupt', key, error=e)
+                            store.delete(namespace, key)
+                            raise
+                        stats.record('hit', key, time.perf_counter() - start, file.tell())
+                        return
+
+            stats.record('miss', key)
+            start = time.perf_counter()
             try:
-                with open(filepath, 'rb') as file:
-                    return pickle.load(file)
+                # Published only once the function is exhausted: an aborted run leaves no entry
+                with store.create(namespace, key) as file:
+                    nbytes = yield from write_stream(func(*args, **kwargs), file)
             except Exception as e:
-                log_msg = f"Error loading saved state from {filepath}: {e}\n"
-                log_msg += "DEFAULT ACTION: probably corrupted pickle file, "
-                log_msg += "DELETED"
+                discard(store, namespace, key, e)
+                raise
+            stats.record('compute', key, time.perf_counter() - start)
+            stats.record('save', key, nbytes=nbytes)
+            record_write(store, namespace, nbytes, eviction)
 
-                log.critical(log_msg)
-                os.remove(filepath)  # Remove corrupted pickle file
+        generator_wrapper.stats = stats
+        generator_wrapper.cache_key = cache_key
+        return generator_wrapper
 
-        # If no saved state, execute the function and save the result
+    if inspect.iscoroutinefunction(func):
+        inflight = {}
+
+        async def resolve(loop, key, args, kwargs):
+            store = backend or get_backend()
+            namespace = get_cache_namespace(func.__name__)
+            lock = None
+            try:
+                if not force_rerun:
+                    result = await loop.run_in_executor(executor, load, store, namespace, key)
+                    if result is not _MISSING:
+                        return result
+                if single_flight:
+                    lock = await loop.run_in_executor(executor, _acquire_lock, store, namespace, key)
+                    # Another process may have published the result while we waited
+                    if not force_rerun:
+                        result = await loop.run_in_executor(executor, load, store, namespace, key)
+                        if result is not _MISSING:
+                            return result
+                stats.record('miss', key)
+                try:
+                    start = time.perf_counter()
+                    result = await func(*args, **kwargs)
+                    seconds = time.perf_counter() - start
+                    stats.record('compute', key, seconds)
+                    if admit(key, result, seconds):
+                        await loop.run_in_executor(executor, save, store, namespace, key, result)
+                    return result
+                except Exception as e:
+                    await loop.run_in_executor(executor, discard, store, namespace, key, e)
+                    raise
+            finally:
+                if lock is not None:
+                    lock.release()
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            key = call_key(args, kwargs)
+            if key is None:
+                return await func(*args, **kwargs)
+            result = lookup_memory(key)
+            if result is not _MISSING:
+                return result
+
+            loop = asyncio.get_running_loop()
+            task = inflight.get((loop, key))
+            if task is None:
+                task = loop.create_task(resolve(loop, key, args, kwargs))
+                inflight[(loop, key)] = task
+                task.add_done_callback(lambda _: inflight.pop((loop, key), None))
+            # Cancelling one awaiting caller must not cancel the shared computation
+            return await asyncio.shield(task)
+
+        async_wrapper.memory = memory
+        async_wrapper.stats = stats
+        async_wrapper.costs = costs
+        async_wrapper.cache_key = cache_key
+        return async_wrapper
+
+    def execute(store, namespace, key, args, kwargs):
+        """Execute the function and save the result."""
+        stats.record('miss', key)
         try:
+            start = time.perf_counter()
             result = func(*args, **kwargs)
-            with open(filepath, 'wb') as file:
-                pickle.dump(result, file)
+            seconds = time.perf_counter() - start
+            stats.record('compute', key, seconds)
+            if not admit(key, result, seconds):
+                return result
+            if write_behind and not single_flight:
+                unsaved[key] = result
+                memory.put(key, result)
+                get_writer().submit(save_behind, store, namespace, key, result)
+            else:
+                save(store, namespace, key, result)
             return result
         except Exception as e:
-            log_msg = f"Error executing function {func.__name__}: {e}\n"
-            log_msg += "DEFAULT ACTION: pickle file not created."
-            log.critical(log_msg)
-
-            # Ensure no corrupt state is saved
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            discard(store, namespace, key, e)
             raise
 
+    def save_behind(store, namespace, key, result):
+        """Save a result in the background writer, serving it from `unsaved` until then."""
+        try:
+            save(store, namespace, key, result)
+        except Exception as e:
+            stats.record('error', key, error=e)
+            log.critical(f"Error saving the result of {func.__name__} for {namespace}/{key}: {e}")
+            store.delete(namespace, key)
+        finally:
+            if unsaved.get(key) is result:
+                del unsaved[key]
+
+    def revalidate(key, args, kwargs):
+        """Schedule the refresh of a stale result, unless it is fresh or already being refreshed."""
+        saved = saved_at.get(key)
+        if saved is None or time.time() - saved <= stale_after:
+            return
+        with refreshing_lock:
+            if key in refreshing:
+                return
+            refreshing.add(key)
+        stats.record('stale', key)
+        _get_refresher().submit(refresh, backend or get_backend(), get_cache_namespace(func.__name__),
+                                key, args, kwargs)
+
+    def refresh(store, namespace, key, args, kwargs):
+        """Recompute and save a stale result, keeping the stale one if the function raises."""
+        try:
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            stats.record('compute', key, time.perf_counter() - start)
+            save(store, namespace, key, result)
+        except Exception as e:
+            stats.record('error', key, error=e)
+            log.critical(f"Error refreshing the stale result of {func.__name__} for {namespace}/{key}: {e}\n"
+                         "DEFAULT ACTION: stale result kept.")
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = call_key(args, kwargs)
+        if key is None:
+            return func(*args, **kwargs)
+        result = lookup_memory(key)
+        if result is not _MISSING:
+            if stale_after is not None:
+                revalidate(key, args, kwargs)
+            return result
+
+        store = backend or get_backend()
+        namespace = get_cache_namespace(func.__name__)
+
+        # Attempt to load a saved state
+        if not force_rerun:
+            result = load(store, namespace, key)
+            if result is not _MISSING:
+                if stale_after is not None:
+                    revalidate(key, args, kwargs)
+                return result
+
+        # If no saved state, execute the function and save the result
+        if not single_flight:
+            return execute(store, namespace, key, args, kwargs)
+        with store.lock(namespace, key):
+            # Another process may have published the result while we waited
+            if not force_rerun:
+                result = load(store, namespace, key)
+                if result is not _MISSING:
+                    return result
+            return execute(store, namespace, key, args, kwargs)
+
+    def map_calls(*iterables, executor=None, chunksize=1):
+        """Call the function on each set of arguments taken from `iterables`, like the builtin `map`.
+
+        All the keys are computed upfront, the hits are bulk-loaded from the backend,
+        and only the misses are executed, in `executor` if given, each distinct key once.
+        The new results are bulk-written as they complete. Results are yielded in input order,
+        each as soon as it and the ones before it are available. Misses are not single-flight.
+
+        Args:
+            *iterables (Iterable): The iterables of the positional arguments.
+            executor (concurrent.futures.Executor, optional): The thread or process pool
+                executing the misses. Defaults to executing them in the calling thread.
+            chunksize (int, optional): The number of misses sent at once to each worker
+                of a process pool. Defaults to 1.
+
+        Yields:
+            Any: The result of each call.
+        """
+        calls = list(zip(*iterables))
+        keys = [call_key(args, {}) for args in calls]
+        store = backend or get_backend()
+        namespace = get_cache_namespace(func.__name__)
+        results = {}
+        for key in dict.fromkeys(keys):
+            result = _MISSING if key is None else lookup_memory(key)
+            if result is not _MISSING:
+                results[key] = result
+        if not force_rerun:
+            results.update(load_many(store, namespace, [key for key in dict.fromkeys(keys)
+                                                        if key is not None and key not in results]))
+
+        misses = {}
+        for key, args in zip(keys, calls):
+            if key is not None and key not in results and key not in misses:
+                misses[key] = args
+        for key in misses:
+            stats.record('miss', key)
+        if executor is None:
+            computed = (func(*args) for args in misses.values())
+        else:
+            computed = executor.map(partial(_call_uncached, wrapper), misses.values(), chunksize=chunksize)
+
+        pending = []
+        try:
+            for key, args in zip(keys, calls):
+                if key is None:  # not cached
+                    yield func(*args)
+                    continue
+                if key not in results:  # the first call of a miss, computed in this order
+                    try:
+                        results[key] = next(computed)
+                    except Exception as e:
+                        discard(store, namespace, key, e)
+                        raise
+                    pending.append((key, results[key]))
+                    if len(pending) >= MAP_BATCH_SIZE:
+                        save_many(store, namespace, pending)
+                        pending = []
+                yield results[key]
+        finally:
+            if pending:
+                save_many(store, namespace, pending)
+
+    def load_many(store, namespace, keys):
+        """Bulk-load the saved states of `keys`, returning a dict of the valid ones."""
+        start = time.perf_counter()
+        policies = active_policies(eviction)
+        has_ttl = any(policy.ttl is not None for policy in policies)
+        found = {}
+        for key, data in store.read_many(namespace, keys).items():
+            expires = None
+            if has_ttl or stale_after is not None:
+                entry = store.stat(namespace, key)
+                if entry is None:
+                    continue
+                if stale_after is not None:
+                    saved_at[key] = entry.mtime
+                expires = get_expiry(policies, entry.mtime) if has_ttl else None
+                if expires is not None and time.time() > expires:
+                    continue
+            try:
+                found[key], nbytes = read_value(io.BytesIO(data))
+            except Exception as e:
+                log.critical(f"Error loading saved state for {namespace}/{key}: {e}")
+                stats.record('corrupt', key, error=e)
+                store.delete(namespace, key)
+                continue
+            memory.put(key, found[key], nbytes, expires)
+            if any(policy.tracks_access for policy in policies):
+                store.touch(namespace, key)
+            stats.record('hit', key, (time.perf_counter() - start) / len(keys), nbytes)
+        return found
+
+    def save_many(store, namespace, items):
+        """Serialize and bulk-write the results of several keys."""
+        start = time.perf_counter()
+        entries = []
+        for key, result in items:
+            buffer = io.BytesIO()
+            nbytes = write_value(result, buffer, zero_copy, resolve_compression(compression),
+                                 resolve_serializer(serializer))
+            entries.append((key, buffer.getbuffer()))
+            memory.put(key, result, nbytes, get_expiry(active_policies(eviction), time.time()))
+            if stale_after is not None:
+                saved_at[key] = time.time()
+        store.write_many(namespace, entries)
+        for key, data in entries:
+            record_write(store, namespace, data.nbytes, eviction)
+            stats.record('save', key, (time.perf_counter() - start) / len(entries), data.nbytes)
+
+    wrapper.memory = memory
+    wrapper.stats = stats
+    wrapper.costs = costs
+    wrapper.cache_key = cache_key
+    wrapper.map = map_calls
     return wrapper
 
 
@@ -68,25 +632,47 @@ class Cached:
     """Cached class.
 
     The `Cached` class is used for caching function results.
-    - __init__(self, func): Initializes the Cached instance by storing the function and cache file path.
-    - __call__(self, *args, **kwargs): Checks if the cache file exists, loads and returns
-        the cached result if available, otherwise executes the function, saves the result to the cache file,
-        and returns it.
+    - __init__(self, func): Initializes the Cached instance by storing the function and its cache namespace.
+    - __call__(self, *args, **kwargs): Checks if the result is kept in memory or saved in the backend,
+        loads and returns the cached result if available, otherwise executes the function,
+        saves the result to the backend, and returns it.
     - load(cache_file): Loads and returns the cached result from a specified cache file.
     - save(cache_file, result): Saves the given result to the specified cache file.
     """
-    def __init__(self, func):
+    def __init__(self, func, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, backend=None,
+                 zero_copy=False, compression=None, lazy=False, serializer=None):
         """Initialize a new instance of the class.
 
         Args:
             func (function): The function to be cached.
+            max_entries (int, optional): The maximum number of results kept in memory.
+                Defaults to 128.
+            max_bytes (int, optional): The maximum approximate size in bytes
+                of the results kept in memory. Defaults to 64 MiB.
+            backend (Backend, optional): The storage backend. Defaults to the one set by `set_backend`.
+            zero_copy (bool, optional): If True, the result is stored so that it can be loaded
+                as read-only views on a memory mapping, as in `cacheme`. Defaults to False.
+            compression (str or Compression, optional): How to compress the result, as in `cacheme`.
+                Defaults to the compression set by `set_compression`.
+            lazy (bool, optional): If True, a saved state is returned as a `LazyValue`,
+                deserialized on first use. Defaults to False.
+            serializer (str or Serializer, optional): How to serialize the result, as in `cacheme`.
+                Defaults to the serializer set by `set_serializer`.
 
         Returns:
             None
         """
         self.func = func
+        self.lazy = lazy
+        self.zero_copy = zero_copy
+        self.compression = compression
+        self.serializer = serializer
+        self.namespace = get_cache_namespace(func.__name__)
         self.cache_file = get_cache_filepath(func.__name__)
-        _ensure_folder_exists(os.path.dirname(self.cache_file))
+        self.backend = backend or get_backend()
+        self.memory = MemoryCache(max_entries, max_bytes)
+        register_memory(func.__name__, self.memory)
+        self.stats = get_function_stats(func.__name__)
 
     def __call__(self, *args, **kwargs):
         """Execute the decorated function and cache its result in a file.
@@ -102,44 +688,84 @@ class Cached:
             None.
 
         Notes:
-            - If a cache file exists, the function retrieves the cached result from the file.
-            - If no cache file exists, the function executes the decorated function and caches
-              its result in a file.
+            - If the result is kept in memory, it is returned without touching the backend.
+            - If a saved state exists, the function retrieves the cached result from the backend.
+            - If no saved state exists, the function executes the decorated function and saves
+              its result to the backend.
         """
-        if os.path.exists(self.cache_file):
-            with open(self.cache_file, 'rb') as f:
-                # print(f"Using cached result from {self.cache_file}")
-                return pickle.load(f)
+        result = self.memory.get(None, _MISSING)
+        if result is not _MISSING:
+            self.stats.record('memory_hit')
+            return result
+
+        if self.lazy and self.backend.exists(self.namespace, None):
+            return LazyValue(self._load)
+        result = self._load(missing=_MISSING)
+        if result is not _MISSING:
+            return result
 
+        self.stats.record('miss')
+        start = time.perf_counter()
         result = self.func(*args, **kwargs)
-        with open(self.cache_file, 'wb') as f:
-            pickle.dump(result, f)
-            # print(f"Cached result to {self.cache_file}")
+        self.stats.record('compute', seconds=time.perf_counter() - start)
+        start = time.perf_counter()
+        with self.backend.create(self.namespace, None) as f:
+            nbytes = write_value(result, f, self.zero_copy, resolve_compression(self.compression),
+                                 resolve_serializer(self.serializer))
+            # print(f"Cached result to {self.namespace}")
+        self.memory.put(None, result, nbytes)
+        record_write(self.backend, self.namespace, nbytes)
+        self.stats.record('save', seconds=time.perf_counter() - start, nbytes=nbytes)
+        return result
+
+    def _load(self, missing=None):
+        """Load the saved state, returning `missing` if there is none."""
+        start = time.perf_counter()
+        f = self.backend.open(self.namespace, None)
+        if f is None:
+            if missing is None:
+                raise FileNotFoundError(f"Saved state for {self.namespace} removed before being loaded")
+            return missing
+        with f:
+            # print(f"Using cached result from {self.namespace}")
+            result, nbytes = read_value(f, self.zero_copy)
+        self.memory.put(None, result, nbytes)
+        self.stats.record('hit', seconds=time.perf_counter() - start, nbytes=nbytes)
         return result
 
     @staticmethod
-    def load(cache_file):
+    def load(cache_file, zero_copy=False, lazy=False):
         """Load the cached result from the specified cache file.
 
         Args:
             cache_file (str): The path to the cache file.
+            zero_copy (bool, optional): If True, results saved with `zero_copy` are returned
+                as read-only views on a memory mapping of the file. Defaults to False.
+            lazy (bool, optional): If True, a `LazyValue` is returned, that loads the file
+                on first use. Defaults to False.
 
         Returns:
             The cached result if the cache file exists and can be loaded, otherwise None.
         """
         if os.path.exists(cache_file):
+            if lazy:
+                return LazyValue(partial(Cached.load, cache_file, zero_copy))
             with open(cache_file, 'rb') as f:
                 print(f"Using cached result from {cache_file}")
-                return pickle.load(f)
+                return read_value(f, zero_copy)[0]
         return None
 
     @staticmethod
-    def save(cache_file, result):
+    def save(cache_file, result, zero_copy=False, serializer=None):
         """Save the given result to the specified cache file.
 
         Args:
             cache_file (str): The path to the cache file.
             result (Any): The result to be saved.
+            zero_copy (bool, optional): If True, bytes-like results and large buffers are stored
+                out of the pickle stream, so that they can be memory mapped on load. Defaults to False.
+            serializer (str or Serializer, optional): How to serialize the result, as in `cacheme`.
+                Defaults to the serializer set by `set_serializer`.
 
         Returns:
             None
@@ -148,11 +774,13 @@ class Cached:
             None
 
         Notes:
-            - The result is serialized using pickle and written to the cache file in binary mode.
-            - The cache file is opened in write binary mode ('wb') and closed automatically using a context manager.
+            - The result is serialized using pickle, or the given serializer,
+              and written to a temporary file in binary mode.
+            - The temporary file is renamed to the cache file only once completely written,
+              so that concurrent readers never see a partially written cache file.
         """
-        with open(cache_file, 'wb') as f:
-            pickle.dump(result, f)
+        with _atomic_open(cache_file) as f:
+            write_value(result, f, zero_copy, serializer=resolve_serializer(serializer))
             # print(f"Cached result to {cache_file}")
 
 
@@ -164,110 +792,363 @@ class CacheTransformer(ast.NodeTransformer):
 
     Here's a succinct explanation of what each method does:
 
-    1. `__init__(self, cache_dir)`: This is the constructor method. It initializes the `CacheTransformer`
-        instance with a `cache_dir` parameter, which is the directory where cache files will be stored.
+    1. `__init__(self, cache_dir, parallel=False)`: This is the constructor method. It initializes
+        the `CacheTransformer` instance with a `cache_dir` parameter, which is the directory where cache files
+        will be stored, and whether independent steps run in parallel.
 
     2. `visit_Assign(self, node)`: This method is called for each `ast.Assign` node in the AST.
         It checks if the assignment is a call to a function named `cacheme` and if the target
-        of the assignment is a simple variable. If these conditions are met, it creates an AST that
-        checks if a cached value exists, loads it if it does, or calls the function and saves the result
-        if it doesn't. The cached value is stored in a file named after the variable.
+        of the assignment is a simple variable. If these conditions are met, it replaces the assignment
+        with a step of the `Pipeline`, that loads the variable if its inputs did not change,
+        or calls the function with the remaining arguments and saves the result if they did.
+        The steps are recorded in `steps`, along with the variables and the upstream steps they depend on.
+
+    3. `visit_Expr(self, node)`: This method removes the calls to `initialize_caching`,
+        so that the transformed script does not transform itself again.
+
+    4. `visit_Module(self, node)`: In parallel mode, this method submits the steps at the top level
+        of the script to run concurrently, and joins each one before the first statement using it.
 
-    In summary, this class is used to transform Python code to automatically cache the results of function calls.
+    In summary, this class is used to transform Python code to automatically and incrementally
+    cache the results of function calls.
     """
-    def __init__(self, cache_dir):
+    def __init__(self, cache_dir, parallel=False):
         """Initialize a new instance of the class.
 
         Args:
             cache_dir (str): The directory where cache files will be stored.
+            parallel (bool, optional): If True, the steps at the top level of the script
+                are submitted to the pipeline's executor instead of run in turn,
+                and joined before the first statement using them. Defaults to False.
 
         Returns:
             None
         """
         self.cache_dir = cache_dir
+        self.parallel = parallel
+        self.steps = []
+        self._assigned_by = {}  # the last step assigning each variable
+        self._counts = {}  # the number of steps assigning each variable
+        self._functions = {}  # the functions defined at the top level of the script, by name
+        self._bound = set()  # the global variables bound by the top-level statements visited so far
+
+    def visit_Module(self, node):
+        """Visit the module, and in parallel mode submit its top-level steps and join them before use.
+
+        A variable assigned by a submitted step holds a pending result until joined.
+        It is joined before the first statement referring to it, other than a step,
+        including augmented assignments and deletions, or referring to a function
+        defined by the script, which may read it as a global when called,
+        before the first step whose functions read it as a global, and at the end of the script.
+
+        Args:
+            node (ast.Module): The module to be visited.
+
+        Returns:
+            ast.Module: The transformed module.
+        """
+        self._functions = {stmt.name: stmt for stmt in node.body
+                           if isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        if not self.parallel:
+            body = []
+            for stmt in node.body:
+                body.append(self.visit(stmt))
+                self._bind(stmt)
+            node.body = [stmt for stmt in body if stmt is not None]
+            return node
+        functions = set(self._functions)
+        body, pending = [], []
+        for stmt in node.body:
+            if self._is_step(stmt):
+                call_inputs = _referenced_names(ast.Module(body=[ast.Expr(value=stmt.value)], type_ignores=[]))
+                joined = [v for v in pending if v in self._globals_read(call_inputs)]
+                body.extend(_join(v) for v in joined)
+                pending = [v for v in pending if v not in joined]
+                body.append(self._transform_step(stmt, 'submit'))
+                if stmt.targets[0].id not in pending:
+                    pending.append(stmt.targets[0].id)
+                self._bind(stmt)
+                continue
+            names = [n for n in ast.walk(stmt) if isinstance(n, ast.Name)]
+            # Augmented assignments and deletions use the variable they target
+            used = {n.id for n in names if not isinstance(n.ctx, ast.Store)}
+            used.update(n.target.id for n in ast.walk(stmt)
+                        if isinstance(n, ast.AugAssign) and isinstance(n.target, ast.Name))
+            # A script function may be called through a reference, e.g. `map(f, ...)`
+            calls_script = not functions.isdisjoint(used)
+            joined = [v for v in pending if calls_script or v in used]
+            body.extend(_join(v) for v in joined)
+            stored = {n.id for n in names if not isinstance(n.ctx, ast.Load)}
+            pending = [v for v in pending if v not in joined and v not in stored]
+            body.append(self.visit(stmt))
+            self._bind(stmt)
+        body.extend(_join(v) for v in pending)
+        node.body = [stmt for stmt in body if stmt is not None]
+        return node
 
     def visit_Assign(self, node):
         """Visit an assignment node in the abstract syntax tree (AST) and transform it.
 
         Visit an assignment node in the abstract syntax tree (AST) and transform it if the assignment
         is a call to a function named 'cacheme' and the target of the assignment is a simple variable.
-        If these conditions are met, the function creates an AST that checks if a cached value exists,
-        loads it if it does, or calls the function and saves the result if it doesn't. The cached
-        value is stored in a file named after the variable.
+        If these conditions are met, `x = cacheme(f, *args, **kwargs)` is transformed into
+        `x = _cachorro_pipeline.run('x', lambda f, ...: f(*args, **kwargs), {'f': f, ...})`,
+        passing the variables the call refers to, and the global variables
+        read by the functions of the script it calls. Assigning any other value to a variable
+        cuts its dependency on the step that assigned it before.
 
         Args:
             node (ast.Assign): The assignment node to be visited.
 
         Returns:
-            Union[ast.Assign, List[Union[ast.Assign, ast.If]]]: If the conditions for transformation
-            are met, a list of AST nodes representing the transformed code is returned. Otherwise,
-            the original assignment node is returned.
+            ast.Assign: The transformed assignment if the conditions for transformation are met,
+            otherwise the original assignment node.
         """
-        if (isinstance(node.value, ast.Call) and
+        if self._is_step(node):
+            return self._transform_step(node, 'run')
+        for target in node.targets:
+            for name in ast.walk(target):
+                if isinstance(name, ast.Name):
+                    self._assigned_by.pop(name.id, None)
+        return node
+
+    @staticmethod
+    def _is_step(node):
+        return (isinstance(node, ast.Assign) and
+                isinstance(node.value, ast.Call) and
                 isinstance(node.targets[0], ast.Name) and
+                len(node.targets) == 1 and
                 hasattr(node.value.func, 'id') and
-                node.value.func.id == 'cacheme'):
-
-            var_name = node.targets[0].id
-            func_name = node.value.args[0].id
-            cache_file = os.path.join(self.cache_dir, f"{var_name}_cache.pkl")
-
-            check_cache = ast.parse(f"{var_name} = Cached.load('{cache_file}')").body[0]
-            call_func = ast.Assign(
-                targets=[node.targets[0]],
-                value=ast.Call(func=ast.Name(id=func_name, ctx=ast.Load()), args=[], keywords=[])
-            )
-            save_cache = ast.parse(f"Cached.save('{cache_file}', {var_name})").body[0]
-
-            return [check_cache,
-                    ast.If(
-                        test=ast.Compare(
-                            left=ast.Name(id=var_name, ctx=ast.Load()),
-                            ops=[ast.Is()],
-                            comparators=[ast.Constant(value=None)]
-                        ),
-                        body=[call_func, save_cache],
-                        orelse=[]
-                    )]
+                node.value.func.id == 'cacheme' and
+                node.value.args)
+
+    def _bind(self, stmt):
+        """Record the global variables a top-level statement binds or deletes, outside of the scopes it defines."""
+        nodes = [stmt]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self._bound.add(node.name)
+                continue
+            if isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+                continue
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                self._bound.add(node.id)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Del):
+                self._bound.discard(node.id)
+            elif isinstance(node, ast.alias) and node.name != '*':
+                self._bound.add((node.asname or node.name).split('.')[0])
+            nodes.extend(ast.iter_child_nodes(node))
+
+    def _globals_read(self, names):
+        """Return the global variables that the script functions among `names` read.
+
+        The functions of the script they call are followed, recursively. Only the variables
+        bound by the top-level statements before, or assigned by steps, are returned:
+        the others are builtins, or not defined yet.
+        """
+        found, seen, functions = [], set(), [name for name in names if name in self._functions]
+        while functions:
+            function = functions.pop()
+            if function in seen:
+                continue
+            seen.add(function)
+            for name in _referenced_names(self._functions[function]):
+                if name in self._functions:
+                    functions.append(name)
+                elif (name in self._bound or name in self._assigned_by) and name not in found:
+                    found.append(name)
+        return tuple(found)
+
+    def _transform_step(self, node, method):
+        var_name = node.targets[0].id
+        func, *args = node.value.args
+        call = ast.Call(func=func, args=args, keywords=node.value.keywords)
+        inputs = _referenced_names(ast.Module(body=[ast.Expr(value=call)], type_ignores=[]))
+        # The globals read by the functions called are inputs too, digested into the key
+        inputs += tuple(name for name in self._globals_read(inputs) if name not in inputs)
+        count = self._counts[var_name] = self._counts.get(var_name, 0) + 1
+        name = f"{var_name}#{count}" if count > 1 else var_name
+        upstream = tuple(self._assigned_by[n] for n in inputs if n in self._assigned_by)
+        self.steps.append(Step(name, var_name, inputs, upstream))
+        self._assigned_by[var_name] = name
+
+        run = ast.Call(
+            func=ast.Attribute(value=ast.Name(id=PIPELINE_NAME, ctx=ast.Load()), attr=method, ctx=ast.Load()),
+            args=[
+                ast.Constant(value=name),
+                ast.Lambda(args=ast.arguments(posonlyargs=[], args=[ast.arg(arg=n) for n in inputs],
+                                              vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None,
+                                              defaults=[]),
+                           body=call),
+                ast.Dict(keys=[ast.Constant(value=n) for n in inputs],
+                         values=[ast.Name(id=n, ctx=ast.Load()) for n in inputs]),
+            ],
+            keywords=[])
+        return ast.copy_location(ast.Assign(targets=node.targets, value=run), node)
+
+    def visit_Expr(self, node):
+        """Remove the calls to `initialize_caching` from the transformed script."""
+        if (isinstance(node.value, ast.Call) and
+                getattr(node.value.func, 'id', getattr(node.value.func, 'attr', None)) == 'initialize_caching'):
+            return ast.Pass()
         return node
 
 
-def transform_and_execute(script_path):
+def _join(name):
+    """Return the statement replacing the pending result held by variable `name` with the result."""
+    return ast.parse(f"{name} = {PIPELINE_NAME}.join({name})").body[0]
+
+
+def _referenced_names(tree):
+    """Return the names read and never assigned in `tree`, in order of appearance."""
+    loaded, stored = [], set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                if node.id not in loaded:
+                    loaded.append(node.id)
+            else:
+                stored.add(node.id)
+        elif isinstance(node, ast.arg):
+            stored.add(node.arg)
+    return tuple(name for name in loaded if name not in stored)
+
+
+@lru_cache(maxsize=None)
+def _transformer_digest():
+    """Return the digest of the source of the transformer and of the pipeline, that the compiled scripts depend on.
+
+    Any change to them, even without a new version, recompiles the scripts.
+    """
+    sources = []
+    for module in (sys.modules[__name__], sys.modules[Pipeline.__module__]):
+        with open(module.__file__, 'rb') as file:
+            sources.append(file.read())
+    return hash_value(sources)
+
+
+def _compile_script(script_path, cache_dir, parallel, bytecode_cache, timings):
+    """Return the transformed code of a script and its steps, reusing the compiled bytecode if unchanged.
+
+    The code object and the steps are marshalled to `<cache_dir>/.bytecode/<script>-<key>.marshal`,
+    keyed on the script path and source, the parallel mode, the Python bytecode magic number
+    and the source of the transformer.
+    """
+    start = time.perf_counter()
+    with open(script_path, "rb") as source:
+        data = source.read()
+    timings['read'] = time.perf_counter() - start
+
+    bytecode_file = None
+    if bytecode_cache:
+        start = time.perf_counter()
+        key = hash_value((os.path.abspath(script_path), data, parallel, importlib.util.MAGIC_NUMBER,
+                          _transformer_digest()))
+        prefix = f"{os.path.splitext(os.path.basename(script_path))[0]}-"
+        bytecode_file = os.path.join(cache_dir, '.bytecode', f"{prefix}{key}.marshal")
+        try:
+            with open(bytecode_file, 'rb') as f:
+                code, steps = marshal.load(f)
+            timings['load_bytecode'] = time.perf_counter() - start
+            return code, [Step(*step) for step in steps]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.critical(f"Error loading the compiled bytecode of {script_path}: {e}")
+
+    start = time.perf_counter()
+    tree = ast.parse(data, filename=script_path)
+    timings['parse'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    transformer = CacheTransformer(cache_dir, parallel=parallel)
+    new_tree = transformer.visit(tree)
+    ast.fix_missing_locations(new_tree)
+    timings['transform'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    code = compile(new_tree, filename=script_path, mode="exec")
+    timings['compile'] = time.perf_counter() - start
+
+    if bytecode_file is not None:
+        start = time.perf_counter()
+        folder = os.path.dirname(bytecode_file)
+        os.makedirs(folder, exist_ok=True)
+        with _atomic_open(bytecode_file) as f:
+            marshal.dump((code, tuple(tuple(step) for step in transformer.steps)), f)
+        for name in os.listdir(folder):  # the bytecode of previous versions of the script
+            if name.startswith(prefix) and name.endswith('.marshal') and name != os.path.basename(bytecode_file):
+                os.remove(os.path.join(folder, name))
+        timings['save_bytecode'] = time.perf_counter() - start
+    return code, transformer.steps
+
+
+def transform_and_execute(script_path, cache_dir='./cache', executor=None, lazy=False, bytecode_cache=True):
     """Transform and execute a script located at the given path.
 
     Args:
         script_path (str): The path to the script to be transformed and executed.
+        cache_dir (str, optional): The directory where the cache files will be stored.
+            Defaults to './cache'.
+        executor (concurrent.futures.Executor, optional): If given, the steps that do not depend
+            on each other run concurrently in it. The steps run as closures over the script,
+            so that the executor must be a thread pool. Defaults to running the steps in turn.
+        lazy (bool, optional): If True, the steps whose saved state exists are assigned
+            a `LazyValue`, deserialized on first use. Defaults to False.
+        bytecode_cache (bool, optional): If True, the transformed script is compiled once
+            and its bytecode saved in `cache_dir`, to be reused while the script,
+            the Python version and the transformer are unchanged. Defaults to True.
 
     Returns:
-        None
+        Pipeline: The steps of the script, with the ones executed and loaded,
+            and the `timings` of the startup phases and of the execution, in seconds.
     """
-    with open(script_path, "r") as source:
-        tree = ast.parse(source.read())
-
-    transformer = CacheTransformer(Cached.cache_dir)
-    new_tree = transformer.visit(tree)
-    ast.fix_missing_locations(new_tree)
+    timings = {}
+    code, steps = _compile_script(script_path, cache_dir, executor is not None, bytecode_cache, timings)
 
-    exec(compile(new_tree, filename=script_path, mode="exec"))
+    pipeline = Pipeline(FileBackend(cache_dir), steps, executor, lazy)
+    pipeline.timings = timings
+    namespace = {'__name__': '__main__', '__file__': script_path, '__builtins__': builtins,
+                 PIPELINE_NAME: pipeline}
+    start = time.perf_counter()
+    try:
+        exec(code, namespace)
+    finally:
+        pipeline.wait()
+        timings['execute'] = time.perf_counter() - start
+    pipeline.prune()
+    log.info(f"Executed steps {pipeline.executed}, loaded steps {pipeline.loaded}")
+    log.info("Startup and execution timings: " +
+             ", ".join(f"{phase} {seconds * 1000:.1f}ms" for phase, seconds in timings.items()))
+    return pipeline
 
 
-def initialize_caching(cache_dir='./cache'):
+def initialize_caching(cache_dir='./cache', parallel=False, max_workers=None, lazy=False):
     """Initialize caching for a script located at the given path.
 
     Args:
         cache_dir (str): The directory where the cache files will be stored. Defaults to './cache'.
+        parallel (bool, optional): If True, the cached steps that do not depend on each other
+            run concurrently in a thread pool. Defaults to False.
+        max_workers (int, optional): The number of threads of the pool. Defaults to the
+            `concurrent.futures.ThreadPoolExecutor` default.
+        lazy (bool, optional): If True, the cached variables are only deserialized
+            when first used. Defaults to False.
 
     Returns:
         None
 
     Raises:
         FileNotFoundError: If the script file specified by `sys.argv[0]` does not exist.
+        SystemExit: Once the transformed script has run, so that the original one does not run.
 
     This function takes the path to a script file as input and transforms and executes the script
     by adding caching functionality. The cache files are stored in the specified `cache_dir`.
 
     The function first obtains the absolute path of the script file using `sys.argv[0]`. It then
     calls the `transform_and_execute` function to transform and execute the script.
+    Each cached step is rerun only when its function, its arguments or an upstream step changed.
 
     Note:
         The `sys.argv[0]` argument is used to obtain the path to the script file. Make sure that
@@ -278,4 +1159,9 @@ def initialize_caching(cache_dir='./cache'):
         None
     """
     script_path = os.path.abspath(sys.argv[0])
-    transform_and_execute(script_path)
+    if not parallel:
+        transform_and_execute(script_path, cache_dir, lazy=lazy)
+    else:
+        with ThreadPoolExecutor(max_workers) as executor:
+            transform_and_execute(script_path, cache_dir, executor, lazy)
+    sys.exit(0)
@@ -0,0 +1,251 @@
+"""Disk quota, time-to-live and LRU eviction of the saved states."""
+import logging
+import threading
+import time
+from collections import namedtuple
+from .backends import get_backend
+from .memory import invalidate_memory
+from .shared import invalidate_shared
+from .utils import get_cache_namespace
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+PruneReport = namedtuple('PruneReport', ['removed_entries', 'removed_bytes', 'entries', 'bytes'])
+
+_global_policy = None
+
+
+class EvictionPolicy:
+    """EvictionPolicy class.
+
+    Limits on the saved states of a single function, when given to `cacheme`,
+    or of a whole backend, when set with `set_eviction_policy`.
+
+    - Entries older than `ttl` seconds since they were written are expired:
+      they are never loaded, and are removed on pruning.
+    - When the entries exceed `max_bytes` or `max_entries`, the least recently
+      accessed ones are removed, down to `low_watermark` times the limits,
+      so that pruning does not run again at the very next write.
+
+    The limits are enforced incrementally: the policy keeps running totals
+    of the written bytes and entries, initialized with a single scan
+    of the backend, and prunes only when a write makes them exceed a limit.
+    Pruning rescans the backend, correcting the totals for writes made
+    by other processes and for overwritten entries.
+    """
+    def __init__(self, max_bytes=None, max_entries=None, ttl=None, low_watermark=0.9):
+        """Initialize a new instance of the class.
+
+        Args:
+            max_bytes (int, optional): The maximum total size of the entries, in bytes.
+                Defaults to no limit.
+            max_entries (int, optional): The maximum number of entries. Defaults to no limit.
+            ttl (float, optional): The time to live of an entry, in seconds since it was written.
+                Defaults to no expiry.
+            low_watermark (float, optional): The fraction of the limits pruning brings the entries down to.
+                Defaults to 0.9.
+
+        Returns:
+            None
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.low_watermark = low_watermark
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    @property
+    def tracks_access(self):
+        """Whether the policy evicts by last access, so that hits must be recorded in the backend."""
+        return self.max_bytes is not None or self.max_entries is not None
+
+    def is_expired(self, mtime, now=None):
+        """Check whether an entry written at `mtime` has outlived the time to live."""
+        return self.ttl is not None and (now or time.time()) - mtime > self.ttl
+
+    def record_write(self, backend, namespace, nbytes):
+        """Account for an entry written to `backend`, pruning if a limit is exceeded.
+
+        Args:
+            backend (Backend): The backend written to.
+            namespace (str or None): The namespace the policy applies to, or None for the whole backend.
+            nbytes (int): The size of the written entry.
+        """
+        if not self.tracks_access:
+            return
+        scope = (id(backend), namespace)
+        with self._lock:
+            totals = self._totals.get(scope)
+            if totals is None:
+                totals = self._totals[scope] = _scan_totals(backend, namespace)
+            else:
+                totals[0] += 1
+                totals[1] += nbytes
+            exceeded = self._exceeds(*totals)
+        if exceeded:
+            self.prune(backend, namespace)
+
+    def prune(self, backend, namespace=None):
+        """Remove the expired entries, then the least recently accessed ones beyond the limits.
+
+        Args:
+            backend (Backend): The backend to prune.
+            namespace (str, optional): The namespace to prune. Defaults to every namespace.
+
+        Returns:
+            PruneReport: The number and size of the removed entries, and of the remaining ones.
+        """
+        now = time.time()
+        kept = []
+        removed_entries = removed_bytes = 0
+        for entry in list(backend.entries(namespace)):
+            if self.is_expired(entry.mtime, now) and backend.delete(entry.namespace, entry.key):
+                invalidate_shared(entry.namespace, entry.key)
+                removed_entries += 1
+                removed_bytes += entry.size
+            else:
+                kept.append(entry)
+
+        entries = len(kept)
+        nbytes = sum(entry.size for entry in kept)
+        if self._exceeds(entries, nbytes):
+            max_entries = None if self.max_entries is None else int(self.max_entries * self.low_watermark)
+            max_bytes = None if self.max_bytes is None else int(self.max_bytes * self.low_watermark)
+            kept.sort(key=lambda entry: entry.atime)
+            for entry in kept:
+                if ((max_entries is None or entries <= max_entries) and
+                        (max_bytes is None or nbytes <= max_bytes)):
+                    break
+                if backend.delete(entry.namespace, entry.key):
+                    invalidate_shared(entry.namespace, entry.key)
+                    removed_entries += 1
+                    removed_bytes += entry.size
+                entries -= 1
+                nbytes -= entry.size
+
+        with self._lock:
+            self._totals[(id(backend), namespace)] = [entries, nbytes]
+        if removed_entries:
+            log.info(f"Pruned {removed_entries} entries, {removed_bytes} bytes, "
+                     f"from {namespace or 'every namespace'}")
+        return PruneReport(removed_entries, removed_bytes, entries, nbytes)
+
+    def _exceeds(self, entries, nbytes):
+        return ((self.max_entries is not None and entries > self.max_entries) or
+                (self.max_bytes is not None and nbytes > self.max_bytes))
+
+
+def _scan_totals(backend, namespace):
+    entries = nbytes = 0
+    for entry in backend.entries(namespace):
+        entries += 1
+        nbytes += entry.size
+    return [entries, nbytes]
+
+
+def active_policies(policy=None):
+    """Return the policies that apply to a function with its own `policy`: that one and the global one."""
+    return tuple(p for p in (policy, _global_policy) if p is not None)
+
+
+def get_expiry(policies, mtime):
+    """Return the time at which an entry written at `mtime` expires under `policies`, or None."""
+    ttls = [p.ttl for p in policies if p.ttl is not None]
+    return mtime + min(ttls) if ttls else None
+
+
+def record_write(backend, namespace, nbytes, policy=None):
+    """Account for an entry written to `namespace`, in the function's `policy` and in the global one."""
+    if policy is not None:
+        policy.record_write(backend, namespace, nbytes)
+    if _global_policy is not None:
+        _global_policy.record_write(backend, None, nbytes)
+
+
+def get_eviction_policy():
+    """Return the eviction policy applied to the whole default backend, or None."""
+    return _global_policy
+
+
+def set_eviction_policy(policy):
+    """Set the eviction policy applied to every namespace of a backend, on top of the per-function ones.
+
+    Args:
+        policy (EvictionPolicy or None): The global policy, or None to remove it.
+
+    Example:
+        >>> set_eviction_policy(EvictionPolicy(max_bytes=10 * 1024 ** 3, ttl=7 * 24 * 3600))
+    """
+    global _global_policy
+    _global_policy = policy
+
+
+def prune(func_name=None, program_name=None, backend=None, policy=None):
+    """Prune the saved states, reporting what was freed.
+
+    Args:
+        func_name (str, optional): The name of the function whose saved states to prune.
+            If not provided, the whole backend is pruned.
+        program_name (str, optional): The name of the program.
+            If not provided, it will be derived from the current file name.
+        backend (Backend, optional): The storage backend. Defaults to the one set by `set_backend`.
+        policy (EvictionPolicy, optional): The limits to enforce. Defaults to the global policy.
+
+    Returns:
+        PruneReport: The number and size of the removed entries, and of the remaining ones.
+
+    Example:
+        >>> prune(policy=EvictionPolicy(max_bytes=1024 ** 3))
+        PruneReport(removed_entries=12, removed_bytes=150000000, entries=80, bytes=960000000)
+    """
+    backend = backend or get_backend()
+    policy = policy or _global_policy or EvictionPolicy()
+    namespace = None if func_name is None else get_cache_namespace(func_name, program_name)
+    report = policy.prune(backend, namespace)
+    if report.removed_entries and func_name is not None:
+        invalidate_memory(func_name)
+    return report
+
+
+class Sweeper(threading.Thread):
+    """Sweeper class.
+
+    A daemon thread pruning a backend every `interval` seconds,
+    removing expired entries even when no writes happen.
+
+    Example:
+        >>> sweeper = Sweeper(EvictionPolicy(ttl=3600), interval=300)
+        >>> sweeper.start()
+        >>> sweeper.stop()
+    """
+    def __init__(self, policy=None, interval=60.0, backend=None):
+        """Initialize a new instance of the class.
+
+        Args:
+            policy (EvictionPolicy, optional): The limits to enforce. Defaults to the global policy.
+            interval (float, optional): The seconds between two sweeps. Defaults to 60.
+            backend (Backend, optional): The storage backend. Defaults to the one set by `set_backend`.
+
+        Returns:
+            None
+        """
+        super().__init__(name='cachorro-sweeper', daemon=True)
+        self.policy = policy
+        self.interval = interval
+        self.backend = backend
+        self._stopped = threading.Event()
+
+    def run(self):
+        """Prune the backend every `interval` seconds, until stopped."""
+        while not self._stopped.wait(self.interval):
+            try:
+                prune(backend=self.backend, policy=self.policy)
+            except Exception as e:
+                log.critical(f"Error pruning saved states: {e}")
+
+    def stop(self):
+        """Stop sweeping."""
+        self._stopped.set()
@@ -0,0 +1,268 @@
+"""Argument hashing used to build per-call cache keys."""
+import hashlib
+import inspect
+import pickle
+import struct
+import sys
+import types
+
+
+_DIGEST_SIZE = 16
+_PICKLE_PROTOCOL = 4  # fixed, so that digests are stable across interpreters
+
+
+class UnhashableError(TypeError):
+    """An argument that can be neither hashed from its contents nor pickled."""
+
+
+def _update_none(h, obj):
+    h.update(b'N')
+
+
+def _update_bool(h, obj):
+    h.update(b'B1' if obj else b'B0')
+
+
+def _update_int(h, obj):
+    data = str(int(obj)).encode()
+    h.update(b'I' + struct.pack('<Q', len(data)) + data)
+
+
+def _update_float(h, obj):
+    h.update(b'F' + struct.pack('<d', obj))
+
+
+def _update_complex(h, obj):
+    h.update(b'C' + struct.pack('<dd', obj.real, obj.imag))
+
+
+def _update_str(h, obj):
+    data = obj.encode('utf-8', 'surrogatepass')
+    h.update(b'S' + struct.pack('<Q', len(data)))
+    h.update(data)
+
+
+def _update_bytes(h, obj):
+    data = memoryview(obj)
+    # Strided views, like memoryview(b'abcdef')[::2], cannot be cast and are copied instead
+    data = data.cast('B') if data.c_contiguous else memoryview(data.tobytes())
+    h.update(b'Y' + struct.pack('<Q', data.nbytes))
+    h.update(data)
+
+
+def _update_sequence(tag):
+    def update(h, obj):
+        h.update(tag + struct.pack('<Q', len(obj)))
+        for item in obj:
+            _update(h, item)
+    return update
+
+
+def _item_digest(*items):
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    for item in items:
+        _update(h, item)
+    return h.digest()
+
+
+def _update_mapping(h, obj):
+    # Equal dicts must hash equally regardless of insertion order, and keys
+    # are not necessarily orderable, so the sorted per-item digests are fed.
+    h.update(b'D' + struct.pack('<Q', len(obj)))
+    for digest in sorted(_item_digest(k, v) for k, v in obj.items()):
+        h.update(digest)
+
+
+def _update_set(h, obj):
+    h.update(b'E' + struct.pack('<Q', len(obj)))
+    for digest in sorted(_item_digest(item) for item in obj):
+        h.update(digest)
+
+
+def _update_ndarray(h, obj):
+    if obj.dtype.hasobject:
+        _update_pickle(h, obj)
+        return
+    np = sys.modules['numpy']
+    header = f"{obj.dtype.str}{obj.shape}".encode()
+    h.update(b'A' + struct.pack('<Q', len(header)) + header)
+    # Hash the raw buffer, viewed as bytes, without going through pickle
+    h.update(np.ascontiguousarray(obj).reshape(-1).view(np.uint8))
+
+
+def _update_function(h, obj):
+    # Lambdas and local functions cannot be pickled: they are identified by name and code,
+    # and by the values they close over
+    name = f"{obj.__module__}.{obj.__qualname__}".encode()
+    h.update(b'U' + struct.pack('<Q', len(name)) + name)
+    _update_str(h, fingerprint_function(obj))
+    cells = []
+    for cell in obj.__closure__ or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:  # not assigned yet
+            value = None
+        cells.append(None if value is obj else value)
+    _update(h, (obj.__defaults__, obj.__kwdefaults__, cells))
+
+
+def _update_pickle(h, obj):
+    cls = type(obj)
+    name = f"{cls.__module__}.{cls.__qualname__}".encode()
+    try:
+        data = pickle.dumps(obj, protocol=_PICKLE_PROTOCOL)
+    except Exception as e:
+        raise UnhashableError(f"Cannot hash a {cls.__qualname__}, which cannot be pickled: {e}") from e
+    h.update(b'P' + struct.pack('<QQ', len(name), len(data)) + name)
+    h.update(data)
+
+
+_HASHERS = {
+    type(None): _update_none,
+    bool: _update_bool,
+    int: _update_int,
+    float: _update_float,
+    complex: _update_complex,
+    str: _update_str,
+    bytes: _update_bytes,
+    bytearray: _update_bytes,
+    memoryview: _update_bytes,
+    types.FunctionType: _update_function,
+    tuple: _update_sequence(b'T'),
+    list: _update_sequence(b'L'),
+    dict: _update_mapping,
+    set: _update_set,
+    frozenset: _update_set,
+}
+
+
+def _find_hasher(obj):
+    """Find the hasher for a type that has no exact entry in `_HASHERS`."""
+    np = sys.modules.get('numpy')  # no array can exist if numpy was never imported
+    if np is not None and isinstance(obj, np.ndarray):
+        return _update_ndarray
+    if np is not None and isinstance(obj, np.generic) and not obj.dtype.hasobject:
+        return lambda h, o: _update_ndarray(h, np.asarray(o))
+    for base, hasher in _HASHERS.items():
+        if isinstance(obj, base):
+            return hasher
+    return _update_pickle
+
+
+def _update(h, obj):
+    hasher = _HASHERS.get(type(obj))
+    if hasher is None:
+        hasher = _find_hasher(obj)
+    hasher(h, obj)
+
+
+def hash_value(obj):
+    """Return a stable hexadecimal digest of a single value.
+
+    Builtin scalars, strings, bytes-like objects, tuples, lists, dicts, sets
+    and NumPy arrays are hashed directly from their contents, and Python functions
+    from their name, code and closure; any other object is hashed from its pickled representation.
+
+    Args:
+        obj (Any): The value to hash.
+
+    Returns:
+        str: The hexadecimal digest.
+
+    Raises:
+        UnhashableError: If the value, or an item of it, cannot be pickled.
+    """
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    _update(h, obj)
+    return h.hexdigest()
+
+
+def _update_code(h, code, func_globals, module, follow_calls, seen):
+    h.update(b'K')
+    _update_bytes(h, code.co_code)
+    _update(h, code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):  # nested functions, lambdas and comprehensions
+            _update_code(h, const, func_globals, module, follow_calls, seen)
+        else:
+            _update(h, const)
+    if not follow_calls:
+        return
+    for name in code.co_names:
+        callee = func_globals.get(name)
+        if not inspect.isfunction(callee):
+            continue
+        callee = inspect.unwrap(callee)
+        if callee.__module__ == module and callee not in seen:
+            seen.add(callee)
+            _update_code(h, callee.__code__, callee.__globals__, module, follow_calls, seen)
+
+
+def fingerprint_function(func, follow_calls=False):
+    """Return a stable hexadecimal digest of a function's code.
+
+    The digest covers the bytecode, the constants and the global names of the
+    function and of the functions nested in it, but not line numbers, so that
+    moving a function around its file, or editing other functions, leaves it unchanged.
+    Bytecode differs between Python versions, so the digest does too.
+
+    Args:
+        func (function): The function to fingerprint. Decorated functions are unwrapped.
+        follow_calls (bool, optional): If True, the functions it refers to by a global name
+            and that are defined in the same module are fingerprinted too, recursively.
+            Defaults to False.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    func = inspect.unwrap(func)
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    _update_code(h, func.__code__, func.__globals__, func.__module__, follow_calls, {func})
+    return h.hexdigest()
+
+
+def hash_arguments(signature, args, kwargs, fingerprint=None):
+    """Return a stable digest of a call's arguments.
+
+    The arguments are bound to the function signature, with defaults applied,
+    so that `f(1)`, `f(x=1)` and `f(1, y=<default>)` all share the same key.
+
+    Args:
+        signature (inspect.Signature): The signature of the called function.
+        args (tuple): The positional arguments of the call.
+        kwargs (dict): The keyword arguments of the call.
+        fingerprint (str, optional): The fingerprint of the function's code, as returned
+            by `fingerprint_function`, folded into the digest.
+
+    Returns:
+        str: The hexadecimal digest of the normalized arguments.
+
+    Raises:
+        TypeError: If the arguments do not match the signature.
+        UnhashableError: If an argument cannot be hashed.
+    """
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    h = hashlib.blake2b(digest_size=_DIGEST_SIZE)
+    if fingerprint is not None:
+        _update_str(h, fingerprint)
+    for name, value in bound.arguments.items():
+        _update_str(h, name)
+        _update(h, value)
+    return h.hexdigest()
+
+
+def make_key(func, *args, **kwargs):
+    """Return the cache key that `cacheme` uses for `func(*args, **kwargs)`.
+
+    For a function decorated with `cacheme`, the key includes the fingerprint
+    of its code, as it does in the decorated function.
+
+    Example:
+        >>> make_key(my_function, [1, 2, 3])
+        '3f1c...'
+    """
+    cache_key = getattr(func, 'cache_key', None)
+    if cache_key is not None:
+        return cache_key(*args, **kwargs)
+    return hash_arguments(inspect.signature(func), args, kwargs)
@@ -0,0 +1,126 @@
+"""Lazy handles on saved states, deserialized on first use."""
+import operator
+import threading
+
+
+_UNLOADED = object()
+
+
+class LazyValue:
+    """LazyValue class.
+
+    A proxy for a saved state, that is only loaded the first time it is used:
+    attribute access, calls, operators, iteration, `len`, `repr`, and so on,
+    are forwarded to the loaded value. `isinstance` checks see the class of
+    the loaded value, and load it. Pickling a proxy pickles the loaded value.
+
+    `materialize` returns the loaded value itself, for code that checks
+    the exact type with `type()` or needs the object identity.
+
+    An entry removed or corrupted between the creation of the proxy
+    and its first use makes that use raise the loading error.
+
+    Example:
+        >>> data = load_cache('my_function', lazy=True)  # nothing is deserialized yet
+        >>> len(data)  # loads the saved state
+        1000
+    """
+    __slots__ = ('_loader', '_value', '_lock')
+
+    def __init__(self, loader):
+        """Initialize a new instance of the class.
+
+        Args:
+            loader (Callable): A function without arguments returning the value.
+
+        Returns:
+            None
+        """
+        object.__setattr__(self, '_loader', loader)
+        object.__setattr__(self, '_value', _UNLOADED)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _load(self):
+        value = object.__getattribute__(self, '_value')
+        if value is _UNLOADED:
+            with object.__getattribute__(self, '_lock'):
+                value = object.__getattribute__(self, '_value')
+                if value is _UNLOADED:
+                    value = object.__getattribute__(self, '_loader')()
+                    object.__setattr__(self, '_value', value)
+                    object.__setattr__(self, '_loader', None)
+        return value
+
+    @property
+    def __class__(self):
+        """Return the class of the loaded value, so that `isinstance` checks see through the proxy."""
+        return type(self._load())
+
+    def __getattr__(self, name):
+        """Return an attribute of the loaded value."""
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        """Set an attribute of the loaded value."""
+        setattr(self._load(), name, value)
+
+    def __delattr__(self, name):
+        """Delete an attribute of the loaded value."""
+        delattr(self._load(), name)
+
+    def __dir__(self):
+        """List the attributes of the loaded value."""
+        return dir(self._load())
+
+    def __call__(self, *args, **kwargs):
+        """Call the loaded value."""
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        """Return the representation of the loaded value."""
+        return repr(self._load())
+
+    def __reduce_ex__(self, protocol):
+        """Pickle the loaded value instead of the proxy."""
+        return self._load().__reduce_ex__(protocol)
+
+
+def _forward(function):
+    def method(self, *args):
+        return function(self._load(), *args)
+    return method
+
+
+def _forward_reflected(function):
+    def method(self, other):
+        return function(other, self._load())
+    return method
+
+
+for _name, _function in {
+        '__str__': str, '__bytes__': bytes, '__format__': format, '__hash__': hash, '__bool__': bool,
+        '__len__': len, '__iter__': iter, '__reversed__': reversed, '__contains__': operator.contains,
+        '__getitem__': operator.getitem, '__setitem__': operator.setitem, '__delitem__': operator.delitem,
+        '__enter__': lambda value: value.__enter__(), '__exit__': lambda value, *args: value.__exit__(*args),
+        '__int__': int, '__float__': float, '__complex__': complex, '__index__': operator.index,
+        '__round__': round, '__neg__': operator.neg, '__pos__': operator.pos, '__abs__': abs,
+        '__invert__': operator.invert, '__lt__': operator.lt, '__le__': operator.le, '__eq__': operator.eq,
+        '__ne__': operator.ne, '__gt__': operator.gt, '__ge__': operator.ge}.items():
+    setattr(LazyValue, _name, _forward(_function))
+
+for _name in ('add', 'sub', 'mul', 'matmul', 'truediv', 'floordiv', 'mod', 'pow', 'lshift', 'rshift',
+              'and', 'xor', 'or'):
+    _function = getattr(operator, f"{_name}_" if _name in ('and', 'or') else _name)
+    setattr(LazyValue, f"__{_name}__", _forward(_function))
+    setattr(LazyValue, f"__r{_name}__", _forward_reflected(_function))
+    setattr(LazyValue, f"__i{_name}__", _forward(getattr(operator, f"i{_name}")))
+LazyValue.__divmod__ = _forward(divmod)
+LazyValue.__rdivmod__ = _forward_reflected(divmod)
+del _name, _function
+
+
+def materialize(value):
+    """Return the loaded value of a `LazyValue`, loading it if needed, or any other value as is."""
+    if type(value) is LazyValue:
+        return value._load()
+    return value
@@ -0,0 +1,85 @@
+"""Advisory file locks used to coordinate processes sharing the same saved states."""
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def get_lock_filepath(filepath):
+    """Return the path of the lock file guarding the cache file `filepath`."""
+    return f"{filepath}.lock"
+
+
+class FileLock:
+    """FileLock class.
+
+    An exclusive advisory lock on a lock file, usable as a context manager.
+    The lock file is created if needed, along with its folder, and left in place afterwards,
+    since removing it would race with the processes waiting on it.
+    The lock is held by the open file, so it also excludes other threads
+    of the same process, and it can be released from a different thread
+    than the one that acquired it.
+
+    Example:
+        >>> with FileLock('saved_states/my_program_my_function.pkl.lock'):
+        ...     pass
+    """
+    def __init__(self, path):
+        """Initialize a new instance of the class.
+
+        Args:
+            path (str): The path of the lock file.
+
+        Returns:
+            None
+        """
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        """Block until the lock is acquired."""
+        try:
+            file = open(self.path, 'a+b')
+        except FileNotFoundError:  # the folder is created on first use only
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            file = open(self.path, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            else:
+                file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK gives up after 10 seconds
+                        time.sleep(0.1)
+        except BaseException:
+            file.close()
+            raise
+        self._file = file
+
+    def release(self):
+        """Release the lock."""
+        file, self._file = self._file, None
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            file.close()
+
+    def __enter__(self):
+        """Acquire the lock."""
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        """Release the lock."""
+        self.release()
@@ -0,0 +1,254 @@
+"""An index of the entries of a `FileBackend`, kept in memory and in an append-only log.
+
+The manifest answers existence checks, `stat` and listings from memory, without
+any filesystem access, so that they cost nothing even on network filesystems.
+Every write, touch and deletion is appended to the log, one line per record,
+after a header line with a random generation id, changed whenever the log is rewritten:
+
+    G <generation>
+    W <namespace> <key> <size> <mtime> <atime> <format>
+    T <namespace> <key> <atime>
+    D <namespace> <key>
+    C <namespace>
+
+with tab-separated fields, `-` standing for a None key or an unknown format.
+The processes sharing the folder append under a file lock, and read each
+other's records from the log when refreshing: at most every `refresh_interval`
+seconds, and whenever an entry is not found, so that new entries are seen at once.
+When the log holds many more records than live entries, it is compacted
+into one record per entry. When it is missing, it is rebuilt by scanning the folder.
+Accesses are applied in memory at once, but appended in batches, at most
+every `touch_interval` seconds or with the next record, so that hits do not lock the log.
+"""
+import atexit
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from .locks import FileLock, get_lock_filepath
+
+
+ManifestEntry = namedtuple('ManifestEntry', ['namespace', 'key', 'size', 'mtime', 'atime', 'format'])
+
+MANIFEST_NAME = '.manifest'
+MIN_COMPACT_RECORDS = 1000
+
+_NONE = '-'
+
+
+def _field(value):
+    return _NONE if value is None else str(value)
+
+
+class Manifest:
+    """Manifest class.
+
+    The in-memory index of the entries of a folder, synchronized through an append-only log.
+    `ManifestEntry` records hold the namespace, key, size, modification and access times,
+    and format of each entry: the cachorro format of the saved state, 0 for a plain pickle,
+    or None when unknown, e.g. for the entries found by a scan.
+    """
+    def __init__(self, folder, scan, refresh_interval=1.0, compact_ratio=2.0, touch_interval=1.0):
+        """Initialize a new instance of the class.
+
+        Args:
+            folder (str): The folder of the entries, where the log is stored as `.manifest`.
+            scan (Callable): A function without arguments iterating over the `Entry` of
+                every entry in the folder, to rebuild a missing log.
+            refresh_interval (float, optional): The maximum seconds between two reads
+                of the records appended by other processes. Defaults to 1.
+            compact_ratio (float, optional): How many times more records than entries
+                the log may hold before it is compacted. Defaults to 2.
+            touch_interval (float, optional): The maximum seconds the accesses are kept in memory
+                before being appended to the log. Defaults to 1.
+
+        Returns:
+            None
+        """
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.refresh_interval = refresh_interval
+        self.compact_ratio = compact_ratio
+        self.touch_interval = touch_interval
+        self._scan = scan
+        self._entries = {}
+        self._records = 0  # the number of records in the log
+        self._offset = 0  # the size of the log read so far
+        self._header = None  # the header line of the log read so far, with its generation
+        self._refreshed = None  # the monotonic time of the last refresh
+        self._touches = {}  # the access times not appended yet, by (namespace, key)
+        self._flushed = time.monotonic()
+        self._lock = threading.RLock()
+        atexit.register(self.flush)
+
+    def get(self, namespace, key):
+        """Return the `ManifestEntry` of an entry, or None if it does not exist.
+
+        Known entries are answered from memory, refreshing at most every `refresh_interval` seconds;
+        unknown ones after reading the records appended since the last refresh.
+        """
+        with self._lock:
+            due = self._refreshed is None or time.monotonic() - self._refreshed > self.refresh_interval
+            entry = None if due else self._entries.get((namespace, key))
+            if entry is None:
+                self.refresh()
+                entry = self._entries.get((namespace, key))
+            return entry
+
+    def entries(self, namespace=None):
+        """Return the `ManifestEntry` of the entries of a namespace, or of every namespace."""
+        with self._lock:
+            self.refresh()
+            return [entry for entry in self._entries.values() if namespace is None or entry.namespace == namespace]
+
+    def record_write(self, namespace, key, size, mtime, format=None):
+        """Record a new or replaced entry."""
+        with self._lock:
+            self._touches.pop((namespace, key), None)
+            self._append(('W', namespace, key, size, repr(mtime), repr(mtime), format))
+
+    def record_touch(self, namespace, key, atime):
+        """Record an access to an entry, appended with the next batch of accesses."""
+        with self._lock:
+            self._touches[namespace, key] = atime
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                self._entries[namespace, key] = entry._replace(atime=atime)
+            if time.monotonic() - self._flushed > self.touch_interval:
+                self.flush()
+
+    def record_delete(self, namespace, key):
+        """Record the deletion of an entry."""
+        with self._lock:
+            self._touches.pop((namespace, key), None)
+            self._append(('D', namespace, key))
+
+    def record_clear(self, namespace):
+        """Record the deletion of every entry of a namespace."""
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._touches if entry_key[0] == namespace]:
+                del self._touches[entry_key]
+            self._append(('C', namespace))
+
+    def flush(self):
+        """Append the accesses kept in memory to the log, unless its folder was removed meanwhile."""
+        with self._lock:
+            self._flushed = time.monotonic()
+            if self._touches and os.path.isdir(os.path.dirname(self.path) or '.'):
+                self._append()
+
+    def forget(self, namespace, key):
+        """Drop an entry found missing from the index of this process, without recording it."""
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def refresh(self):
+        """Apply the records appended to the log since the last refresh, rebuilding the log if it is missing."""
+        with self._lock:
+            if not self._read_log():
+                with FileLock(self._lock_path):
+                    if not self._read_log():  # unless another process rebuilt it meanwhile
+                        self._rebuild()
+
+    def rebuild(self):
+        """Rewrite the log from a scan of the folder."""
+        with self._lock, FileLock(self._lock_path):
+            self._rebuild()
+
+    def compact(self):
+        """Rewrite the log with a single record per live entry."""
+        with self._lock, FileLock(self._lock_path):
+            if self._read_log():
+                self._write_snapshot()
+            else:
+                self._rebuild()
+
+    @property
+    def _lock_path(self):
+        return get_lock_filepath(self.path)
+
+    def _append(self, record=None):
+        """Append a record, after the pending accesses, to the log, and compact it if it grew too long."""
+        records = [('T', namespace, key, repr(atime)) for (namespace, key), atime in self._touches.items()]
+        if record is not None:
+            records.append(record)
+        lines = [[_field(value) for value in record] for record in records]
+        with self._lock, FileLock(self._lock_path):
+            if not self._read_log():
+                self._rebuild()
+            with open(self.path, 'ab') as file:
+                file.write(''.join('\t'.join(fields) + '\n' for fields in lines).encode())
+                self._offset = file.tell()  # the log is read up to its end, under the lock
+            self._touches.clear()
+            self._flushed = time.monotonic()
+            for fields in lines:
+                self._apply(fields)
+            if self._records > max(MIN_COMPACT_RECORDS, self.compact_ratio * len(self._entries)):
+                self._write_snapshot()
+
+    def _read_log(self):
+        """Apply the records appended to the log since the last read, returning False if it is missing.
+
+        A log rewritten since the last read, by compaction or rebuild, has a new generation
+        in its header line, and is then read from the start.
+        """
+        self._refreshed = time.monotonic()
+        try:
+            file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+        with file:
+            header = file.readline()
+            if not header.startswith(b'G\t') or not header.endswith(b'\n'):
+                return False  # not a log: rebuilt like a missing one
+            if header != self._header:
+                self._entries.clear()
+                self._header, self._records, self._offset = header, 0, len(header)
+            size = os.fstat(file.fileno()).st_size
+            file.seek(self._offset)
+            data = file.read(size - self._offset) if size > self._offset else b''
+        complete = data.rfind(b'\n') + 1  # a record being appended is read next time
+        self._offset += complete
+        for line in data[:complete].decode().splitlines():
+            self._apply(line.split('\t'))
+        for (namespace, key), atime in self._touches.items():  # not appended yet
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                self._entries[namespace, key] = entry._replace(atime=atime)
+        return True
+
+    def _rebuild(self):
+        """Rewrite the log from a scan of the folder, under the log's file lock."""
+        self._entries = {(entry.namespace, entry.key): ManifestEntry(*entry, None) for entry in self._scan()}
+        self._write_snapshot()
+
+    def _apply(self, fields):
+        self._records += 1
+        op, namespace = fields[0], fields[1]
+        key = None if len(fields) < 3 or fields[2] == _NONE else fields[2]
+        if op == 'W':
+            size, mtime, atime, fmt = fields[3:7]
+            self._entries[namespace, key] = ManifestEntry(namespace, key, int(size), float(mtime), float(atime),
+                                                          None if fmt == _NONE else int(fmt))
+        elif op == 'T':
+            entry = self._entries.get((namespace, key))
+            if entry is not None:
+                self._entries[namespace, key] = entry._replace(atime=float(fields[3]))
+        elif op == 'D':
+            self._entries.pop((namespace, key), None)
+        elif op == 'C':
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] == namespace]:
+                del self._entries[entry_key]
+
+    def _write_snapshot(self):
+        """Atomically replace the log by one record per entry, under the log's file lock."""
+        folder = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f"{MANIFEST_NAME}.", suffix='.tmp')
+        header = f"G\t{os.urandom(8).hex()}\n".encode()
+        with os.fdopen(fd, 'wb') as file:
+            file.write(header)
+            for entry in self._entries.values():
+                file.write(('\t'.join(_field(value) for value in ('W', *entry)) + '\n').encode())
+            size = file.tell()
+        os.replace(tmp_path, self.path)
+        self._header, self._offset, self._records = header, size, len(self._entries)
@@ -0,0 +1,135 @@
+"""In-process memory tier, checked before the saved states on disk."""
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict, namedtuple
+
+
+MemoryInfo = namedtuple('MemoryInfo', ['hits', 'misses', 'entries', 'bytes', 'max_entries', 'max_bytes'])
+
+DEFAULT_MAX_ENTRIES = 128
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class MemoryCache:
+    """MemoryCache class.
+
+    A thread-safe LRU mapping from cache keys to already loaded results,
+    bounded both by number of entries and by approximate size in bytes.
+    The size of an entry is the size of its pickled form when known,
+    and `sys.getsizeof` of the value otherwise.
+
+    The values are shared, not copied: mutating a returned result
+    mutates the cached one as well.
+
+    Entries may carry an expiry time, after which they are forgotten.
+    """
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        """Initialize a new instance of the class.
+
+        Args:
+            max_entries (int, optional): The maximum number of entries kept.
+                0 disables the memory tier. Defaults to 128.
+            max_bytes (int, optional): The maximum approximate size in bytes of the
+                entries kept. Entries larger than this are never kept. Defaults to 64 MiB.
+
+        Returns:
+            None
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.currbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of entries kept."""
+        return len(self._entries)
+
+    def __contains__(self, key):
+        """Check whether `key` is kept, without updating its recency."""
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """Return the value kept for `key`, or `default`, and mark it as recently used."""
+        with self._lock:
+            try:
+                value, _, expires = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and time.time() > expires:
+                self._discard(key)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, nbytes=None, expires=None):
+        """Keep `value` for `key`, evicting the least recently used entries beyond the limits.
+
+        Args:
+            key (Hashable): The cache key.
+            value (Any): The value to keep.
+            nbytes (int, optional): The approximate size of the value, in bytes.
+                If not provided, `sys.getsizeof(value)` is used.
+            expires (float, optional): The time, as returned by `time.time()`,
+                after which the value is forgotten. Defaults to never.
+        """
+        if nbytes is None:
+            nbytes = sys.getsizeof(value)
+        with self._lock:
+            self._discard(key)
+            if self.max_entries <= 0 or nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes, expires)
+            self.currbytes += nbytes
+            while len(self._entries) > self.max_entries or self.currbytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.currbytes -= evicted
+
+    def invalidate(self, key=None):
+        """Forget the value kept for `key`, or every value if `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.currbytes = 0
+            else:
+                self._discard(key)
+
+    def info(self):
+        """Return the hit and miss counts, the current size and the limits of the memory tier.
+
+        Returns:
+            MemoryInfo: A named tuple with the fields
+                `hits`, `misses`, `entries`, `bytes`, `max_entries` and `max_bytes`.
+        """
+        with self._lock:
+            return MemoryInfo(self.hits, self.misses, len(self._entries),
+                              self.currbytes, self.max_entries, self.max_bytes)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.currbytes -= entry[1]
+
+
+def register_memory(func_name, memory):
+    """Register a function's memory tier, so that `clear_cache` can invalidate it."""
+    with _registry_lock:
+        _registry.setdefault(func_name, weakref.WeakSet()).add(memory)
+
+
+def invalidate_memory(func_name):
+    """Invalidate every memory tier registered for `func_name`."""
+    with _registry_lock:
+        memories = list(_registry.get(func_name, ()))
+    for memory in memories:
+        memory.invalidate()
@@ -0,0 +1,211 @@
+"""Incremental execution of the cached steps of a script.
+
+A script run through `initialize_caching` is rewritten by the `CacheTransformer`:
+each `x = cacheme(f, *args, **kwargs)` assignment becomes a step of a `Pipeline`,
+that loads `x` from the backend or computes `f(*args, **kwargs)` and saves it.
+
+The key of a step covers the code of the call and of the functions of the script
+it calls, and the values of the variables its arguments refer to and of the
+global variables those functions read. A variable
+still holding the result of an upstream step contributes the key of that step
+instead of its value, so that editing a step reruns it and every step downstream,
+like `make`, while the other steps are loaded.
+
+Given an executor, the steps are submitted to it instead, and the variables
+they assign hold a `Pending` result until joined: the steps that do not depend
+on each other then load or compute concurrently.
+
+In lazy mode, the steps whose saved state exists assign a `LazyValue` instead,
+deserialized when the script first uses the variable, if ever.
+"""
+import inspect
+import logging
+import time
+from collections import namedtuple
+from functools import partial
+from .hashing import UnhashableError, fingerprint_function, hash_value
+from .lazy import LazyValue, materialize
+from .serialization import read_value, write_value
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+PIPELINE_NAME = '_cachorro_pipeline'  # the name of the pipeline in the transformed scripts
+
+Step = namedtuple('Step', ['name', 'target', 'inputs', 'upstream'])
+Pending = namedtuple('Pending', ['name', 'key', 'future'])
+
+
+class Pipeline:
+    """Pipeline class.
+
+    The runtime of the steps of a transformed script, and their dependency graph.
+
+    - `steps` maps the name of each step to its `Step`: the variable it assigns,
+      the variables it reads, in its arguments or as globals of the script functions it calls,
+      and the `upstream` steps it depends on.
+      A step is named after its variable, suffixed with a counter when the variable
+      is assigned by several steps.
+    - `keys` maps the name of each step run so far to its key, or None if it ran without caching.
+    - `executed` and `loaded` list the names of the steps computed and loaded in this run,
+      in order of completion.
+    - `timings` maps the phases of the script's startup and execution to their durations,
+      in seconds, as measured by `transform_and_execute`.
+    """
+    def __init__(self, backend, steps=(), executor=None, lazy=False):
+        """Initialize a new instance of the class.
+
+        Args:
+            backend (Backend): The storage backend of the steps' results,
+                one namespace per step, holding the results of the keys it ran with in the latest run.
+            steps (Iterable[Step], optional): The steps of the script, in order.
+            executor (concurrent.futures.Executor, optional): The executor the steps are submitted to
+                by `submit`. Defaults to none.
+            lazy (bool, optional): If True, the steps whose saved state exists return
+                a `LazyValue`, deserialized on first use. Defaults to False.
+
+        Returns:
+            None
+        """
+        self.backend = backend
+        self.steps = {step.name: step for step in steps}
+        self.keys = {}
+        self.executed = []
+        self.loaded = []
+        self.executor = executor
+        self.lazy = lazy
+        self.timings = {}
+        self._results = {}  # the key and result of the last step assigning each variable
+        self._used = {}  # the keys each step ran with in this run, by name
+        self._futures = []
+
+    def downstream(self, name):
+        """Return the names of the steps depending on step `name`, directly or not, in order."""
+        affected = {name}
+        for step in self.steps.values():
+            if affected.intersection(step.upstream):
+                affected.add(step.name)
+        return [step for step in self.steps if step in affected and step != name]
+
+    def key(self, name, call, inputs):
+        """Return the key of step `name`, for the call `call` on the variables `inputs`.
+
+        Returns None if an input cannot be hashed, or is the pending result of a step run without caching,
+        so that the step runs without caching.
+        """
+        digests = []
+        try:
+            for variable, value in sorted(inputs.items()):
+                key, result = self._results.get(variable, (None, None))
+                if type(value) is Pending:  # not isinstance, that would load a LazyValue
+                    if value.key is None:
+                        raise UnhashableError(f"{variable} is the result of step {value.name}, run without caching")
+                    digests.append(value.key)
+                elif key is not None and result is value:  # not reassigned since the step ran
+                    digests.append(key)
+                else:
+                    digests.append(_digest(value))
+        except UnhashableError as e:
+            log.warning(f"Running step {name} without caching: {e}")
+            return None
+        return hash_value((name, fingerprint_function(call, follow_calls=True), digests))
+
+    def run(self, name, call, inputs):
+        """Load the result of step `name`, or compute it with `call` and save it.
+
+        Args:
+            name (str): The name of the step.
+            call (Callable): A function computing the result, given the inputs as keyword arguments.
+            inputs (dict): The values of the variables the call refers to, by name.
+
+        Returns:
+            Any: The result of the step.
+        """
+        return self._execute(name, self.key(name, call, inputs), call, inputs)
+
+    def submit(self, name, call, inputs):
+        """Submit step `name` to the executor, like `run`, returning its `Pending` result.
+
+        The inputs may be the pending results of upstream steps: their keys are known
+        upfront, so the step is loaded without waiting for them, and only a computation
+        waits for their results.
+        """
+        key = self.key(name, call, inputs)
+        future = self.executor.submit(self._execute, name, key, call, inputs)
+        self._futures.append(future)
+        return Pending(name, key, future)
+
+    def join(self, value):
+        """Return the result of a `Pending` step, waiting for it, or any other value as is."""
+        if type(value) is Pending:
+            return value.future.result()
+        return value
+
+    def wait(self):
+        """Wait for every submitted step, raising the first error."""
+        for future in self._futures:
+            future.result()
+
+    def prune(self):
+        """Delete the saved states of the steps computed in this run, other than those of the keys it used.
+
+        A step run several times, e.g. in a loop, keeps one state per key it ran with,
+        while the states of its previous versions are removed.
+        """
+        for name in dict.fromkeys(self.executed):
+            if name not in self._used:  # run without caching
+                continue
+            for entry in list(self.backend.entries(name)):
+                if entry.key not in self._used[name]:
+                    self.backend.delete(name, entry.key)
+
+    def _execute(self, name, key, call, inputs):
+        if key is None:
+            result = call(**{input_name: materialize(self.join(value)) for input_name, value in inputs.items()})
+            self.executed.append(name)
+            return self._remember(name, key, result)
+        self._used.setdefault(name, set()).add(key)
+        if self.lazy and self.backend.exists(name, key):
+            self.loaded.append(name)
+            return self._remember(name, key, LazyValue(partial(self._load, name, key)))
+        try:
+            result = self._load(name, key)
+            self.loaded.append(name)
+            return self._remember(name, key, result)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.critical(f"Error loading saved state for step {name}: {e}")
+
+        start = time.perf_counter()
+        result = call(**{input_name: materialize(self.join(value)) for input_name, value in inputs.items()})
+        log.info(f"Computed step {name} in {time.perf_counter() - start:.3f}s")
+        with self.backend.create(name, key) as file:
+            write_value(result, file)
+        self.executed.append(name)
+        return self._remember(name, key, result)
+
+    def _load(self, name, key):
+        file = self.backend.open(name, key)
+        if file is None:
+            raise FileNotFoundError(f"No saved state for step {name}")
+        with file:
+            return read_value(file)[0]
+
+    def _remember(self, name, key, result):
+        self.keys[name] = key
+        step = self.steps.get(name)
+        self._results[name if step is None else step.target] = (key, result)
+        return result
+
+
+def _digest(value):
+    """Return the digest of an input of a step, fingerprinting functions and naming modules and classes."""
+    if inspect.isfunction(value):
+        return fingerprint_function(value, follow_calls=True)
+    if inspect.ismodule(value):
+        return value.__name__
+    if inspect.isclass(value) or inspect.isbuiltin(value):
+        return f"{value.__module__}.{value.__qualname__}"
+    return hash_value(value)
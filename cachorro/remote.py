@@ -0,0 +1,373 @@
+"""A backend storing the saved states on a remote cache server, over HTTP.
+
+The protocol is a plain key/value one, served by `cachorro.server`:
+
+- `GET`, `HEAD`, `PUT`, `PATCH` (touch) and `DELETE` on `/v1/<namespace>/<key>`,
+  where the argument-less entry of a namespace has the key `-`;
+  the size and times of an entry are returned in the `X-Cachorro-*` headers.
+- `DELETE` on `/v1/<namespace>` clears the namespace, and `GET` on `/v1/<namespace>`
+  or `/v1/` lists the entries, as JSON.
+- `POST` on `/v1/<namespace>/_batch_get` and `/v1/<namespace>/_batch_put` reads
+  and writes several entries at once, framed as a length-prefixed key and value per entry.
+"""
+import http.client
+import io
+import json
+import logging
+import queue
+import struct
+import time
+from contextlib import contextmanager
+from urllib.parse import quote, urlsplit
+from .backends import Backend, Entry
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+NONE_KEY = '-'
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE_LENGTH = struct.Struct('<Q')
+_RETRIED = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+def encode_items(items):
+    """Frame (key, data) pairs for a batch request or response."""
+    chunks = []
+    for key, data in items:
+        key = (NONE_KEY if key is None else key).encode()
+        chunks += [_KEY_LENGTH.pack(len(key)), key, _VALUE_LENGTH.pack(len(data)), data]
+    return b''.join(chunks)
+
+
+def decode_items(data):
+    """Return the (key, data) pairs framed by `encode_items`."""
+    items = []
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        length, = _KEY_LENGTH.unpack_from(view, offset)
+        offset += _KEY_LENGTH.size
+        key = bytes(view[offset:offset + length]).decode()
+        offset += length
+        length, = _VALUE_LENGTH.unpack_from(view, offset)
+        offset += _VALUE_LENGTH.size
+        items.append((None if key == NONE_KEY else key, bytes(view[offset:offset + length])))
+        offset += length
+    return items
+
+
+class _ConnectionPool:
+    """A pool of persistent HTTP connections to a single server."""
+
+    def __init__(self, url, timeout, size):
+        parts = urlsplit(url)
+        self._connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                  else http.client.HTTPConnection)
+        self._host = parts.hostname
+        self._port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(size)
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request on an idle connection, or a new one, returning the status, headers and body."""
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._connection_class(self._host, self._port, timeout=self.timeout), False
+        try:
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+            except _RETRIED:
+                if not reused:
+                    raise
+                # The server closed the idle connection: retry once on a new one
+                conn.close()
+                conn = self._connection_class(self._host, self._port, timeout=self.timeout)
+                if hasattr(body, 'seek'):
+                    body.seek(0)
+                conn.request(method, self.prefix + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+            data = response.read()
+        except BaseException:
+            conn.close()
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        return response.status, response.headers, data
+
+    def close(self):
+        """Close the idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class _RemoteWriter(io.BytesIO):
+    """An in-memory buffer that is uploaded as an entry when closed without errors."""
+
+    def __init__(self, backend, namespace, key):
+        super().__init__()
+        self._backend = backend
+        self._namespace = namespace
+        self._key = key
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        try:
+            if exc_type is None:
+                self._backend.write(self._namespace, self._key, self.getbuffer())
+        finally:
+            self.close()
+
+
+class _NoLock:
+    """A lock that excludes nothing, for backends without locking."""
+
+    def acquire(self):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class HTTPBackend(Backend):
+    """HTTPBackend class.
+
+    Stores the entries on a remote cache server, such as the one run by
+    `python -m cachorro.server`, through a pool of persistent connections.
+    `read_many` and `write_many` take a single request per batch.
+
+    Errors reaching the server raise `OSError` or `http.client.HTTPException`;
+    put it behind a local backend with `TieredBackend` to fall back to computing.
+    Entry locks are not shared between nodes: `lock` returns a lock that excludes nothing.
+
+    Example:
+        >>> set_backend(TieredBackend(FileBackend(), HTTPBackend('http://cache.local:8765')))
+    """
+    batch_size = 500
+
+    def __init__(self, url, timeout=5.0, pool_size=8):
+        """Initialize a new instance of the class.
+
+        Args:
+            url (str): The base URL of the server, e.g. 'http://localhost:8765'.
+            timeout (float, optional): The seconds to wait to connect and for each response. Defaults to 5.
+            pool_size (int, optional): The maximum number of idle connections kept open. Defaults to 8.
+
+        Returns:
+            None
+        """
+        self.url = url
+        self._pool = _ConnectionPool(url, timeout, pool_size)
+
+    def _path(self, namespace, key=(), suffix=''):
+        path = f"/v1/{quote(namespace, safe='')}"
+        if key != ():
+            path += f"/{NONE_KEY if key is None else quote(key, safe='')}"
+        return path + suffix
+
+    def _request(self, method, path, body=None, expected=(200, 204), headers=None):
+        status, headers, data = self._pool.request(method, path, body, headers)
+        if status == 404:
+            return None, headers, data
+        if status not in expected:
+            raise http.client.HTTPException(f"{method} {self.url}{path} returned {status}")
+        return status, headers, data
+
+    def open(self, namespace, key):
+        """Download an entry into memory for reading, returning None if it does not exist."""
+        data = self.read(namespace, key)
+        return None if data is None else io.BytesIO(data)
+
+    def create(self, namespace, key):
+        """Return a buffer that is uploaded as the entry once closed without errors."""
+        return _RemoteWriter(self, namespace, key)
+
+    def read(self, namespace, key):
+        """Return the content of an entry, or None if it does not exist."""
+        status, _, data = self._request('GET', self._path(namespace, key))
+        return None if status is None else data
+
+    def write(self, namespace, key, data):
+        """Upload the content of an entry."""
+        self._request('PUT', self._path(namespace, key), data)
+
+    def read_many(self, namespace, keys):
+        """Return a dict mapping the existing keys among `keys` to their content, one request per batch."""
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), self.batch_size):
+            body = json.dumps([NONE_KEY if key is None else key for key in keys[start:start + self.batch_size]])
+            _, _, data = self._request('POST', self._path(namespace, suffix='/_batch_get'), body.encode())
+            found.update(decode_items(data))
+        return found
+
+    def write_many(self, namespace, items):
+        """Upload the content of several entries, one request per batch."""
+        items = list(items)
+        for start in range(0, len(items), self.batch_size):
+            body = encode_items(items[start:start + self.batch_size])
+            self._request('POST', self._path(namespace, suffix='/_batch_put'), body)
+
+    def exists(self, namespace, key):
+        """Check whether an entry exists."""
+        return self.stat(namespace, key) is not None
+
+    def stat(self, namespace, key):
+        """Return the `Entry` describing an entry, or None if it does not exist."""
+        status, headers, _ = self._request('HEAD', self._path(namespace, key))
+        if status is None:
+            return None
+        return Entry(namespace, key, int(headers['X-Cachorro-Size']),
+                     float(headers['X-Cachorro-Mtime']), float(headers['X-Cachorro-Atime']))
+
+    def touch(self, namespace, key):
+        """Record an access to an entry on the server."""
+        self._request('PATCH', self._path(namespace, key))
+
+    def delete(self, namespace, key):
+        """Delete an entry, returning whether it existed."""
+        return self._request('DELETE', self._path(namespace, key))[0] is not None
+
+    def clear(self, namespace):
+        """Delete every entry of a namespace, returning whether any existed."""
+        return self._request('DELETE', self._path(namespace))[0] is not None
+
+    def entries(self, namespace=None):
+        """Iterate over the entries of a namespace, or of every namespace, as listed by the server."""
+        path = '/v1/' if namespace is None else self._path(namespace)
+        status, _, data = self._request('GET', path)
+        for row in ([] if status is None else json.loads(data)):
+            yield Entry(*row)
+
+    def lock(self, namespace, key):
+        """Return a lock that excludes nothing, since the server has no locks."""
+        return _NoLock()
+
+    def close(self):
+        """Close the idle connections of the pool."""
+        self._pool.close()
+
+
+class TieredBackend(Backend):
+    """TieredBackend class.
+
+    A local backend in front of a remote one, usually an `HTTPBackend` shared by several nodes.
+    Entries are looked up locally first, then remotely, and the entries found remotely
+    are copied locally, so that a cold node warms up from the entries its peers computed.
+    New entries are written locally, then uploaded. Listing, touching and locking entries
+    only involve the local backend.
+
+    Errors reaching the remote backend are logged and treated as misses, so that the
+    functions are computed instead; the remote backend is then skipped for `retry_after` seconds.
+    """
+    def __init__(self, local, remote, retry_after=30.0):
+        """Initialize a new instance of the class.
+
+        Args:
+            local (Backend): The first level backend, e.g. a `FileBackend`.
+            remote (Backend): The second level backend, e.g. an `HTTPBackend`.
+            retry_after (float, optional): The seconds the remote backend is skipped
+                after an error. Defaults to 30.
+
+        Returns:
+            None
+        """
+        self.local = local
+        self.remote = remote
+        self.retry_after = retry_after
+        self._down_until = 0.0
+
+    def _remote(self, method, *args, default=None):
+        """Call a method of the remote backend, returning `default` if it is unavailable."""
+        if time.monotonic() < self._down_until:
+            return default
+        try:
+            return getattr(self.remote, method)(*args)
+        except (OSError, http.client.HTTPException) as e:
+            log.warning(f"Remote cache unavailable, skipping it for {self.retry_after}s: {e!r}")
+            self._down_until = time.monotonic() + self.retry_after
+            return default
+
+    def open(self, namespace, key):
+        """Open an entry for reading, copying it from the remote backend if only there."""
+        file = self.local.open(namespace, key)
+        if file is not None:
+            return file
+        data = self._remote('read', namespace, key)
+        if data is None:
+            return None
+        self.local.write(namespace, key, data)
+        return self.local.open(namespace, key) or io.BytesIO(data)
+
+    @contextmanager
+    def create(self, namespace, key):
+        """Write an entry locally, uploading it once published."""
+        with self.local.create(namespace, key) as file:
+            yield file
+        data = self.local.read(namespace, key)
+        if data is not None:
+            self._remote('write', namespace, key, data)
+
+    def read_many(self, namespace, keys):
+        """Return the content of the existing entries, fetching the local misses in one remote batch."""
+        keys = list(keys)
+        found = self.local.read_many(namespace, keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = self._remote('read_many', namespace, missing, default={})
+            if fetched:
+                self.local.write_many(namespace, fetched.items())
+                found.update(fetched)
+        return found
+
+    def write_many(self, namespace, items):
+        """Write several entries locally, then upload them in one remote batch."""
+        items = list(items)
+        self.local.write_many(namespace, items)
+        self._remote('write_many', namespace, items)
+
+    def exists(self, namespace, key):
+        """Check whether an entry exists locally or remotely."""
+        return self.local.exists(namespace, key) or bool(self._remote('exists', namespace, key, default=False))
+
+    def stat(self, namespace, key):
+        """Return the local `Entry` describing an entry, or the remote one."""
+        return self.local.stat(namespace, key) or self._remote('stat', namespace, key)
+
+    def touch(self, namespace, key):
+        """Record an access to the local copy of an entry."""
+        self.local.touch(namespace, key)
+
+    def delete(self, namespace, key):
+        """Delete an entry from both backends, returning whether it existed in either."""
+        remote = self._remote('delete', namespace, key, default=False)
+        return self.local.delete(namespace, key) or remote
+
+    def clear(self, namespace):
+        """Delete every entry of a namespace from both backends, returning whether any existed."""
+        remote = self._remote('clear', namespace, default=False)
+        return self.local.clear(namespace) or remote
+
+    def entries(self, namespace=None):
+        """Iterate over the local entries."""
+        return self.local.entries(namespace)
+
+    def lock(self, namespace, key):
+        """Return the local lock guarding an entry."""
+        return self.local.lock(namespace, key)
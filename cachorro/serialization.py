@@ -0,0 +1,279 @@
+"""Serialization of the cached results to and from the backends' files.
+
+Results are stored either as plain pickles, the default, or in a framed
+format starting with a small header. The framed formats keep large buffers,
+like NumPy arrays and bytes, out of the pickle stream, so that they can be
+mapped in memory on load instead of being copied:
+
+- `FORMAT_RAW`: a bytes-like result, stored as is.
+- `FORMAT_OOB`: a pickle protocol 5 stream, followed by its out-of-band buffers,
+  each aligned to `ALIGNMENT` bytes.
+
+- `FORMAT_SERIALIZED`: a value written by one of the `serializers`, whose id follows the header.
+
+Any of them can in turn be compressed, in the `FORMAT_COMPRESSED` frame,
+which records the codec so that compressed and uncompressed states
+load transparently side by side.
+
+The items of generator functions are stored in the `FORMAT_STREAM` frame,
+as chunks of pickled items, each preceded by its size and item count,
+and followed by an empty chunk marking the stream as complete,
+so that they are written and read back with bounded memory.
+"""
+import io
+import mmap
+import pickle
+import struct
+from .compression import decompress
+from .serializers import load_serialized, select_serializer
+
+
+MAGIC = b'CCHR'
+VERSION = 1
+FORMAT_RAW = 1
+FORMAT_OOB = 2
+FORMAT_COMPRESSED = 3
+FORMAT_STREAM = 4
+FORMAT_SERIALIZED = 5
+ALIGNMENT = 64
+MIN_OUT_OF_BAND = 64 * 1024  # smaller buffers stay in the pickle stream
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+_HEADER = struct.Struct('<4sBB')
+_OOB_HEADER = struct.Struct('<IQ')
+_BUFFER_LENGTH = struct.Struct('<Q')
+_CODEC = struct.Struct('<B')
+_SERIALIZER = struct.Struct('<B')
+_CHUNK = struct.Struct('<QQ')
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_value(value, file, zero_copy=False, compression=None, serializer=None):
+    """Serialize `value` to a binary file.
+
+    Args:
+        value (Any): The value to serialize.
+        file (BinaryIO): The file to write to.
+        zero_copy (bool, optional): If True, bytes-like values and the large buffers
+            of the value, like NumPy arrays, are written out of the pickle stream,
+            so that `read_value` can map them in memory. Defaults to False.
+        compression (Compression, optional): The compression settings.
+            A compressed value can not be mapped in memory. Defaults to no compression.
+        serializer (Serializer or str, optional): The serializer, or 'auto' to pick one by the type
+            of `value`, as resolved by `resolve_serializer`. Ignored with `zero_copy`.
+            Defaults to a plain pickle.
+
+    Returns:
+        int: The number of bytes written.
+    """
+    if compression is not None:
+        buffer = io.BytesIO()
+        write_value(value, buffer, zero_copy, serializer=serializer)
+        compressed = compression.compress(buffer.getbuffer())
+        if compressed is None:
+            file.write(buffer.getbuffer())
+            return buffer.tell()
+        header = _HEADER.pack(MAGIC, VERSION, FORMAT_COMPRESSED) + _CODEC.pack(compression.codec.id)
+        file.write(header)
+        file.write(compressed)
+        return len(header) + len(compressed)
+
+    start = file.tell()
+    chosen = None if zero_copy else select_serializer(serializer, value)
+    if chosen is not None:
+        file.write(_HEADER.pack(MAGIC, VERSION, FORMAT_SERIALIZED) + _SERIALIZER.pack(chosen.id))
+        chosen.dump(value, file)
+        return file.tell() - start
+    if not zero_copy:
+        pickle.dump(value, file)
+        return file.tell() - start
+
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        file.write(_HEADER.pack(MAGIC, VERSION, FORMAT_RAW))
+        file.write(value)
+        return file.tell() - start
+
+    buffers = []
+
+    def keep_out_of_band(buffer):
+        if memoryview(buffer).nbytes < MIN_OUT_OF_BAND:
+            return True
+        buffers.append(buffer.raw())
+        return False
+
+    stream = pickle.dumps(value, protocol=5, buffer_callback=keep_out_of_band)
+    file.write(_HEADER.pack(MAGIC, VERSION, FORMAT_OOB))
+    file.write(_OOB_HEADER.pack(len(buffers), len(stream)))
+    for buffer in buffers:
+        file.write(_BUFFER_LENGTH.pack(buffer.nbytes))
+    file.write(stream)
+    offset = file.tell() - start
+    for buffer in buffers:
+        file.write(b'\0' * (_align(offset) - offset))
+        file.write(buffer)
+        offset = _align(offset) + buffer.nbytes
+    return file.tell() - start
+
+
+def read_value(file, zero_copy=False):
+    """Deserialize a value written by `write_value`, or a plain pickle.
+
+    Args:
+        file (BinaryIO): The file to read from, positioned at the start of the value.
+        zero_copy (bool, optional): If True and `file` is a real file, framed values
+            are mapped in memory and returned as read-only views on the mapping:
+            a `memoryview` for bytes-like values, and arrays backed by the mapping
+            for the out-of-band buffers. Only the pages actually touched are then read.
+            Otherwise they are read into a private, writable copy. Defaults to False.
+
+    Returns:
+        tuple: The value, and its size in bytes.
+    """
+    start = file.tell()
+    header = file.read(_HEADER.size)
+    magic, _, fmt = _HEADER.unpack(header) if len(header) == _HEADER.size else (None, None, None)
+    if magic != MAGIC:
+        file.seek(start)
+        value = pickle.load(file)
+        return value, file.tell() - start
+
+    if fmt == FORMAT_COMPRESSED:
+        codec_id, = _CODEC.unpack(file.read(_CODEC.size))
+        value, _ = read_value(io.BytesIO(decompress(file, codec_id)))
+        return value, file.tell() - start
+    if fmt == FORMAT_SERIALIZED:
+        serializer_id, = _SERIALIZER.unpack(file.read(_SERIALIZER.size))
+        value = load_serialized(file, serializer_id)
+        return value, file.tell() - start
+    if fmt == FORMAT_STREAM:
+        file.seek(start)
+        return list(read_stream(file)), file.tell() - start
+
+    data = _map(file, start) if zero_copy else None
+    if data is None:
+        file.seek(start)
+        data = memoryview(bytearray(file.read()))
+    return _read_framed(data, fmt, zero_copy)
+
+
+def read_buffer(data):
+    """Deserialize a value written by `write_value` from a buffer, like `read_value` does from a file.
+
+    The bytes-like values and the out-of-band buffers of values written with `zero_copy`
+    are returned as views on `data`, without copying them.
+
+    Args:
+        data (memoryview): The buffer holding the value.
+
+    Returns:
+        tuple: The value, and its size in bytes.
+    """
+    header = bytes(data[:_HEADER.size])
+    magic, _, fmt = _HEADER.unpack(header) if len(header) == _HEADER.size else (None, None, None)
+    if magic != MAGIC or fmt not in (FORMAT_RAW, FORMAT_OOB):
+        return read_value(io.BytesIO(data))
+    return _read_framed(data, fmt, True)
+
+
+def _read_framed(data, fmt, zero_copy):
+    """Deserialize a `FORMAT_RAW` or `FORMAT_OOB` value from a buffer starting with its header."""
+    if fmt == FORMAT_RAW:
+        payload = data[_HEADER.size:]
+        return (payload if zero_copy else bytes(payload)), len(data)
+    if fmt != FORMAT_OOB:
+        raise pickle.UnpicklingError(f"Unknown cachorro format {fmt}")
+
+    offset = _HEADER.size
+    count, stream_length = _OOB_HEADER.unpack_from(data, offset)
+    offset += _OOB_HEADER.size
+    lengths = [_BUFFER_LENGTH.unpack_from(data, offset + i * _BUFFER_LENGTH.size)[0] for i in range(count)]
+    offset += count * _BUFFER_LENGTH.size
+    stream = data[offset:offset + stream_length]
+    offset += stream_length
+    buffers = []
+    for length in lengths:
+        offset = _align(offset)
+        buffers.append(data[offset:offset + length])
+        offset += length
+    return pickle.loads(stream, buffers=buffers), len(data)
+
+
+def write_stream(items, file, chunk_size=STREAM_CHUNK_SIZE):
+    """Serialize the items of an iterable to a binary file, yielding each item once written.
+
+    Items are pickled into an in-memory chunk, written out whenever it reaches `chunk_size` bytes.
+    The stream is only marked as complete once `items` is exhausted.
+
+    Args:
+        items (Iterable): The items to serialize.
+        file (BinaryIO): The file to write to.
+        chunk_size (int, optional): The size in bytes above which a chunk is written. Defaults to 1 MiB.
+
+    Yields:
+        Any: Each item of `items`.
+
+    Returns:
+        int: The number of bytes written, as the value of the generator.
+    """
+    start = file.tell()
+    file.write(_HEADER.pack(MAGIC, VERSION, FORMAT_STREAM))
+    chunk = io.BytesIO()
+    count = 0
+    for item in items:
+        pickle.dump(item, chunk)
+        count += 1
+        if chunk.tell() >= chunk_size:
+            file.write(_CHUNK.pack(chunk.tell(), count))
+            file.write(chunk.getbuffer())
+            chunk = io.BytesIO()
+            count = 0
+        yield item
+    if count:
+        file.write(_CHUNK.pack(chunk.tell(), count))
+        file.write(chunk.getbuffer())
+    file.write(_CHUNK.pack(0, 0))
+    return file.tell() - start
+
+
+def read_stream(file):
+    """Return an iterator over the items written by `write_stream`, reading one chunk at a time.
+
+    Args:
+        file (BinaryIO): The file to read from, positioned at the start of the stream.
+
+    Returns:
+        Iterator: The items.
+
+    Raises:
+        pickle.UnpicklingError: If the file does not hold a stream, or, while iterating,
+            if the stream is truncated.
+    """
+    header = file.read(_HEADER.size)
+    if len(header) != _HEADER.size or _HEADER.unpack(header) != (MAGIC, VERSION, FORMAT_STREAM):
+        raise pickle.UnpicklingError("Not a cachorro stream")
+
+    def items():
+        while True:
+            chunk_header = file.read(_CHUNK.size)
+            if len(chunk_header) != _CHUNK.size:
+                raise pickle.UnpicklingError("Truncated cachorro stream")
+            size, count = _CHUNK.unpack(chunk_header)
+            if not count:
+                return
+            chunk = io.BytesIO(file.read(size))
+            for _ in range(count):
+                yield pickle.load(chunk)
+    return items()
+
+
+def _map(file, start):
+    """Map a real file in memory, read-only, returning None for in-memory files."""
+    try:
+        fileno = file.fileno()
+    except (AttributeError, OSError):
+        return None
+    mapping = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    return memoryview(mapping)[start:]
@@ -0,0 +1,177 @@
+"""Serializers for the saved states, picked by the type of the result.
+
+Plain pickles at the default protocol are the default format. Other serializers
+are stored in the `FORMAT_SERIALIZED` frame, which records the serializer id
+so that the states load with the right one whatever the current settings:
+
+- `pickle_highest`: pickle at the highest protocol, the fallback of 'auto' mode,
+  e.g. for pandas objects.
+- `marshal`: the builtin containers of primitives, like JSON-like dicts and lists,
+  dumped several times faster than pickle. Shared references are not preserved,
+  and recursive or other values are rejected.
+- `raw`: bytes, written as is.
+- `numpy`: NumPy arrays without Python objects, in the `.npy` format.
+
+In 'auto' mode, the first serializer accepting the result is used, trying the ones
+added with `register_serializer`, then `raw`, `numpy`, `marshal`, and `pickle_highest`.
+"""
+import io
+import marshal
+import os
+import pickle
+import sys
+from collections import namedtuple
+
+
+Serializer = namedtuple('Serializer', ['name', 'id', 'dump', 'load', 'accepts'])
+
+AUTO = 'auto'
+PLAIN_PICKLE = 'pickle'
+
+_MARSHAL_TYPES = (dict, list, tuple, set, frozenset)
+
+
+def _read_rest(file):
+    """Read the rest of a file in a single call, sized upfront when it is a real file."""
+    try:
+        size = os.fstat(file.fileno()).st_size - file.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return file.read()
+    return file.read(size)
+
+
+def _dump_numpy(value, file):
+    np = sys.modules['numpy']
+    np.lib.format.write_array(file, value, allow_pickle=False)
+
+
+def _load_numpy(file):
+    import numpy as np
+    return np.lib.format.read_array(file, allow_pickle=False)
+
+
+def _is_numpy_array(value):
+    np = sys.modules.get('numpy')  # no array can exist if numpy was never imported
+    return np is not None and type(value) is np.ndarray and not value.dtype.hasobject
+
+
+SERIALIZERS = {
+    'pickle_highest': Serializer('pickle_highest', 1,
+                                 lambda value, file: pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL),
+                                 pickle.load, None),
+    'marshal': Serializer('marshal', 2, lambda value, file: file.write(marshal.dumps(value)),
+                          lambda file: marshal.loads(_read_rest(file)), lambda value: type(value) in _MARSHAL_TYPES),
+    'raw': Serializer('raw', 3, lambda value, file: file.write(value), _read_rest,
+                      lambda value: type(value) is bytes),
+    'numpy': Serializer('numpy', 4, _dump_numpy, _load_numpy, _is_numpy_array),
+}
+SERIALIZERS_BY_ID = {serializer.id: serializer for serializer in SERIALIZERS.values()}
+_AUTO_ORDER = ['raw', 'numpy', 'marshal']
+
+_default_serializer = None
+
+
+def register_serializer(name, id, dump, load, accepts=None):
+    """Add a serializer, usable by name and, if it has `accepts`, tried first in 'auto' mode.
+
+    Args:
+        name (str): The name of the serializer, for `serializer=` arguments.
+        id (int): The id recorded in the saved states, from 128 to 255;
+            the lower ids are reserved for the builtin serializers.
+        dump (Callable): A function writing a value to a binary file.
+        load (Callable): A function reading a value back from a binary file.
+        accepts (Callable, optional): A function returning whether a value should use this serializer
+            in 'auto' mode. Defaults to none, for a serializer only used when named.
+
+    Returns:
+        Serializer: The new serializer.
+
+    Raises:
+        ValueError: If the name or id is already used, or the id is out of range.
+
+    Example:
+        >>> register_serializer('json', 128, lambda v, f: f.write(json.dumps(v).encode()), json.load)
+    """
+    if not 128 <= id <= 255:
+        raise ValueError(f"Serializer ids range from 128 to 255, got {id}")
+    if name in SERIALIZERS or name in (AUTO, PLAIN_PICKLE) or id in SERIALIZERS_BY_ID:
+        raise ValueError(f"Serializer {name!r} or id {id} already registered")
+    serializer = Serializer(name, id, dump, load, accepts)
+    SERIALIZERS[name] = SERIALIZERS_BY_ID[id] = serializer
+    if accepts is not None:
+        _AUTO_ORDER.insert(0, name)
+    return serializer
+
+
+def resolve_serializer(serializer):
+    """Return the serializer for a `serializer=` argument.
+
+    Args:
+        serializer (None, str or Serializer): None for the default set with `set_serializer`;
+            'pickle' for plain pickles; 'auto' to pick one by the type of each value;
+            a serializer name; or the serializer itself.
+
+    Returns:
+        Serializer, str or None: The serializer, 'auto', or None for plain pickles.
+
+    Raises:
+        ValueError: If the serializer is unknown.
+    """
+    if serializer is None:
+        return _default_serializer
+    if serializer == PLAIN_PICKLE:
+        return None
+    if serializer == AUTO:
+        return AUTO
+    if isinstance(serializer, str):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown serializer {serializer!r}, expected one of "
+                             f"{sorted(SERIALIZERS) + [AUTO, PLAIN_PICKLE]}")
+        return SERIALIZERS[serializer]
+    return serializer
+
+
+def select_serializer(serializer, value):
+    """Return the serializer to write `value` with, given a resolved serializer, or None for a plain pickle."""
+    if serializer != AUTO:
+        return serializer
+    for name in _AUTO_ORDER:
+        chosen = SERIALIZERS[name]
+        if not chosen.accepts(value):
+            continue
+        if name != 'marshal':
+            return chosen
+        try:  # the items of the container may not be marshallable: dump it once to find out
+            data = marshal.dumps(value)
+        except ValueError:
+            continue
+        return chosen._replace(dump=lambda value, file: file.write(data))
+    return SERIALIZERS['pickle_highest']
+
+
+def get_serializer():
+    """Return the serializer used when none is given explicitly, 'auto', or None for plain pickles."""
+    return _default_serializer
+
+
+def set_serializer(serializer):
+    """Set the serializer used when none is given explicitly.
+
+    Args:
+        serializer (None, str or Serializer): The default serializer, as accepted by `resolve_serializer`;
+            None or 'pickle' for plain pickles.
+
+    Example:
+        >>> set_serializer('auto')
+    """
+    global _default_serializer
+    _default_serializer = None if serializer is None else resolve_serializer(serializer)
+
+
+def load_serialized(file, serializer_id):
+    """Read the rest of `file` with the serializer `serializer_id`."""
+    try:
+        serializer = SERIALIZERS_BY_ID[serializer_id]
+    except KeyError:
+        raise pickle.UnpicklingError(f"Unknown serializer id {serializer_id}") from None
+    return serializer.load(file)
@@ -0,0 +1,222 @@
+"""A reference cache server, sharing the saved states of a backend over HTTP with `HTTPBackend` clients.
+
+Run it with:
+
+    python -m cachorro.server --port 8765 --folder shared_states
+"""
+import argparse
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+from .backends import FileBackend, is_safe_name
+from .remote import NONE_KEY, decode_items, encode_items
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+DEFAULT_PORT = 8765
+_CHUNK_SIZE = 1 << 20
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the requests of the protocol described in `cachorro.remote`."""
+    protocol_version = 'HTTP/1.1'  # keep-alive connections, for the clients' pools
+
+    def _route(self):
+        """Return the namespace, the key and the action the request path addresses.
+
+        Returns None for a path that is not of the protocol, or whose namespace or key is not
+        a safe file name once decoded, e.g. `..` or `a%2Fb`, so that it cannot escape the folder.
+        """
+        parts = [unquote(part) for part in urlsplit(self.path).path.split('/')[1:]]
+        if not parts or parts[0] != 'v1' or len(parts) > 3:
+            return None
+        namespace = parts[1] if len(parts) > 1 and parts[1] else None
+        if namespace is not None and not is_safe_name(namespace):
+            return None
+        if len(parts) <= 2:
+            return namespace, (), None
+        if parts[2] in ('_batch_get', '_batch_put'):
+            return namespace, (), parts[2]
+        if parts[2] == NONE_KEY:
+            return namespace, None, None
+        return (namespace, parts[2], None) if is_safe_name(parts[2]) else None
+
+    def _send(self, status, body=b'', headers=()):
+        self.send_response(status)
+        if status == 400:  # the request body may be left unread
+            self.close_connection = True
+            self.send_header('Connection', 'close')
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _entry(self):
+        route = self._route()
+        if route is None or route[0] is None or route[1] == ():
+            self._send(400)
+            return None
+        return route[0], route[1]
+
+    def do_HEAD(self):  # noqa: N802 - the name is set by BaseHTTPRequestHandler
+        """Describe an entry in the headers."""
+        entry = self._entry()
+        if entry is None:
+            return
+        stat = self.server.backend.stat(*entry)
+        if stat is None:
+            return self._send(404)
+        self._send(200, headers=[('X-Cachorro-Size', stat.size), ('X-Cachorro-Mtime', repr(stat.mtime)),
+                                 ('X-Cachorro-Atime', repr(stat.atime))])
+
+    def do_GET(self):  # noqa: N802
+        """Send an entry, or list the entries of a namespace or of every namespace."""
+        route = self._route()
+        if route is None:
+            return self._send(400)
+        namespace, key, _ = route
+        if key == ():
+            rows = [list(entry) for entry in self.server.backend.entries(namespace)]
+            return self._send(200, json.dumps(rows).encode(), [('Content-Type', 'application/json')])
+        file = self.server.backend.open(namespace, key)
+        if file is None:
+            return self._send(404)
+        with file:
+            size = file.seek(0, 2)
+            file.seek(0)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+            while True:
+                chunk = file.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def do_PUT(self):  # noqa: N802
+        """Store an entry, streaming the request body into the backend."""
+        entry = self._entry()
+        if entry is None:
+            return
+        remaining = int(self.headers.get('Content-Length', 0))
+        with self.server.backend.create(*entry) as file:
+            while remaining:
+                chunk = self.rfile.read(min(remaining, _CHUNK_SIZE))
+                if not chunk:
+                    raise ConnectionError("Request body truncated")
+                file.write(chunk)
+                remaining -= len(chunk)
+        self._send(204)
+
+    def do_PATCH(self):  # noqa: N802
+        """Record an access to an entry."""
+        entry = self._entry()
+        if entry is not None:
+            self.server.backend.touch(*entry)
+            self._send(204)
+
+    def do_DELETE(self):  # noqa: N802
+        """Delete an entry, or every entry of a namespace."""
+        route = self._route()
+        if route is None or route[0] is None:
+            return self._send(400)
+        namespace, key, _ = route
+        if key == ():
+            found = self.server.backend.clear(namespace)
+        else:
+            found = self.server.backend.delete(namespace, key)
+        self._send(204 if found else 404)
+
+    def do_POST(self):  # noqa: N802
+        """Read or write several entries of a namespace at once."""
+        route = self._route()
+        if route is None or route[0] is None or route[2] is None:
+            return self._send(400)
+        namespace, _, action = route
+        backend = self.server.backend
+        if action == '_batch_get':
+            keys = [None if key == NONE_KEY else key for key in json.loads(self._body())]
+            items = None
+        else:
+            items = decode_items(self._body())
+            keys = [key for key, _ in items]
+        if not all(key is None or is_safe_name(key) for key in keys):
+            return self._send(400)
+        if items is None:
+            self._send(200, encode_items(backend.read_many(namespace, keys).items()))
+        else:
+            backend.write_many(namespace, items)
+            self._send(204)
+
+    def log_message(self, format, *args):
+        """Log the requests to the module logger instead of stderr."""
+        log.debug(f"{self.address_string()} - {format % args}")
+
+
+class CacheServer(ThreadingHTTPServer):
+    """CacheServer class.
+
+    Serves the entries of a backend to `HTTPBackend` clients, one thread per connection.
+
+    Example:
+        >>> server = CacheServer(('0.0.0.0', 8765), FileBackend('shared_states'))
+        >>> server.serve_forever()
+    """
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', DEFAULT_PORT), backend=None):
+        """Initialize a new instance of the class.
+
+        Args:
+            address (tuple, optional): The host and port to listen on; port 0 picks a free one.
+                Defaults to ('127.0.0.1', 8765).
+            backend (Backend, optional): The backend storing the entries.
+                Defaults to a `FileBackend` in the default folder.
+
+        Returns:
+            None
+        """
+        super().__init__(address, _Handler)
+        self.backend = backend if backend is not None else FileBackend()
+
+    @property
+    def url(self):
+        """The base URL of the server, for `HTTPBackend`."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a daemon thread, returning the thread. Stop it with `shutdown`."""
+        thread = threading.Thread(target=self.serve_forever, name='cachorro-server', daemon=True)
+        thread.start()
+        return thread
+
+
+def main(argv=None):
+    """Run a cache server from the command line."""
+    parser = argparse.ArgumentParser(prog='python -m cachorro.server', description=main.__doc__)
+    parser.add_argument('--host', default='127.0.0.1', help="the address to listen on")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="the port to listen on")
+    parser.add_argument('--folder', default='shared_states', help="the folder storing the entries")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    with CacheServer((args.host, args.port), FileBackend(args.folder)) as server:
+        log.info(f"Serving {args.folder} on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
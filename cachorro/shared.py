@@ -0,0 +1,203 @@
+"""Saved states shared in memory by the processes of a machine.
+
+The first process loading an entry with `shared_memory` copies it, in the
+zero-copy format, to a `multiprocessing.shared_memory` segment named after
+the entry. The other processes attach to the segment instead of reading the file,
+and get the bytes-like values and buffers, like NumPy arrays, as read-only views
+on the shared pages, so that they are stored once whatever the number of processes.
+
+Each segment records the modification time and size of the saved state it was
+copied from, and is replaced when they change, e.g. once the entry is recomputed.
+It also counts the processes using it, under a file lock, and is removed when
+the last one exits, or when the entry is recomputed with `cacheme`, expires,
+is evicted or cleared. A process killed
+before exiting leaves its segments until the entry changes or the machine reboots.
+"""
+import hashlib
+import inspect
+import io
+import logging
+import multiprocessing.util
+import os
+import struct
+import tempfile
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from .locks import FileLock
+from .serialization import ALIGNMENT, read_buffer, read_value, write_value
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+SEGMENT_PREFIX = 'cch_'
+
+_HEADER = struct.Struct('<4sBBxxdQQQ')  # magic, ready, unlinked, mtime, size, users, length
+_MAGIC = b'CSHM'
+_DATA_OFFSET = ALIGNMENT  # the data is aligned like the out-of-band buffers it holds
+_HAS_TRACK = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+
+_attached = {}  # the segments used by this process, by name
+_retired = []  # the segments replaced while in use, kept open for the values viewing them
+_lock = threading.Lock()
+_finalizer_pid = None
+
+
+def segment_name(namespace, key):
+    """Return the name of the shared memory segment of an entry, short enough for every platform."""
+    return SEGMENT_PREFIX + hashlib.blake2b(f"{namespace}/{key}".encode(), digest_size=10).hexdigest()
+
+
+def _lock_path(name):
+    return os.path.join(tempfile.gettempdir(), 'cachorro-shm', f"{name}.lock")
+
+
+def _open(name, size=0):
+    """Attach to, or create if `size` is given, a segment not tracked by `multiprocessing`.
+
+    The processes using the segments count themselves in them, while the resource tracker
+    would remove them as soon as the first process using them exits. Before Python 3.13
+    and its `track` argument, the segment is unregistered right after being opened.
+    """
+    if _HAS_TRACK:
+        return shared_memory.SharedMemory(name, create=bool(size), size=size, track=False)
+    segment = shared_memory.SharedMemory(name, create=bool(size), size=size)
+    if shared_memory._USE_POSIX:  # only POSIX segments are registered
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    return segment
+
+
+def _attach(name):
+    try:
+        return _open(name)
+    except FileNotFoundError:
+        return None
+
+
+def _unlink(segment):
+    """Remove a segment's name, flagging it for the processes still using it."""
+    header = list(_HEADER.unpack_from(segment.buf))
+    header[2] = 1
+    _HEADER.pack_into(segment.buf, 0, *header)
+    try:
+        if _HAS_TRACK or not shared_memory._USE_POSIX:
+            segment.unlink()
+        else:  # unlink() would unregister the segment again, which was unregistered when opened
+            shared_memory._posixshmem.shm_unlink(segment._name)
+    except FileNotFoundError:
+        pass
+
+
+def _close(segment):
+    try:
+        segment.close()
+    except BufferError:  # values still view it: it is released when the process exits
+        _retired.append(segment)
+
+
+def read_shared(namespace, key, file):
+    """Return the value of a saved state from its shared memory segment, creating it if needed.
+
+    Args:
+        namespace (str): The namespace of the entry.
+        key (str or None): The key of the entry.
+        file (BinaryIO): The saved state, open for reading. It must be a real file,
+            whose modification time and size identify the version of the entry.
+
+    Returns:
+        tuple: The value, and its size in bytes.
+    """
+    try:
+        stat = os.fstat(file.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):  # not a real file
+        return read_value(file)
+    name = segment_name(namespace, key)
+    with _lock, FileLock(_lock_path(name)):
+        _register_finalizer()
+        segment = _attach(name)
+        if segment is not None:
+            _, ready, _, mtime, size, users, length = _HEADER.unpack_from(segment.buf)
+            if ready and (mtime, size) == (stat.st_mtime, stat.st_size):
+                current = _attached.get(name)
+                if current is not None and not _HEADER.unpack_from(current.buf)[2]:
+                    _close(segment)  # already counted, through the same segment
+                    segment = current
+                else:
+                    if current is not None:  # a removed segment, replaced since
+                        _retired.append(current)
+                    _HEADER.pack_into(segment.buf, 0, _MAGIC, 1, 0, mtime, size, users + 1, length)
+                    _attached[name] = segment
+                return read_buffer(segment.buf.toreadonly()[_DATA_OFFSET:_DATA_OFFSET + length])
+            _unlink(segment)  # a previous version of the entry, or an aborted copy
+            _close(segment)
+        previous = _attached.pop(name, None)
+        if previous is not None:
+            _retired.append(previous)
+
+        value, nbytes = read_value(file)
+        buffer = io.BytesIO()
+        write_value(value, buffer, zero_copy=True)
+        length = buffer.tell()
+        try:
+            segment = _open(name, _DATA_OFFSET + length)
+        except OSError as e:
+            log.warning(f"Could not share {namespace}/{key} in memory, loading a private copy: {e}")
+            return value, nbytes
+        segment.buf[_DATA_OFFSET:_DATA_OFFSET + length] = buffer.getbuffer()
+        _HEADER.pack_into(segment.buf, 0, _MAGIC, 1, 0, stat.st_mtime, stat.st_size, 1, length)
+        _attached[name] = segment
+        return read_buffer(segment.buf.toreadonly()[_DATA_OFFSET:_DATA_OFFSET + length])
+
+
+def invalidate_shared(namespace, key):
+    """Remove the shared memory segment of an entry, if any; the processes using it keep their views.
+
+    Called whenever an entry is recomputed or deleted. Without a segment, it costs a single
+    failed lookup, without taking the lock, so that deleting many entries stays cheap.
+    """
+    name = segment_name(namespace, key)
+    segment = _attach(name)
+    if segment is None:
+        return
+    _close(segment)
+    with _lock, FileLock(_lock_path(name)):
+        segment = _attach(name)
+        if segment is not None:
+            _unlink(segment)
+            _close(segment)
+
+
+def release_shared():
+    """Stop using the segments attached by this process, removing those no other process uses.
+
+    Runs when the process exits, including the worker processes of `multiprocessing`.
+    """
+    with _lock:
+        for name, segment in list(_attached.items()):
+            with FileLock(_lock_path(name)):
+                header = list(_HEADER.unpack_from(segment.buf))
+                header[5] -= 1
+                _HEADER.pack_into(segment.buf, 0, *header)
+                if header[5] <= 0 and not header[2]:
+                    _unlink(segment)
+            _close(segment)
+        _attached.clear()
+
+
+def _register_finalizer():
+    """Release the segments when the process exits, once per process, since forked children inherit the rest."""
+    global _finalizer_pid
+    if _finalizer_pid != os.getpid():
+        _finalizer_pid = os.getpid()
+        multiprocessing.util.Finalize(None, release_shared, exitpriority=10)
+
+
+def _forget_inherited():
+    """Forget the segments attached by the parent of a forked process: they are counted for the parent only."""
+    global _lock
+    _lock = threading.Lock()  # it may have been held by another thread of the parent
+    _retired.extend(_attached.values())
+    _attached.clear()
+
+
+os.register_at_fork(after_in_child=_forget_inherited)
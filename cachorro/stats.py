@@ -0,0 +1,156 @@
+"""Cache statistics and instrumentation hooks."""
+import logging
+import threading
+from collections import namedtuple
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+Event = namedtuple('Event', ['kind', 'func_name', 'key', 'seconds', 'nbytes', 'error'])
+
+_hooks = []
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class CacheStats:
+    """CacheStats class.
+
+    The counters of a cached function, shared by `cacheme`, `Cached`,
+    `load_cache` and `save_cache` for the same function name:
+
+    - `hits`, of which `memory_hits` were served by the in-memory tier, and `misses`;
+    - `stale_hits`, the hits past their `stale_after` age, served while refreshed in the background;
+    - `compute_time`, `load_time` and `save_time`, in seconds;
+    - `bytes_read` and `bytes_written`;
+    - `errors`, raised by the function or while saving, and `corruptions`,
+      saved states that failed to load.
+    """
+    _fields = ('hits', 'memory_hits', 'stale_hits', 'misses', 'compute_time', 'load_time', 'save_time',
+               'bytes_read', 'bytes_written', 'errors', 'corruptions')
+
+    def __init__(self, func_name):
+        """Initialize a new instance of the class.
+
+        Args:
+            func_name (str): The name of the function.
+
+        Returns:
+            None
+        """
+        self.func_name = func_name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Reset every counter to zero."""
+        with self._lock:
+            for field in self._fields:
+                setattr(self, field, 0)
+
+    @property
+    def hit_rate(self):
+        """The fraction of the lookups that were hits, or None before the first lookup."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def snapshot(self):
+        """Return the counters as a dict."""
+        with self._lock:
+            snapshot = {field: getattr(self, field) for field in self._fields}
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else None
+        return snapshot
+
+    def record(self, kind, key=None, seconds=0.0, nbytes=0, error=None):
+        """Record an event, updating the counters and calling the registered hooks.
+
+        Args:
+            kind (str): One of 'memory_hit', 'hit' (a saved state was loaded), 'stale'
+                (a hit was stale, and refreshed), 'miss', 'compute', 'save', 'error' and 'corrupt'.
+            key (str, optional): The key of the entry.
+            seconds (float, optional): How long the operation took.
+            nbytes (int, optional): How many bytes were read or written.
+            error (Exception, optional): The error raised, for 'error' and 'corrupt'.
+        """
+        with self._lock:
+            if kind == 'memory_hit':
+                self.hits += 1
+                self.memory_hits += 1
+            elif kind == 'hit':
+                self.hits += 1
+                self.load_time += seconds
+                self.bytes_read += nbytes
+            elif kind == 'stale':
+                self.stale_hits += 1
+            elif kind == 'miss':
+                self.misses += 1
+            elif kind == 'compute':
+                self.compute_time += seconds
+            elif kind == 'save':
+                self.save_time += seconds
+                self.bytes_written += nbytes
+            elif kind == 'error':
+                self.errors += 1
+            elif kind == 'corrupt':
+                self.corruptions += 1
+        if _hooks:
+            _emit(Event(kind, self.func_name, key, seconds, nbytes, error))
+
+
+def _emit(event):
+    for hook in list(_hooks):
+        try:
+            hook(event)
+        except Exception as e:
+            log.critical(f"Error in cache hook {hook!r}: {e}")
+
+
+def get_function_stats(func_name):
+    """Return the `CacheStats` of a function, creating them on first use."""
+    stats = _registry.get(func_name)
+    if stats is None:
+        with _registry_lock:
+            stats = _registry.setdefault(func_name, CacheStats(func_name))
+    return stats
+
+
+def get_stats():
+    """Return a snapshot of the counters of every function, as a dict keyed by function name.
+
+    Example:
+        >>> get_stats()
+        {'my_function': {'hits': 10, 'memory_hits': 8, 'misses': 2, ..., 'hit_rate': 0.83}}
+    """
+    with _registry_lock:
+        registered = list(_registry.values())
+    return {stats.func_name: stats.snapshot() for stats in registered}
+
+
+def reset_stats():
+    """Reset the counters of every function."""
+    with _registry_lock:
+        registered = list(_registry.values())
+    for stats in registered:
+        stats.reset()
+
+
+def add_hook(hook):
+    """Register a callable, called with an `Event` for everything the cache does.
+
+    Hooks run synchronously, in the thread doing the operation, so they should be quick.
+    Exceptions raised by a hook are logged and otherwise ignored.
+    When no hook is registered, no event is built.
+
+    Example:
+        >>> from prometheus_client import Counter
+        >>> events = Counter('cachorro_events', 'Cache events', ['kind', 'func_name'])
+        >>> add_hook(lambda event: events.labels(event.kind, event.func_name).inc())
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregister a hook registered with `add_hook`."""
+    _hooks.remove(hook)
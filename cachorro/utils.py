@@ -1,48 +1,78 @@
 """Utilities for the library."""
 import __main__
 import os
-import pickle
+import time
 import logging
+from functools import lru_cache
+from .backends import DEFAULT_CACHE_FOLDER, FileBackend, get_backend
+from .compression import resolve_compression
+from .serializers import resolve_serializer
+from .lazy import LazyValue
+from .memory import invalidate_memory
+from .serialization import read_value, write_value
+from .shared import invalidate_shared
+from .stats import get_function_stats
 
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
 
-def get_cache_filepath(func_name, program_name=None):
-    """Generate the file path for the cache file.
+@lru_cache(maxsize=None)
+def _program_name(main_file):
+    return os.path.splitext(os.path.basename(main_file))[0]
+
+
+def get_cache_namespace(func_name, program_name=None):
+    """Return the namespace under which a function's results are stored by the backends.
 
-    Generate the file path for the cache file based on the function name
-    and the program name.
     Args:
         func_name (str): The name of the function.
         program_name (str, optional): The name of the program.
             If not provided, it will be derived from the current file name.
 
     Returns:
-        str: The file path for the cache file.
+        str: The namespace, `<program_name>_<func_name>`.
     """
     if program_name is None:
-        program_name = os.path.splitext(os.path.basename(__main__.__file__))[0]
-    folder = 'saved_states'
-    filename = f"{program_name}_{func_name}.pkl"
-    filepath = os.path.join(folder, filename)
+        program_name = _program_name(__main__.__file__)
+    return f"{program_name}_{func_name}"
 
-    return filepath
 
+def get_cache_filepath(func_name, program_name=None, key=None):
+    """Generate the file path for the cache file.
+
+    Generate the file path for the cache file based on the function name
+    and the program name, as laid out by the default `FileBackend`.
+    Results keyed by the call arguments are stored in a folder per function,
+    sharded in subfolders by the first characters of the key.
+    Args:
+        func_name (str): The name of the function.
+        program_name (str, optional): The name of the program.
+            If not provided, it will be derived from the current file name.
+        key (str, optional): The digest of the call arguments,
+            as returned by `make_key`. If not provided, the path of the
+            single, argument-less cache file is returned.
 
-def _ensure_folder_exists(folder):
-    """Ensure that a folder exists."""
-    os.makedirs(folder, exist_ok=True)
+    Returns:
+        str: The file path for the cache file.
+    """
+    namespace = get_cache_namespace(func_name, program_name)
+    return FileBackend(DEFAULT_CACHE_FOLDER).path(namespace, key)
 
 
-def clear_cache(func_name, program_name=None):
+def clear_cache(func_name, program_name=None, backend=None):
     """Clears the cache for a specific function.
 
+    Both the argument-less cache file and the results cached
+    for every set of arguments are removed, and the in-memory
+    tier of the function and their shared memory segments are invalidated.
+
     Args:
         func_name (str): The name of the function for which to clearthe cache.
         program_name (str, optional): The name of the program.
             If not provided, it will be derived from the current file name.
+        backend (Backend, optional): The storage backend. Defaults to the one set by `set_backend`.
 
     Returns:
         None
@@ -57,16 +87,19 @@ def clear_cache(func_name, program_name=None):
         Cache cleared for my_program.py: my_function
     """
     if program_name is None:
-        program_name = os.path.splitext(os.path.basename(__main__.__file__))[0]
-    filepath = get_cache_filepath(func_name, program_name)
-    if os.path.exists(filepath):
-        os.remove(filepath)
+        program_name = _program_name(__main__.__file__)
+    backend = backend or get_backend()
+    namespace = get_cache_namespace(func_name, program_name)
+    invalidate_memory(func_name)
+    for entry in list(backend.entries(namespace)):
+        invalidate_shared(namespace, entry.key)
+    if backend.clear(namespace):
         log.info(f"Cache cleared for {program_name}: {func_name}")
     else:
         log.info(f"No cache found for {program_name}: {func_name}")
 
 
-def load_cache(func_name, program_name=None):
+def load_cache(func_name, program_name=None, key=None, backend=None, zero_copy=False, lazy=False):
     """Load a specific funcion's cached result.
 
     This function loads a cached result from a file.
@@ -78,6 +111,13 @@ def load_cache(func_name, program_name=None):
         func_name (str): The name of the function to load the cache for.
         program_name (str, optional): The name of the program.
             If not provided, it will be inferred from the main file name.
+        key (str, optional): The key of the result cached for a set of arguments,
+            as returned by `make_key`. If not provided, the argument-less result is loaded.
+        backend (Backend, optional): The storage backend. Defaults to the one set by `set_backend`.
+        zero_copy (bool, optional): If True, results saved with `zero_copy` are returned
+            as read-only views on a memory mapping of the saved state. Defaults to False.
+        lazy (bool, optional): If True, only the existence of the saved state is checked,
+            and a `LazyValue` is returned, that loads it on first use. Defaults to False.
 
     Returns:
         The cached result if found and successfully loaded,
@@ -93,25 +133,47 @@ def load_cache(func_name, program_name=None):
         <cached_result>
     """
     if program_name is None:
-        program_name = os.path.splitext(os.path.basename(__main__.__file__))[0]
+        program_name = _program_name(__main__.__file__)
     complete_name = f"{program_name}: {func_name}"
-    filepath = get_cache_filepath(func_name, program_name)
-    if os.path.exists(filepath):
+    backend = backend or get_backend()
+    namespace = get_cache_namespace(func_name, program_name)
+    stats = get_function_stats(func_name)
+
+    def read(file, start):
         try:
-            with open(filepath, 'rb') as file:
+            with file:
                 log.info(f"Loading saved state for {complete_name}")
-                return pickle.load(file)
+                result, nbytes = read_value(file, zero_copy)
+            stats.record('hit', key, time.perf_counter() - start, nbytes)
+            return result
         except Exception as e:
             log_msg = f"Error loading saved state for {complete_name}: {e}\n"
             log.critical(log_msg)
-            os.remove(filepath)  # remove faulty pickle file
+            stats.record('corrupt', key, error=e)
+            backend.delete(namespace, key)  # remove faulty pickle file
             raise
+
+    def read_later():
+        start = time.perf_counter()
+        file = backend.open(namespace, key)
+        if file is None:
+            raise FileNotFoundError(f"Saved state for {complete_name} removed before being loaded")
+        return read(file, start)
+
+    if lazy and backend.exists(namespace, key):
+        return LazyValue(read_later)
+    start = time.perf_counter()
+    file = None if lazy else backend.open(namespace, key)
+    if file is not None:
+        return read(file, start)
     else:
         log.info(f"No cache found for {func_name}")
+        stats.record('miss', key)
         return None
 
 
-def save_cache(data, func_name, program_name=None):
+def save_cache(data, func_name, program_name=None, key=None, backend=None, zero_copy=False,
+               compression=None, serializer=None):
     """Saves to the cache file for the specified function.
 
     It substitutes the @cacheme decorator at times when it can't be used.
@@ -123,6 +185,16 @@ def save_cache(data, func_name, program_name=None):
         func_name (str): The name of the function for which to save the cache.
         program_name (str, optional): The name of the program. If not provided,
             it will be derived from the current file name.
+        key (str, optional): The key of the result cached for a set of arguments,
+            as returned by `make_key`. If not provided, the argument-less result is saved.
+        backend (Backend, optional): The storage backend. Defaults to the one set by `set_backend`.
+        zero_copy (bool, optional): If True, bytes-like data and large buffers are stored
+            out of the pickle stream, so that they can be memory mapped on load. Defaults to False.
+        compression (str or Compression, optional): How to compress the saved state:
+            'zlib', 'bz2', 'lzma', 'auto', `Compression` settings, or False for none.
+            Defaults to the compression set by `set_compression`.
+        serializer (str or Serializer, optional): How to serialize the saved state: 'pickle', 'auto',
+            or a serializer name, as in `cacheme`. Defaults to the serializer set by `set_serializer`.
 
     Raises:
         Exception: If there is an error while saving the cache file.
@@ -132,14 +204,19 @@ def save_cache(data, func_name, program_name=None):
         Saving state for my_program: my_function
     """
     if program_name is None:
-        program_name = os.path.splitext(os.path.basename(__main__.__file__))[0]
+        program_name = _program_name(__main__.__file__)
     complete_name = f"{program_name}: {func_name}"
-    filepath = get_cache_filepath(func_name, program_name)
-    _ensure_folder_exists(os.path.dirname(filepath))
+    backend = backend or get_backend()
+    invalidate_memory(func_name)
+    stats = get_function_stats(func_name)
+    start = time.perf_counter()
     try:
-        with open(filepath, 'wb') as file:
+        with backend.create(get_cache_namespace(func_name, program_name), key) as file:
             log.info(f"Saving state for {complete_name}")
-            pickle.dump(data, file)
+            nbytes = write_value(data, file, zero_copy, resolve_compression(compression),
+                                 resolve_serializer(serializer))
     except Exception as e:
         log.critical(f"Failed to save state for {complete_name}: {e}")
+        stats.record('error', key, error=e)
         raise
+    stats.record('save', key, time.perf_counter() - start, nbytes)
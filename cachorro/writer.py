@@ -0,0 +1,76 @@
+"""Write-behind persistence of the saved states, off the calling thread."""
+import atexit
+import logging
+import queue
+import threading
+
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+DEFAULT_MAX_PENDING = 64
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class BackgroundWriter(threading.Thread):
+    """BackgroundWriter class.
+
+    A daemon thread running the writes submitted to it, in order, through a bounded queue:
+    `submit` blocks while `max_pending` writes are already waiting, so that callers
+    producing results faster than they can be saved are slowed down instead of
+    piling them up in memory.
+
+    Example:
+        >>> writer = get_writer()
+        >>> writer.submit(save_cache, data, 'my_function')
+        >>> writer.flush()
+    """
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING):
+        """Initialize a new instance of the class.
+
+        Args:
+            max_pending (int, optional): The maximum number of writes waiting in the queue. Defaults to 64.
+
+        Returns:
+            None
+        """
+        super().__init__(name='cachorro-writer', daemon=True)
+        self._queue = queue.Queue(max_pending)
+
+    def submit(self, function, *args):
+        """Queue a call to `function` with `args`, waiting while the queue is full."""
+        self._queue.put((function, args))
+
+    def flush(self):
+        """Wait until every write submitted so far is done."""
+        self._queue.join()
+
+    def run(self):
+        """Run the submitted writes, logging their errors."""
+        while True:
+            function, args = self._queue.get()
+            try:
+                function(*args)
+            except Exception as e:
+                log.critical(f"Error in background write: {e}")
+            finally:
+                self._queue.task_done()
+
+
+def get_writer():
+    """Return the background writer shared by the cached functions, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = BackgroundWriter()
+            _writer.start()
+            atexit.register(_writer.flush)
+        return _writer
+
+
+def flush():
+    """Wait until the saved states being written in the background are published."""
+    if _writer is not None:
+        _writer.flush()
@@ -0,0 +1,175 @@
+"""Provides the unit tests for the storage backends."""
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from cachorro import FileBackend, SQLiteBackend, cacheme, load_cache, save_cache, clear_cache, make_key
+from cachorro.manifest import MIN_COMPACT_RECORDS
+
+
+class BackendTests:
+    """Unit tests shared by every backend."""
+
+    def make_backend(self, folder):
+        """Return the backend under test, storing in `folder`."""
+        raise NotImplementedError
+
+    def setUp(self):
+        """Create the backend in a temporary folder."""
+        self.folder = tempfile.mkdtemp()
+        self.backend = self.make_backend(self.folder)
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def test_read_write(self):
+        """Entries are written, read, listed and deleted."""
+        self.backend.write('prog_f', None, b'plain')
+        self.backend.write('prog_f', 'ab12', b'keyed')
+        self.backend.write_many('prog_g', [('cd34', b'1'), ('ef56', b'22')])
+
+        self.assertEqual(self.backend.read('prog_f', None), b'plain')
+        self.assertEqual(self.backend.read('prog_f', 'ab12'), b'keyed')
+        self.assertIsNone(self.backend.read('prog_f', 'missing'))
+        self.assertEqual(self.backend.read_many('prog_g', ['cd34', 'ef56', 'missing']), {'cd34': b'1', 'ef56': b'22'})
+        self.assertEqual(sorted((e.namespace, e.key or '', e.size) for e in self.backend.entries()),
+                         [('prog_f', '', 5), ('prog_f', 'ab12', 5), ('prog_g', 'cd34', 1), ('prog_g', 'ef56', 2)])
+
+        self.assertTrue(self.backend.delete('prog_f', 'ab12'))
+        self.assertFalse(self.backend.exists('prog_f', 'ab12'))
+        self.assertTrue(self.backend.clear('prog_g'))
+        self.assertEqual([e.key for e in self.backend.entries()], [None])
+
+    def test_failed_write_is_not_published(self):
+        """An entry whose writing raises is not published."""
+        with self.assertRaises(ValueError):
+            with self.backend.create('prog_f', 'ab12') as file:
+                file.write(b'partial')
+                raise ValueError
+        self.assertFalse(self.backend.exists('prog_f', 'ab12'))
+
+    def test_cache_functions(self):
+        """Cacheme and the cache functions go through the backend."""
+        @cacheme(backend=self.backend)
+        def backend_func(n):
+            """Dummy function to test the library."""
+            return n + 1
+
+        self.assertEqual(backend_func(1), 2)
+        save_cache('data', 'backend_func', backend=self.backend)
+        self.assertEqual(load_cache('backend_func', backend=self.backend), 'data')
+        self.assertEqual(load_cache('backend_func', key=make_key(backend_func, 1), backend=self.backend), 2)
+        clear_cache('backend_func', backend=self.backend)
+        self.assertEqual(list(self.backend.entries()), [])
+
+    def test_map(self):
+        """Map bulk-loads the hits and computes each distinct miss once, in input order."""
+        calls = []
+
+        @cacheme(backend=self.backend, max_entries=0)
+        def map_func(a, b):
+            """Dummy function to test the library."""
+            calls.append((a, b))
+            return a * b
+
+        self.assertEqual(list(map_func.map([1, 2, 1], [3, 4, 3])), [3, 8, 3])
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(list(map_func.map([2, 5, 6], [4, 5, 6], executor=executor)), [8, 25, 36])
+        self.assertEqual(sorted(calls), [(1, 3), (2, 4), (5, 5), (6, 6)])
+        self.assertEqual(map_func(5, 5), 25)
+        self.assertEqual(len(calls), 4)
+
+
+class TestFileBackend(BackendTests, unittest.TestCase):
+    """Unit tests for FileBackend."""
+
+    def make_backend(self, folder):
+        """Return a FileBackend."""
+        return FileBackend(folder)
+
+    def test_sharded_layout(self):
+        """Keyed entries are sharded by the first characters of the key."""
+        self.backend.write('prog_f', 'ab12', b'keyed')
+        self.assertTrue(os.path.isfile(os.path.join(self.folder, 'prog_f', 'ab', 'ab12.pkl')))
+
+    def test_unsafe_names(self):
+        """Namespaces and keys that would escape the folder are rejected."""
+        for namespace, key in [('..', None), ('/tmp', None), ('a/b', None), ('.manifest', None),
+                               ('prog_f', '../../owned'), ('prog_f', 'a\\b'), ('prog_f', 'ab\0')]:
+            with self.assertRaises(ValueError):
+                self.backend.write(namespace, key, b'x')
+        with self.assertRaises(ValueError):
+            self.backend.clear('..')
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+class TestManifestFileBackend(BackendTests, unittest.TestCase):
+    """Unit tests for FileBackend with a manifest."""
+
+    def make_backend(self, folder):
+        """Return a FileBackend with a manifest."""
+        return FileBackend(folder, manifest=True)
+
+    def test_shared_between_instances(self):
+        """The entries written by another instance, like another process, are seen at once."""
+        other = FileBackend(self.folder, manifest=True)
+        self.assertFalse(self.backend.exists('prog_f', 'ab12'))
+        other.write('prog_f', 'ab12', pickle.dumps(1))
+        self.assertEqual(self.backend.read('prog_f', 'ab12'), pickle.dumps(1))
+        self.assertEqual(self.backend.manifest.get('prog_f', 'ab12').format, 0)
+        other.delete('prog_f', 'ab12')
+        self.backend.manifest.refresh()
+        self.assertFalse(self.backend.exists('prog_f', 'ab12'))
+
+    def test_no_filesystem_access(self):
+        """Known entries are checked and listed without touching the filesystem."""
+        self.backend.write('prog_f', 'ab12', b'keyed')
+        with mock.patch('os.stat', side_effect=AssertionError), mock.patch('os.scandir', side_effect=AssertionError):
+            self.assertTrue(self.backend.exists('prog_f', 'ab12'))
+            self.assertEqual(self.backend.stat('prog_f', 'ab12').size, 5)
+
+    def test_compaction_and_rebuild(self):
+        """The log is compacted once it holds too many records, and rebuilt from the folder if missing."""
+        other = FileBackend(self.folder, manifest=True)
+        self.assertFalse(other.exists('prog_f', 'zz11'))
+        for i in range(MIN_COMPACT_RECORDS):
+            self.backend.write('prog_f', f"ab{i}", b'1')
+            self.backend.delete('prog_f', f"ab{i}")
+        with open(self.backend.manifest.path) as file:
+            self.assertLessEqual(len(file.readlines()), MIN_COMPACT_RECORDS + 1)  # 2000 records otherwise
+
+        os.remove(self.backend.manifest.path)
+        self.backend.write('prog_f', 'zz11', b'plain')
+        self.assertTrue(other.exists('prog_f', 'zz11'))  # from the rebuilt log, whatever its inode
+        self.assertEqual([(e.namespace, e.key, e.size) for e in other.entries()], [('prog_f', 'zz11', 5)])
+
+    def test_batched_touches(self):
+        """Accesses are applied in memory at once, and appended to the log in batches."""
+        self.backend.write('prog_f', 'ab12', b'keyed')
+        other = FileBackend(self.folder, manifest=True)
+        self.backend.manifest.touch_interval = 60
+        with mock.patch('cachorro.manifest.FileLock', side_effect=AssertionError):
+            for _ in range(10):
+                self.backend.touch('prog_f', 'ab12')
+        atime = self.backend.stat('prog_f', 'ab12').atime
+        self.assertGreater(atime, other.stat('prog_f', 'ab12').atime)
+
+        self.backend.manifest.flush()
+        other.manifest.refresh()
+        self.assertEqual(other.stat('prog_f', 'ab12').atime, atime)
+
+
+class TestSQLiteBackend(BackendTests, unittest.TestCase):
+    """Unit tests for SQLiteBackend."""
+
+    def make_backend(self, folder):
+        """Return a SQLiteBackend."""
+        return SQLiteBackend(os.path.join(folder, 'cache.sqlite3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Provides the unit tests for the command line interface."""
+import io
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from unittest import mock
+from cachorro import FileBackend
+from cachorro.cli import format_age, format_size, main
+
+
+class TestCli(unittest.TestCase):
+    """Unit tests for the `python -m cachorro` commands."""
+
+    def setUp(self):
+        """Create a folder with two valid entries and a corrupt one."""
+        self.folder = tempfile.mkdtemp()
+        self.backend = FileBackend(self.folder)
+        self.backend.write('prog_f', None, pickle.dumps([1, 2, 3]))
+        self.backend.write('prog_g', 'ab12', pickle.dumps('x' * 2000))
+        self.backend.write('prog_g', 'cd34', b'garbage')
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def run_cli(self, *args):
+        """Run a command, returning its exit code and output."""
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = main(['--folder', self.folder, *args])
+        return code, out.getvalue()
+
+    def test_list_and_stats(self):
+        """The entries are listed with their sizes, and summed by namespace."""
+        code, out = self.run_cli('list', 'prog_g')
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(line.split()[-1] for line in out.splitlines()), ['prog_g/ab12', 'prog_g/cd34'])
+        code, out = self.run_cli('stats')
+        self.assertIn('prog_g: 2 entries', out)
+        self.assertIn('total: 3 entries', out)
+
+    def test_verify(self):
+        """Corrupt entries are reported by a pool of processes, and removed with --remove."""
+        code, out = self.run_cli('verify', '--workers', '2')
+        self.assertEqual(code, 1)
+        self.assertIn('corrupt\tprog_g/cd34', out)
+        self.assertIn('verified 3 entries: 1 corrupt', out)
+        self.assertTrue(self.backend.exists('prog_g', 'cd34'))
+
+        code, out = self.run_cli('verify', '--remove')
+        self.assertEqual(code, 0)
+        self.assertFalse(self.backend.exists('prog_g', 'cd34'))
+        self.assertTrue(self.backend.exists('prog_g', 'ab12'))
+
+    def test_prune(self):
+        """Pruning keeps the entries within the limits."""
+        self.backend.touch('prog_f', None)
+        code, out = self.run_cli('prune', '--max-entries', '1')
+        self.assertEqual(code, 0)
+        self.assertEqual([entry.namespace for entry in self.backend.entries()], ['prog_f'])
+        self.assertTrue(os.path.isfile(self.backend.path('prog_f', None)))
+
+    def test_formats(self):
+        """Sizes and ages are shown in their largest unit."""
+        self.assertEqual(format_size(512), '512 B')
+        self.assertEqual(format_size(1536 * 1024), '1.5 MiB')
+        self.assertEqual(format_age(90), '1m')
+        self.assertEqual(format_age(3 * 86400 + 5), '3d')
+
+    def test_warm(self):
+        """Warming runs the script with the arguments of its initialize_caching call, loading the steps next time."""
+        cache_dir = os.path.join(self.folder, 'steps')
+        script = os.path.join(self.folder, 'script.py')
+        with open(script, 'w') as file:
+            file.write("from cachorro.decorators import initialize_caching\n"
+                       f"initialize_caching(cache_dir={cache_dir!r}, parallel=True, max_workers=2)\n\n"
+                       "def load(n):\n    return list(range(n))\n\n"
+                       "x = cacheme(load, 3)\ny = cacheme(sum, x)\n")
+        with mock.patch.object(sys, 'argv', list(sys.argv)), \
+                mock.patch('cachorro.cli.ThreadPoolExecutor', wraps=ThreadPoolExecutor) as executor:
+            code, out = self.run_cli('warm', script)
+            self.assertEqual((code, out), (0, "executed 2 steps, loaded 0 steps\n"))
+            executor.assert_called_once_with(2)
+            self.assertEqual(sorted(os.listdir(cache_dir)), ['.bytecode', 'x', 'y'])
+            self.assertEqual(self.run_cli('warm', script)[1], "executed 0 steps, loaded 2 steps\n")
+            code, out = self.run_cli('warm', '--cache-dir', os.path.join(self.folder, 'other'), script)
+            self.assertEqual(out, "executed 2 steps, loaded 0 steps\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
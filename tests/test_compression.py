@@ -0,0 +1,54 @@
+"""Provides the unit tests for the compression of the saved states."""
+import os
+import shutil
+import tempfile
+import unittest
+from cachorro import Compression, FileBackend, load_cache, save_cache
+
+
+class TestCompression(unittest.TestCase):
+    """Unit tests for the compression codecs."""
+
+    def setUp(self):
+        """Create a backend in a temporary folder."""
+        self.folder = tempfile.mkdtemp()
+        self.backend = FileBackend(self.folder)
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def saved_size(self, func_name):
+        """Return the size of a saved state."""
+        return self.backend.stat(f"prog_{func_name}", None).size
+
+    def test_codecs(self):
+        """Every codec roundtrips, and mixed files load transparently."""
+        data = {'records': [('name', 1.5, None)] * 10000}
+        save_cache(data, 'raw', 'prog', backend=self.backend, compression=False)
+        for codec in ('zlib', 'bz2', 'lzma'):
+            save_cache(data, codec, 'prog', backend=self.backend, compression=codec)
+            self.assertEqual(load_cache(codec, 'prog', backend=self.backend), data)
+            self.assertLess(self.saved_size(codec), self.saved_size('raw') / 10)
+        self.assertEqual(load_cache('raw', 'prog', backend=self.backend), data)
+
+    def test_auto(self):
+        """The auto mode skips small and incompressible payloads."""
+        incompressible = os.urandom(500000)
+        save_cache(incompressible, 'random', 'prog', backend=self.backend, compression='auto')
+        save_cache(b'x' * 100, 'small', 'prog', backend=self.backend, compression='auto')
+        save_cache(b'x' * 100000, 'large', 'prog', backend=self.backend, compression='auto')
+
+        self.assertGreater(self.saved_size('random'), 500000)
+        self.assertGreater(self.saved_size('small'), 100)
+        self.assertLess(self.saved_size('large'), 1000)
+        self.assertEqual(load_cache('random', 'prog', backend=self.backend), incompressible)
+
+    def test_unknown_codec(self):
+        """Unknown codecs are rejected."""
+        with self.assertRaises(ValueError):
+            Compression('snappy')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,32 @@
 """Provides the unit tests for the decorators."""
+import asyncio
 import unittest
 import os
 import shutil
-from time import sleep
-from cachorro import cacheme
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter, sleep, time
+from unittest import mock
+from cachorro import AdmissionPolicy, cacheme, clear_cache, flush, get_admission_report, get_cache_filepath, make_key
 
 TEST_SAVED_DIR = 'saved_states'
 
 
+@cacheme(max_entries=0)
+def pool_func(n):
+    """Dummy function to test the library in a process pool."""
+    return os.getpid()
+
+
+class SlowPickle:
+    """A value that takes a while to pickle."""
+
+    def __reduce__(self):
+        """Sleep, then pickle the class."""
+        sleep(0.3)
+        return (SlowPickle, ())
+
+
 class TestCacheme(unittest.TestCase):
     """Unit tests for cacheme decorator."""
 
@@ -43,6 +62,228 @@ class TestCacheme(unittest.TestCase):
         self.assertEqual(result_1, [2, 4, 6])
         self.assertEqual(result_1, result_2)
 
+    def test_cacheme_arguments(self):
+        """Unit tests for cacheme decorator keyed on the call arguments."""
+        calls = []
+
+        @cacheme
+        def test_func_args(arr, factor=2):
+            """Dummy function to test the library."""
+            calls.append(arr)
+            return [x * factor for x in arr]
+
+        self.assertEqual(test_func_args([1, 2, 3]), [2, 4, 6])
+        self.assertEqual(test_func_args([4, 5, 6]), [8, 10, 12])
+        self.assertEqual(test_func_args(arr=[1, 2, 3], factor=2), [2, 4, 6])
+        self.assertEqual(calls, [[1, 2, 3], [4, 5, 6]])
+
+    def test_cacheme_memory(self):
+        """Unit tests for the in-memory tier of cacheme decorator."""
+        calls = []
+
+        @cacheme(max_entries=2)
+        def test_func_memory(n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            return n * 2
+
+        for n in (1, 1, 2, 3):
+            test_func_memory(n)
+        info = test_func_memory.memory.info()
+        self.assertEqual((info.hits, info.entries, info.max_entries), (1, 2, 2))
+
+        clear_cache('test_func_memory')
+        self.assertEqual(len(test_func_memory.memory), 0)
+        self.assertEqual(test_func_memory(1), 2)
+        self.assertEqual(calls, [1, 2, 3, 1])
+
+    def test_cacheme_single_flight(self):
+        """Unit tests for cacheme decorator with concurrent misses on the same key."""
+        calls = []
+
+        @cacheme(single_flight=True, max_entries=0)
+        def test_func_flight(n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            sleep(0.2)
+            return n * 2
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(test_func_flight(7))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [14] * 4)
+        self.assertEqual(calls, [7])
+        folder = os.path.dirname(get_cache_filepath('test_func_flight', key=make_key(test_func_flight, 7)))
+        self.assertFalse([name for name in os.listdir(folder) if name.endswith('.tmp')])
+
+    def test_cacheme_async(self):
+        """Unit tests for cacheme decorator on coroutine functions."""
+        calls = []
+
+        @cacheme
+        async def test_func_async(n):
+            """Dummy coroutine function to test the library."""
+            calls.append(n)
+            await asyncio.sleep(0.1)
+            return n * 2
+
+        async def run():
+            results = await asyncio.gather(*(test_func_async(3) for _ in range(5)))
+            test_func_async.memory.invalidate()
+            results.append(await test_func_async(3))
+            return results
+
+        self.assertEqual(asyncio.run(run()), [6] * 6)
+        self.assertEqual(calls, [3])
+
+    def test_cacheme_code_change(self):
+        """Unit tests for cacheme decorator recomputing when the function changes."""
+        def define(factor):
+            @cacheme(max_entries=0)
+            def test_func_versions(n):
+                """Dummy function to test the library."""
+                calls.append(n)
+                return n * factor
+            return test_func_versions
+
+        calls = []
+        self.assertEqual(define(2)(1), 2)
+        self.assertEqual(define(2)(1), 2)
+        self.assertEqual(calls, [1])
+
+        # The closure variable is not part of the code: only the code is tracked
+        self.assertEqual(define(3)(1), 2)
+
+        @cacheme(max_entries=0)
+        def test_func_versions(n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            return n * 3
+
+        self.assertEqual(test_func_versions(1), 3)
+        self.assertEqual(calls, [1, 1])
+
+    def test_cacheme_generator(self):
+        """Unit tests for cacheme decorator on generator functions."""
+        calls = []
+
+        @cacheme
+        def test_func_gen(n):
+            """Dummy generator function to test the library."""
+            calls.append(n)
+            for i in range(n):
+                if i == 3 and n == 5:
+                    raise ValueError(i)
+                yield {'i': i}
+
+        stream = test_func_gen(10)
+        self.assertEqual([next(stream) for _ in range(2)], [{'i': 0}, {'i': 1}])
+        stream.close()  # aborted runs are not published
+        with self.assertRaises(ValueError):
+            list(test_func_gen(5))
+        self.assertFalse(os.path.exists(get_cache_filepath('test_func_gen', key=make_key(test_func_gen, 5))))
+
+        self.assertEqual(list(test_func_gen(10)), [{'i': i} for i in range(10)])
+        self.assertEqual(list(test_func_gen(10)), [{'i': i} for i in range(10)])
+        self.assertEqual(calls, [10, 5, 10])
+
+    def test_cacheme_write_behind(self):
+        """Unit tests for cacheme decorator saving the results in the background."""
+        calls = []
+
+        @cacheme(write_behind=True, max_entries=0)
+        def test_func_behind(n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            return [SlowPickle()] * n
+
+        start = perf_counter()
+        result = test_func_behind(2)
+        self.assertLess(perf_counter() - start, 0.2)
+        self.assertIs(test_func_behind(2), result)  # served from memory until saved
+        filepath = get_cache_filepath('test_func_behind', key=make_key(test_func_behind, 2))
+        self.assertFalse(os.path.exists(filepath))
+
+        flush()
+        self.assertTrue(os.path.exists(filepath))
+        self.assertEqual(len(test_func_behind(2)), 2)
+        self.assertEqual(calls, [2])
+
+    def test_cacheme_stale_while_revalidate(self):
+        """Unit tests for cacheme decorator refreshing stale results in the background."""
+        calls = []
+        release = threading.Event()
+        clock = [time()]
+
+        @cacheme(stale_after=60)
+        def test_func_stale(n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            if len(calls) > 1:
+                release.wait(10)  # the refresh runs until released, while the stale result is served
+            return n * len(calls)
+
+        with mock.patch('time.time', lambda: clock[0]):
+            self.assertEqual(test_func_stale(2), 2)
+            self.assertEqual(test_func_stale(2), 2)
+            clock[0] += 61
+            self.assertEqual([test_func_stale(2) for _ in range(5)], [2] * 5)  # stale, a single refresh
+            release.set()
+            deadline = perf_counter() + 10
+            while test_func_stale(2) != 4 and perf_counter() < deadline:
+                sleep(0.01)
+            self.assertEqual(test_func_stale(2), 4)
+        self.assertEqual(calls, [2, 2])
+        self.assertEqual(test_func_stale.stats.stale_hits, 1)
+
+    def test_cacheme_unhashable_arguments(self):
+        """Unit tests for cacheme decorator running calls with unhashable arguments without caching."""
+        calls = []
+
+        @cacheme(max_entries=0)
+        def test_func_unhashable(lock, n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            return n
+
+        with self.assertLogs('cachorro.decorators', 'WARNING'):
+            self.assertEqual(test_func_unhashable(threading.Lock(), 1), 1)
+            self.assertEqual(test_func_unhashable(threading.Lock(), 1), 1)
+            self.assertEqual(list(test_func_unhashable.map([threading.Lock()], [2])), [2])
+        self.assertEqual(calls, [1, 1, 2])
+        self.assertEqual(test_func_unhashable.stats.misses, 0)
+
+    def test_cacheme_admission(self):
+        """Unit tests for cacheme decorator only saving the results slower to compute than to load."""
+        @cacheme(admission=AdmissionPolicy(warmup=1, min_saving=0.01))
+        def test_func_admission(n):
+            """Dummy function to test the library."""
+            sleep(n)
+            return n
+
+        def saved(n):
+            return os.path.exists(get_cache_filepath('test_func_admission', key=make_key(test_func_admission, n)))
+
+        for n in (0, 0.001, 0.05):
+            self.assertEqual(test_func_admission(n), n)
+        self.assertEqual([saved(n) for n in (0, 0.001, 0.05)], [True, False, True])
+        self.assertEqual(test_func_admission(0.001), 0.001)  # kept in memory
+
+        report = get_admission_report()['test_func_admission']
+        self.assertEqual((report['admitted'], report['rejected'], report['admitting']), (2, 1, True))
+        self.assertEqual(test_func_admission.costs.report()['admitted'], 2)
+
+    def test_cacheme_map_processes(self):
+        """Unit tests for cacheme map computing the misses in a process pool."""
+        with ProcessPoolExecutor(2) as executor:
+            pids = list(pool_func.map(range(8), executor=executor, chunksize=2))
+        self.assertNotIn(os.getpid(), pids)
+        self.assertEqual([pool_func(n) for n in range(8)], pids)
+
     def test_cacheme_error(self):
         """Unit tests for cacheme decorator with errors."""
         @cacheme
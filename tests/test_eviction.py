@@ -0,0 +1,66 @@
+"""Provides the unit tests for the eviction of saved states."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from cachorro import EvictionPolicy, FileBackend, cacheme, get_cache_namespace, make_key, prune
+
+
+class TestEviction(unittest.TestCase):
+    """Unit tests for EvictionPolicy and prune."""
+
+    def setUp(self):
+        """Create a backend in a temporary folder."""
+        self.folder = tempfile.mkdtemp()
+        self.backend = FileBackend(self.folder)
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def test_lru_on_write(self):
+        """Writes beyond max_entries evict the least recently accessed entries."""
+        policy = EvictionPolicy(max_entries=3, low_watermark=0.7)
+
+        @cacheme(backend=self.backend, eviction=policy, max_entries=0)
+        def evicted_func(n):
+            """Dummy function to test the library."""
+            return n
+
+        for n in range(3):
+            evicted_func(n)
+        past = time.time() - 100
+        for entry in self.backend.entries():
+            os.utime(self.backend.path(entry.namespace, entry.key), (past, entry.mtime))
+        evicted_func(0)  # a hit makes entry 0 the most recently accessed
+        evicted_func(3)
+
+        namespace = get_cache_namespace('evicted_func')
+        remaining = [n for n in range(4) if self.backend.exists(namespace, make_key(evicted_func, n))]
+        self.assertEqual(remaining, [0, 3])
+
+    def test_ttl(self):
+        """Expired entries are recomputed and pruned."""
+        calls = []
+
+        @cacheme(backend=self.backend, eviction=EvictionPolicy(ttl=0.2), max_entries=0)
+        def expiring_func(n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            return n
+
+        expiring_func(1)
+        expiring_func(1)
+        time.sleep(0.3)
+        expiring_func(1)
+        self.assertEqual(calls, [1, 1])
+
+        time.sleep(0.3)
+        report = prune('expiring_func', backend=self.backend, policy=EvictionPolicy(ttl=0.2))
+        self.assertEqual((report.removed_entries, report.entries), (1, 0))
+        self.assertGreater(report.removed_bytes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
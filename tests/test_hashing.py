@@ -0,0 +1,66 @@
+"""Provides the unit tests for the argument hashing."""
+import inspect
+import threading
+import unittest
+from cachorro import hash_value, make_key
+from cachorro.hashing import UnhashableError, fingerprint_function, hash_arguments
+
+
+class TestHashing(unittest.TestCase):
+    """Unit tests for hash_value and make_key."""
+
+    def test_hash_value_types(self):
+        """Values that compare equal but differ in type get distinct digests."""
+        digests = {hash_value(v) for v in (1, 1.0, True, '1', b'1', (1,), [1])}
+        self.assertEqual(len(digests), 7)
+        self.assertEqual(hash_value({'a': 1, 'b': 2}), hash_value({'b': 2, 'a': 1}))
+        self.assertEqual(hash_value({3, 1, 2}), hash_value({1, 2, 3}))
+        self.assertNotEqual(hash_value([1, 2]), hash_value([2, 1]))
+
+    def test_hash_value_fallback(self):
+        """Objects without a fast path are hashed through pickle."""
+        self.assertEqual(hash_value(range(3)), hash_value(range(3)))
+        self.assertNotEqual(hash_value(range(3)), hash_value(range(4)))
+
+    def test_hash_value_unpicklable(self):
+        """Functions and strided views are hashed without pickle, other unpicklable values raise."""
+        scale = 2
+        self.assertEqual(hash_value(lambda x: x * scale), hash_value(lambda x: x * scale))
+        self.assertNotEqual(hash_value(lambda x: x * scale), hash_value(lambda x: x * 3))
+        self.assertEqual(hash_value(memoryview(b'abcdef')[::2]), hash_value(b'ace'))
+        with self.assertRaises(UnhashableError):
+            hash_value(threading.Lock())
+
+    def test_make_key_normalizes_signature(self):
+        """Positional, keyword and default arguments share the same key."""
+        def func(a, b=2, *args, **kwargs):
+            pass
+
+        self.assertEqual(make_key(func, 1), make_key(func, a=1, b=2))
+        self.assertEqual(make_key(func, 1, c=3, d=4), make_key(func, 1, d=4, c=3))
+        self.assertNotEqual(make_key(func, 1), make_key(func, 1, 3))
+        with self.assertRaises(TypeError):
+            hash_arguments(inspect.signature(func), (), {})
+
+    def test_fingerprint_tracks_code(self):
+        """Fingerprints change with the code and constants, not with the line numbers."""
+        def define(source):
+            namespace = {'__name__': 'fingerprinted'}
+            exec(source, namespace)
+            return namespace['func']
+
+        original = fingerprint_function(define("def func(x):\n    return helper(x) + 1\n"))
+        self.assertEqual(fingerprint_function(define("\n\ndef func(x):\n    return helper(x) + 1\n")), original)
+        self.assertNotEqual(fingerprint_function(define("def func(x):\n    return helper(x) + 2\n")), original)
+        self.assertNotEqual(fingerprint_function(define("def func(x):\n    return [helper(y) for y in x]\n")),
+                            fingerprint_function(define("def func(x):\n    return [helper(y) - 1 for y in x]\n")))
+
+        callers = [define(f"def helper(x):\n    return x * {n}\n\ndef func(x):\n    return helper(x)\n")
+                   for n in (2, 3)]
+        self.assertEqual(fingerprint_function(callers[0]), fingerprint_function(callers[1]))
+        self.assertNotEqual(fingerprint_function(callers[0], follow_calls=True),
+                            fingerprint_function(callers[1], follow_calls=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
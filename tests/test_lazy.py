@@ -0,0 +1,63 @@
+"""Provides the unit tests for the lazy handles on saved states."""
+import pickle
+import shutil
+import tempfile
+import unittest
+from cachorro import FileBackend, LazyValue, load_cache, materialize, save_cache
+from cachorro.decorators import Cached
+
+
+class TestLazy(unittest.TestCase):
+    """Unit tests for LazyValue and the lazy modes."""
+
+    def setUp(self):
+        """Create a backend in a temporary folder."""
+        self.folder = tempfile.mkdtemp()
+        self.backend = FileBackend(self.folder)
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def test_proxy(self):
+        """The value is loaded once, on first use, and the proxy behaves like it."""
+        loads = []
+        value = LazyValue(lambda: loads.append(1) or [1, 2, 3])
+        self.assertEqual(loads, [])
+        self.assertEqual(len(value), 3)
+        self.assertEqual(value + [4], [1, 2, 3, 4])
+        self.assertTrue(isinstance(value, list) and 2 in value and value == [1, 2, 3])
+        self.assertEqual(pickle.loads(pickle.dumps(value)), [1, 2, 3])
+        self.assertIs(type(materialize(value)), list)
+        self.assertEqual(loads, [1])
+
+    def test_load_cache_lazy(self):
+        """load_cache only checks the existence of the saved state."""
+        save_cache({'a': 1}, 'lazy_func', backend=self.backend)
+        value = load_cache('lazy_func', backend=self.backend, lazy=True)
+        self.assertIs(type(value), LazyValue)
+        self.assertEqual(value['a'], 1)
+        self.assertIsNone(load_cache('missing_func', backend=self.backend, lazy=True))
+
+        # A corrupted saved state raises on first use, and is removed
+        entry, = self.backend.entries()
+        with self.backend.create(entry.namespace, entry.key) as file:
+            file.write(b'not a pickle')
+        value = load_cache('lazy_func', backend=self.backend, lazy=True)
+        with self.assertRaises(Exception):
+            value['a']
+        self.assertIsNone(load_cache('lazy_func', backend=self.backend, lazy=True))
+
+    def test_cached_lazy(self):
+        """Cached returns a lazy handle on hits, and the result itself on misses."""
+        def lazy_cached_func():
+            return [1, 2]
+
+        self.assertIs(type(Cached(lazy_cached_func, backend=self.backend, lazy=True)()), list)
+        value = Cached(lazy_cached_func, backend=self.backend, lazy=True)()
+        self.assertIs(type(value), LazyValue)
+        self.assertEqual(value, [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+"""Provides the unit tests for the in-memory tier."""
+import unittest
+from cachorro.memory import MemoryCache
+
+
+class TestMemoryCache(unittest.TestCase):
+    """Unit tests for MemoryCache."""
+
+    def test_lru_eviction(self):
+        """The least recently used entries are evicted beyond the limits."""
+        memory = MemoryCache(max_entries=2, max_bytes=100)
+        memory.put('a', 1, 10)
+        memory.put('b', 2, 10)
+        self.assertEqual(memory.get('a'), 1)
+        memory.put('c', 3, 10)
+        self.assertEqual(sorted(memory._entries), ['a', 'c'])
+
+        memory.put('d', 4, 85)
+        self.assertEqual(sorted(memory._entries), ['c', 'd'])
+        self.assertEqual(memory.info().bytes, 95)
+
+    def test_oversized_and_disabled(self):
+        """Values larger than the byte limit, or any value with no entries allowed, are not kept."""
+        memory = MemoryCache(max_entries=2, max_bytes=100)
+        memory.put('a', 1, 101)
+        self.assertNotIn('a', memory)
+        disabled = MemoryCache(max_entries=0)
+        disabled.put('a', 1)
+        self.assertIsNone(disabled.get('a'))
+        self.assertEqual(disabled.info().misses, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+"""Provides the unit tests for the incremental execution of transformed scripts."""
+import ast
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from cachorro import FileBackend, LazyValue
+from cachorro.decorators import CacheTransformer, transform_and_execute
+from cachorro.pipeline import PIPELINE_NAME
+
+SCRIPT = """
+def load(n):
+    return list(range(n))
+
+def double(xs):
+    return [x * 2 for x in xs]
+
+def total(xs):
+    return sum(xs)
+
+size = 10
+data = cacheme(load, size)
+doubled = cacheme(double, data)
+other = cacheme(total, [1, 2])
+result = cacheme(total, doubled)
+"""
+
+GLOBALS_SCRIPT = """
+N = 3
+
+def load():
+    return 10
+
+def double():
+    return x * 2
+
+def numbers():
+    return list(range(N))
+
+x = cacheme(load)
+y = cacheme(double)
+z = cacheme(numbers)
+"""
+
+PARALLEL_SCRIPT = """
+import time
+
+def slow(n):
+    time.sleep(0.3)
+    return n
+
+def report():
+    return c
+
+a = cacheme(slow, 1)
+b = cacheme(slow, 2)
+c = cacheme(slow, 3)
+total = cacheme(sum, [a, b, c])
+cached_report = cacheme(report)
+first = a + 10
+reported = report()
+"""
+
+
+class TestPipeline(unittest.TestCase):
+    """Unit tests for CacheTransformer and Pipeline."""
+
+    def setUp(self):
+        """Create a temporary folder for the script and its cache."""
+        self.folder = tempfile.mkdtemp()
+        self.script = os.path.join(self.folder, 'script.py')
+        self.cache_dir = os.path.join(self.folder, 'cache')
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def run_script(self, source, executor=None, lazy=False):
+        """Write and run the script, returning its pipeline."""
+        with open(self.script, 'w') as file:
+            file.write(source)
+        return transform_and_execute(self.script, self.cache_dir, executor, lazy)
+
+    def test_dependency_graph(self):
+        """The steps record the upstream steps their arguments refer to."""
+        pipeline = self.run_script(SCRIPT)
+        self.assertEqual({name: step.upstream for name, step in pipeline.steps.items()},
+                         {'data': (), 'doubled': ('data',), 'other': (), 'result': ('doubled',)})
+        self.assertEqual(pipeline.downstream('data'), ['doubled', 'result'])
+
+    def test_incremental_execution(self):
+        """Only the edited steps and their descendants are executed again."""
+        self.assertEqual(self.run_script(SCRIPT).executed, ['data', 'doubled', 'other', 'result'])
+        pipeline = self.run_script(SCRIPT)
+        self.assertEqual((pipeline.executed, pipeline.loaded), ([], ['data', 'doubled', 'other', 'result']))
+        self.assertEqual(self.run_script(SCRIPT.replace('x * 2', 'x * 3')).executed, ['doubled', 'result'])
+        edited = SCRIPT.replace('x * 2', 'x * 3').replace('size = 10', 'size = 5')
+        self.assertEqual(self.run_script(edited).executed, ['data', 'doubled', 'result'])
+        self.assertEqual(self.run_script(edited.replace('[1, 2]', '[1, 3]')).executed, ['other'])
+
+        # Only the latest version of each step is kept
+        self.assertEqual(len(list(FileBackend(self.cache_dir).entries('other'))), 1)
+
+    def test_global_inputs(self):
+        """The globals read by a step's function, assigned by upstream steps or not, are inputs of the step."""
+        pipeline = self.run_script(GLOBALS_SCRIPT)
+        self.assertEqual(pipeline.steps['y'].upstream, ('x',))
+        self.assertEqual(pipeline.steps['z'].inputs, ('numbers', 'N'))
+        self.assertEqual(pipeline._results['y'][1], 20)
+        pipeline = self.run_script(GLOBALS_SCRIPT.replace('return 10', 'return 20'))
+        self.assertEqual(pipeline.executed, ['x', 'y'])
+        self.assertEqual(pipeline._results['y'][1], 40)
+        pipeline = self.run_script(GLOBALS_SCRIPT.replace('return 10', 'return 20').replace('N = 3', 'N = 5'))
+        self.assertEqual(pipeline.executed, ['z'])
+        self.assertEqual(pipeline._results['z'][1], [0, 1, 2, 3, 4])
+
+    def test_repeated_step(self):
+        """A step run with several keys in a loop keeps the state of each, and drops its previous versions."""
+        script = "def square(i):\n    return i * i\n\nfor i in range(3):\n    x = cacheme(square, i)\n"
+        pipeline = self.run_script(script)
+        self.assertEqual(pipeline.executed, ['x'] * 3)
+        pipeline = self.run_script(script)
+        self.assertEqual(pipeline.loaded, ['x'] * 3)
+        pipeline = self.run_script(script.replace('i * i', 'i + i'))
+        self.assertEqual(pipeline.executed, ['x'] * 3)
+        self.assertEqual(len(list(pipeline.backend.entries('x'))), 3)
+
+    def test_unhashable_inputs(self):
+        """A step with an input that cannot be hashed, and the steps using its result, run without caching."""
+        script = ("import sqlite3\n\nconn = sqlite3.connect(':memory:', check_same_thread=False)\n\n"
+                  "def query():\n    return conn.execute('select 1').fetchone()[0]\n\n"
+                  "x = cacheme(query)\ny = cacheme(str, x)\n")
+        with self.assertLogs('cachorro.pipeline', 'WARNING'):
+            pipeline = self.run_script(script)
+        self.assertEqual(pipeline.executed, ['x', 'y'])
+        self.assertIsNone(pipeline.keys['x'])
+        self.assertEqual(pipeline._results['y'][1], '1')
+        self.assertEqual(list(pipeline.backend.entries('x')), [])
+        with ThreadPoolExecutor(2) as executor, self.assertLogs('cachorro.pipeline', 'WARNING') as logs:
+            pipeline = self.run_script(script, executor)
+        self.assertEqual(len(logs.output), 2)  # y cannot be keyed on the pending result of x
+        self.assertEqual(pipeline.keys, {'x': None, 'y': None})
+        self.assertEqual(pipeline._results['y'][1], '1')
+
+    def test_bytecode_cache(self):
+        """The transformed script is compiled once, and recompiled when edited."""
+        pipeline = self.run_script(SCRIPT)
+        self.assertTrue({'parse', 'transform', 'compile', 'save_bytecode', 'execute'} <= set(pipeline.timings))
+        pipeline = self.run_script(SCRIPT)
+        self.assertIn('load_bytecode', pipeline.timings)
+        self.assertNotIn('parse', pipeline.timings)
+        self.assertEqual(pipeline.steps['result'].upstream, ('doubled',))
+        self.assertEqual(pipeline.loaded, ['data', 'doubled', 'other', 'result'])
+
+        pipeline = self.run_script(SCRIPT.replace('x * 2', 'x * 3'))
+        self.assertIn('parse', pipeline.timings)
+        self.assertEqual(pipeline.executed, ['doubled', 'result'])
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, '.bytecode'))), 1)
+
+        with mock.patch('cachorro.decorators._transformer_digest', return_value='edited'):
+            pipeline = self.run_script(SCRIPT.replace('x * 2', 'x * 3'))
+        self.assertIn('parse', pipeline.timings)  # recompiled when the transformer changes
+
+    def test_lazy_execution(self):
+        """Loaded steps are only deserialized when used."""
+        self.run_script(SCRIPT)
+        pipeline = self.run_script(SCRIPT.replace('x * 2', 'x * 3'), lazy=True)
+        self.assertEqual(pipeline.executed, ['doubled', 'result'])
+        self.assertEqual(pipeline.loaded, ['data', 'other'])
+        self.assertIs(type(pipeline._results['other'][1]), LazyValue)
+        self.assertEqual(pipeline._results['result'][1], 135)
+
+    def test_parallel_execution(self):
+        """Independent steps run concurrently, and are joined before use."""
+        with ThreadPoolExecutor(4) as executor:
+            start = time.perf_counter()
+            pipeline = self.run_script(PARALLEL_SCRIPT, executor)
+            self.assertLess(time.perf_counter() - start, 0.8)
+            self.assertEqual(sorted(pipeline.executed), ['a', 'b', 'c', 'cached_report', 'total'])
+            self.assertGreater(pipeline.executed.index('total'), pipeline.executed.index('c'))
+            self.assertEqual(pipeline.steps['total'].upstream, ('a', 'b', 'c'))
+            self.assertEqual(pipeline.steps['cached_report'].upstream, ('c',))  # read as a global
+
+            # The global is joined before the step reading it is submitted
+            source = ast.unparse(CacheTransformer(self.cache_dir, parallel=True).visit(ast.parse(PARALLEL_SCRIPT)))
+            self.assertLess(source.index(f"c = {PIPELINE_NAME}.join(c)"), source.index('cached_report ='))
+
+            check = "assert (total, first, reported, cached_report) == (6, 11, 3, 3)\n"
+            pipeline = self.run_script(PARALLEL_SCRIPT + check, executor)
+            self.assertEqual(sorted(pipeline.loaded), ['a', 'b', 'c', 'cached_report', 'total'])
+
+    def test_parallel_joins(self):
+        """Pending results are joined before being updated, deleted, or read by a function passed as a value."""
+        script = ("def report(n):\n    return c + n\n\n"
+                  "c = cacheme(int, 3)\nd = cacheme(int, 4)\ne = cacheme(int, 5)\n"
+                  "d += 1\nreports = list(map(report, [0]))\ndel e\n"
+                  "assert (d, reports) == (5, [3])\n")
+        source = ast.unparse(CacheTransformer(self.cache_dir, parallel=True).visit(ast.parse(script)))
+        self.assertLess(source.index(f"d = {PIPELINE_NAME}.join(d)"), source.index('d += 1'))
+        self.assertLess(source.index(f"c = {PIPELINE_NAME}.join(c)"), source.index('reports ='))
+        self.assertLess(source.index(f"e = {PIPELINE_NAME}.join(e)"), source.index('del e'))
+        with ThreadPoolExecutor(2) as executor:
+            pipeline = self.run_script(script, executor)
+        self.assertEqual(sorted(pipeline.executed), ['c', 'd', 'e'])
+
+
+if __name__ == '__main__':
+    unittest.main()
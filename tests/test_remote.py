@@ -0,0 +1,112 @@
+"""Provides the unit tests for the remote cache tier and its server."""
+import http.client
+import os
+import shutil
+import tempfile
+import unittest
+from cachorro import FileBackend, HTTPBackend, TieredBackend, CacheServer, cacheme
+from tests.test_backends import BackendTests
+
+
+class TestHTTPBackend(BackendTests, unittest.TestCase):
+    """Unit tests for HTTPBackend, against a local CacheServer."""
+
+    def make_backend(self, folder):
+        """Return an HTTPBackend connected to a server storing in `folder`."""
+        self.server = CacheServer(('127.0.0.1', 0), FileBackend(folder))
+        self.server.start()
+        return HTTPBackend(self.server.url)
+
+    def tearDown(self):
+        """Stop the server and remove the temporary folder."""
+        self.backend.close()
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def test_connection_reuse(self):
+        """Consecutive requests share a pooled connection."""
+        self.backend.write('prog_f', 'ab12', b'x' * 100000)
+        connection = self.backend._pool._idle.queue[-1]
+        self.assertEqual(self.backend.read('prog_f', 'ab12'), b'x' * 100000)
+        self.assertIs(self.backend._pool._idle.queue[-1], connection)
+        self.assertEqual(len(self.backend._pool._idle.queue), 1)
+
+    def test_path_traversal(self):
+        """Encoded separators and dot segments are rejected, without touching any file."""
+        victim = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, victim, True)
+        self.backend.write('prog_f', 'ab12', b'kept')
+        host, port = self.server.server_address[:2]
+        requests = [('DELETE', f"/v1/{victim.replace('/', '%2F')}"), ('DELETE', '/v1/..'),
+                    ('PUT', '/v1/..%2Fowned/xx'), ('PUT', '/v1/prog_f/..%2F..%2Fowned'),
+                    ('GET', '/v1/prog_f/%2Fetc%2Fpasswd'), ('GET', '/v1/prog_f/ab/ab12'),
+                    ('POST', '/v1/..%2Fowned/_batch_get'), ('POST', '/v1/prog_f/_batch_get')]
+        for method, path in requests:
+            body = b'["../../owned"]' if path.endswith('_batch_get') else b'x'
+            connection = http.client.HTTPConnection(host, port)
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            self.assertEqual(response.status, 400, f"{method} {path}")
+        self.assertTrue(os.path.isdir(victim))
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.folder), 'owned')))
+        self.assertEqual(self.backend.read('prog_f', 'ab12'), b'kept')
+
+
+class TestTieredBackend(unittest.TestCase):
+    """Unit tests for TieredBackend."""
+
+    def setUp(self):
+        """Start a server, and create two nodes sharing it."""
+        self.folder = tempfile.mkdtemp()
+        self.server = CacheServer(('127.0.0.1', 0), FileBackend(os.path.join(self.folder, 'server')))
+        self.server.start()
+        self.nodes = [TieredBackend(FileBackend(os.path.join(self.folder, name)), HTTPBackend(self.server.url))
+                      for name in ('node1', 'node2')]
+
+    def tearDown(self):
+        """Stop the server and remove the temporary folder."""
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder)
+
+    def test_warm_from_peer(self):
+        """A cold node loads the entries computed by its peers, and keeps a local copy."""
+        calls = []
+
+        def shared_func(n):
+            """Dummy function to test the library."""
+            calls.append(n)
+            return n * 2
+
+        first, second = (cacheme(backend=node)(shared_func) for node in self.nodes)
+        self.assertEqual(first(21), 42)
+        self.assertEqual(second(21), 42)
+        self.assertEqual(list(second.map([1, 2, 21])), [2, 4, 42])
+        self.assertEqual(first(2), 4)
+        self.assertEqual(calls, [21, 1, 2])
+        self.assertEqual(len(list(self.nodes[1].local.entries())), 3)
+
+    def test_remote_unavailable(self):
+        """The functions are computed when the remote backend is down, and it is skipped afterwards."""
+        self.server.shutdown()
+        self.server.server_close()
+        node = self.nodes[0]
+
+        @cacheme(backend=node)
+        def offline_func(n):
+            """Dummy function to test the library."""
+            return n + 1
+
+        with self.assertLogs('cachorro.remote', 'WARNING') as logs:
+            self.assertEqual(offline_func(1), 2)
+            self.assertEqual(offline_func(2), 3)
+            self.assertEqual(offline_func(1), 2)
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(len(list(node.local.entries())), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
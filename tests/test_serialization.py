@@ -0,0 +1,130 @@
+"""Provides the unit tests for the serialization of the cached results."""
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from cachorro import FileBackend, cacheme
+from cachorro.compression import resolve_compression
+from cachorro.serialization import FORMAT_SERIALIZED, read_stream, read_value, write_stream, write_value
+from cachorro.serializers import SERIALIZERS, resolve_serializer, select_serializer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TestSerialization(unittest.TestCase):
+    """Unit tests for write_value and read_value."""
+
+    def setUp(self):
+        """Create a temporary folder."""
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def roundtrip(self, value, zero_copy):
+        """Write `value` to a file and read it back."""
+        path = os.path.join(self.folder, 'value.pkl')
+        with open(path, 'wb') as file:
+            written = write_value(value, file, zero_copy)
+        with open(path, 'rb') as file:
+            result, read = read_value(file, zero_copy)
+        self.assertEqual(written, read)
+        return result
+
+    def test_plain_pickle(self):
+        """Values written without zero_copy are plain pickles."""
+        buffer = io.BytesIO()
+        write_value({'a': [1, 2]}, buffer)
+        buffer.seek(0)
+        self.assertEqual(read_value(buffer, zero_copy=True)[0], {'a': [1, 2]})
+
+    def test_bytes_zero_copy(self):
+        """Bytes-like values are returned as read-only memoryviews of the mapped file."""
+        payload = os.urandom(200000)
+        result = self.roundtrip(payload, zero_copy=True)
+        self.assertIsInstance(result, memoryview)
+        self.assertTrue(result.readonly)
+        self.assertEqual(bytes(result), payload)
+
+    def test_out_of_band_buffers(self):
+        """Large buffers nested in a value are stored out of the pickle stream."""
+        value = {'small': bytearray(b'abc'), 'large': bytearray(os.urandom(200000))}
+        self.assertEqual(self.roundtrip(value, zero_copy=True), value)
+        self.assertEqual(self.roundtrip(value, zero_copy=False), value)
+
+    def test_stream(self):
+        """Streams are written and read back in chunks, and detected when truncated."""
+        buffer = io.BytesIO()
+        written = write_stream(iter(range(1000)), buffer, chunk_size=100)
+        self.assertEqual(list(written), list(range(1000)))
+        buffer.seek(0)
+        self.assertEqual(list(read_stream(buffer)), list(range(1000)))
+        buffer.seek(0)
+        self.assertEqual(read_value(buffer)[0], list(range(1000)))
+
+        truncated = io.BytesIO(buffer.getvalue()[:-16])
+        with self.assertRaises(pickle.UnpicklingError):
+            list(read_stream(truncated))
+
+    def test_serializers(self):
+        """Values are written with the serializer picked by type, tagged so that they load back."""
+        auto = resolve_serializer('auto')
+        for value, name in [({'a': [1, 2.5, 'x', None]}, 'marshal'), (b'raw', 'raw'),
+                            ({'a': object}, 'pickle_highest'), ([[1]] * 2, 'marshal')]:
+            self.assertEqual(select_serializer(auto, value).name, name)
+            for compression in (None, resolve_compression('zlib')):
+                buffer = io.BytesIO()
+                written = write_value(value, buffer, compression=compression, serializer=auto)
+                if compression is None:
+                    self.assertEqual(buffer.getvalue()[5], FORMAT_SERIALIZED)
+                buffer.seek(0)
+                self.assertEqual(read_value(buffer), (value, written))
+
+        # Named serializers are used as is, and rejected values raise
+        buffer = io.BytesIO()
+        write_value([1, 2], buffer, serializer=resolve_serializer('pickle_highest'))
+        self.assertEqual(buffer.getvalue()[6], SERIALIZERS['pickle_highest'].id)
+        with self.assertRaises(ValueError):
+            write_value([object()], io.BytesIO(), serializer=resolve_serializer('marshal'))
+        with self.assertRaises(ValueError):
+            resolve_serializer('yaml')
+
+    @unittest.skipUnless(np, "numpy is not installed")
+    def test_numpy_serializer(self):
+        """Arrays without Python objects are written in the .npy format."""
+        auto = resolve_serializer('auto')
+        array = np.arange(12, dtype=np.int32).reshape(3, 4)
+        self.assertEqual(select_serializer(auto, array).name, 'numpy')
+        self.assertEqual(select_serializer(auto, np.array([object()])).name, 'pickle_highest')
+        buffer = io.BytesIO()
+        write_value(array, buffer, serializer=auto)
+        self.assertIn(b'NUMPY', buffer.getvalue()[:16])
+        buffer.seek(0)
+        np.testing.assert_array_equal(read_value(buffer)[0], array)
+
+    @unittest.skipUnless(np, "numpy is not installed")
+    def test_numpy_zero_copy(self):
+        """Arrays are loaded as read-only NumPy arrays backed by the mapped file."""
+        backend = FileBackend(self.folder)
+
+        @cacheme(backend=backend, zero_copy=True, max_entries=0)
+        def array_func(n):
+            """Dummy function to test the library."""
+            return {'array': np.arange(n, dtype=np.float64), 'n': n}
+
+        array_func(100000)
+        result = array_func(100000)
+        self.assertEqual(result['n'], 100000)
+        np.testing.assert_array_equal(result['array'], np.arange(100000, dtype=np.float64))
+        self.assertFalse(result['array'].flags.writeable)
+        self.assertFalse(result['array'].flags.owndata)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Provides the unit tests for the saved states shared in memory between processes."""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from cachorro import EvictionPolicy, FileBackend, cacheme
+from cachorro.shared import _HEADER, _attach, release_shared, segment_name
+from cachorro.utils import clear_cache, get_cache_namespace
+
+FOLDER = tempfile.mkdtemp()
+
+
+@cacheme(shared_memory=True, zero_copy=True, max_entries=0, backend=FileBackend(FOLDER))
+def shared_func(n):
+    """Dummy function to test the library in several processes."""
+    return b'x' * n
+
+
+def segment_users(n):
+    """Return the number of processes using the segment of `shared_func(n)`, or None if there is none."""
+    segment = _attach(segment_name(get_cache_namespace('shared_func'), shared_func.cache_key(n)))
+    if segment is None:
+        return None
+    users = _HEADER.unpack_from(segment.buf)[5]
+    segment.close()
+    return users
+
+
+def load_in_worker(n):
+    """Load `shared_func(n)` in a worker process, returning what it got."""
+    result = shared_func(n)
+    return type(result).__name__, bytes(result[:2]), segment_users(n)
+
+
+@unittest.skipUnless(os.name == 'posix', "needs fork")
+class TestSharedMemory(unittest.TestCase):
+    """Unit tests for cacheme with shared_memory."""
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the saved states."""
+        shutil.rmtree(FOLDER)
+
+    def test_removed_with_entry(self):
+        """The segment of an entry is removed when the entry is evicted or cleared."""
+        n = 1 << 10
+        for remove in (lambda: EvictionPolicy(max_entries=0).prune(FileBackend(FOLDER)),
+                       lambda: clear_cache('shared_func', backend=FileBackend(FOLDER))):
+            shared_func(n)  # computed
+            shared_func(n)  # loaded, through a new segment
+            self.assertEqual(segment_users(n), 1)
+            remove()
+            self.assertIsNone(segment_users(n))
+        release_shared()
+
+    def test_shared_between_processes(self):
+        """Processes attach to the segment created by the first one, removed when the last one exits."""
+        n = 1 << 20
+        self.assertEqual(shared_func(n), b'x' * n)  # computed, no segment yet
+        self.assertIsNone(segment_users(n))
+
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('fork')) as executor:
+            results = list(executor.map(load_in_worker, [n] * 4))
+        self.assertEqual({result[:2] for result in results}, {('memoryview', b'xx')})
+        self.assertIn(2, [result[2] for result in results])
+        self.assertIsNone(segment_users(n))  # the workers exited
+
+        result = shared_func(n)
+        self.assertEqual(bytes(result), b'x' * n)
+        self.assertTrue(result.readonly)
+        self.assertEqual(segment_users(n), 1)
+        del result
+        release_shared()
+        self.assertIsNone(segment_users(n))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""Provides the unit tests for the cache statistics and hooks."""
+import shutil
+import tempfile
+import unittest
+from cachorro import FileBackend, add_hook, cacheme, get_stats, load_cache, remove_hook
+
+
+class TestStats(unittest.TestCase):
+    """Unit tests for CacheStats and the hooks."""
+
+    def setUp(self):
+        """Create a backend in a temporary folder."""
+        self.folder = tempfile.mkdtemp()
+        self.backend = FileBackend(self.folder)
+
+    def tearDown(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder)
+
+    def test_counters(self):
+        """Hits, misses, sizes and errors are counted per function."""
+        @cacheme(backend=self.backend, max_entries=1)
+        def counted_func(n):
+            """Dummy function to test the library."""
+            if n < 0:
+                raise ValueError(n)
+            return n
+
+        counted_func(1)
+        counted_func(1)
+        counted_func(2)
+        counted_func(1)
+        with self.assertRaises(ValueError):
+            counted_func(-1)
+        load_cache('counted_func', backend=self.backend)
+
+        stats = get_stats()['counted_func']
+        self.assertEqual((stats['hits'], stats['memory_hits'], stats['misses'], stats['errors']), (2, 1, 4, 1))
+        self.assertEqual(stats['bytes_written'], stats['bytes_read'] * 2)
+        self.assertEqual(stats['hit_rate'], 2 / 6)
+        self.assertIs(counted_func.stats, counted_func.stats)
+
+    def test_hooks(self):
+        """Registered hooks receive every event."""
+        events = []
+        add_hook(events.append)
+        try:
+            @cacheme(backend=self.backend)
+            def hooked_func():
+                """Dummy function to test the library."""
+                return 1
+
+            hooked_func()
+            hooked_func()
+        finally:
+            remove_hook(events.append)
+        hooked_func()
+
+        self.assertEqual([event.kind for event in events], ['miss', 'compute', 'save', 'memory_hit'])
+        self.assertEqual({event.func_name for event in events}, {'hooked_func'})
+
+
+if __name__ == '__main__':
+    unittest.main()